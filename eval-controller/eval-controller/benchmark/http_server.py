@@ -0,0 +1,145 @@
+"""
+controller HTTP API 压测：多个线程并发请求，输出每个场景的 req/sec 和延迟分位数。
+
+场景:
+- list: GET /auto-test 分页查询 case 记录
+- log: 模拟 runner 按 seq 连续上报日志(POST /result/log)
+- log-read: GET /result/log 读取 log 场景写入的日志
+
+用于对比 server.mode 为 development(Flask 自带服务)与 production(gunicorn 多进程)的吞吐，
+以及 gzip_min_size 开关对大响应的影响。
+
+usage:
+    cd eval-controller/eval-controller
+    python3 -m benchmark.http_server --url http://127.0.0.1:10083 --clients 32
+"""
+import argparse
+import gzip
+import json
+import threading
+import time
+
+import requests
+
+from common.const import API_PREFIX
+from eval_lib.model.const import RESULT_TYPE_LOG_RAW
+
+LOG_LINE = "2024-01-01 00:00:00 INFO benchmark log line for http server load test\n"
+
+
+class Scenario(object):
+
+    def __init__(self, url, case_uuid):
+        self.url = url
+        self.case_uuid = case_uuid
+        # 已上报的日志在模拟的 runner 日志文件中的结束位置
+        self.seq = 0
+        self.session = requests.Session()
+        self.session.headers["Accept-Encoding"] = "gzip"
+
+    def list(self):
+        return self.session.get(
+            f"{self.url}{API_PREFIX}/auto-test", params={"limit": 100},
+            timeout=30
+        )
+
+    def log(self):
+        data = LOG_LINE * 100
+        payload = json.dumps({
+            "uuid": self.case_uuid,
+            "type": RESULT_TYPE_LOG_RAW,
+            "seq": self.seq,
+            "data": data,
+        })
+        response = self.session.post(
+            f"{self.url}{API_PREFIX}/result/log",
+            data=gzip.compress(payload.encode()), timeout=30,
+            headers={
+                "Content-Type": "application/json",
+                "Content-Encoding": "gzip",
+            }
+        )
+        if response.status_code == 200:
+            self.seq += len(data.encode())
+        return response
+
+    def log_read(self):
+        return self.session.get(
+            f"{self.url}{API_PREFIX}/result/log", timeout=30,
+            params={
+                "uuid": self.case_uuid, "type": RESULT_TYPE_LOG_RAW,
+                "line_index": 1, "line_size": 1000,
+            }
+        )
+
+
+def worker(scenario: Scenario, name, deadline, result, lock):
+    request = getattr(scenario, name.replace("-", "_"))
+    latencies = []
+    errors = 0
+    while time.time() < deadline:
+        start = time.time()
+        try:
+            response = request()
+            if response.status_code != 200:
+                errors += 1
+        except requests.RequestException:
+            errors += 1
+        latencies.append(time.time() - start)
+    with lock:
+        result["latencies"].extend(latencies)
+        result["errors"] += errors
+
+
+def percentile(values, p) -> float:
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+
+def bench(url, name, clients, duration) -> dict:
+    result = {"latencies": [], "errors": 0}
+    lock = threading.Lock()
+    deadline = time.time() + duration
+    threads = [
+        threading.Thread(
+            target=worker, args=(
+                Scenario(url, f"benchmark-{i}"), name, deadline, result, lock
+            )
+        ) for i in range(clients)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latencies = result["latencies"]
+    return {
+        "rps": len(latencies) / duration,
+        "p50": percentile(latencies, 50) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+        "errors": result["errors"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:10083")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=int, default=10)
+    parser.add_argument(
+        "--scenarios", default="list,log,log-read",
+        help="comma separated: list, log, log-read"
+    )
+    args = parser.parse_args()
+
+    for name in args.scenarios.split(","):
+        r = bench(args.url, name, args.clients, args.duration)
+        print(
+            f"{name:<10} clients={args.clients} req/sec={r['rps']:.0f} "
+            f"p50={r['p50']:.1f}ms p99={r['p99']:.1f}ms errors={r['errors']}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+接口响应序列化微基准测试：序列化 10k 条 case 记录，输出每种实现的耗时和 records/sec。
+
+legacy 复现旧实现(每条记录遍历 _meta.sorted_fields 并转换字段名大写 + json.JSONEncoder)，
+json 为预计算字段的 to_json + 标准库 json，orjson 为预计算字段的 to_json + orjson(已安装时)，
+stream 为 json_stream_response 的分批序列化。
+
+usage:
+    cd eval-controller/eval-controller
+    python3 -m benchmark.json_serialize --records 10000
+"""
+import argparse
+import datetime
+import json
+import time
+import uuid
+
+from common import serializer
+from common.const import JSON_STREAM_BATCH_SIZE
+from common.utils import dict_response
+from eval_lib.databases.mysql.models.models import CaseRecord
+
+
+class LegacyEncoder(json.JSONEncoder):
+    """
+    旧实现：每条记录重新计算字段名。
+    """
+
+    def default(self, obj):
+        if isinstance(obj, CaseRecord):
+            return {
+                key.column_name.upper(): getattr(obj, key.column_name, None)
+                for key in obj._meta.sorted_fields
+            }
+        elif isinstance(obj, datetime.date):
+            return obj.strftime(serializer.DATE_FORMAT)
+        return super().default(obj)
+
+
+def new_records(num) -> list:
+    now = datetime.datetime.now()
+    return [
+        CaseRecord(
+            id=i, uuid=str(uuid.uuid4()), case_name="performance_analysis_nginx_http",
+            case_params='{"process_num": 1, "runner_image_tag": "latest"}',
+            user="benchmark", runner_commit_id="0" * 40,
+            runner_image_tag="latest", status=i % 8, deleted=0, priority=0,
+            queue_position=None, expected_start_at=None, stalled_step=None,
+            created_at=now
+        ) for i in range(num)
+    ]
+
+
+def legacy(records) -> str:
+    return LegacyEncoder().encode(dict_response(data=records))
+
+
+def encode(records) -> str:
+    return serializer.dumps(dict_response(data=records))
+
+
+def stream(records) -> str:
+    # 与 json_stream_response 相同的分批序列化，拼接后用于计时
+    head = serializer.dumps(dict_response(type="CaseRecord"))
+    chunks = [head[:-1] + ',"DATA":[']
+    for i in range(0, len(records), JSON_STREAM_BATCH_SIZE):
+        rows = serializer.dumps(records[i:i + JSON_STREAM_BATCH_SIZE])[1:-1]
+        chunks.append(rows if i == 0 else "," + rows)
+    chunks.append("]}")
+    return "".join(chunks)
+
+
+def bench(func, records, rounds) -> float:
+    func(records)
+    start = time.time()
+    for _ in range(rounds):
+        func(records)
+    return (time.time() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    records = new_records(args.records)
+    orjson = serializer.orjson
+    serializer.orjson = None
+    cases = [("legacy", legacy), ("json", encode), ("json-stream", stream)]
+    results = [(name, bench(func, records, args.rounds)) for name, func in cases]
+    serializer.orjson = orjson
+    if orjson is not None:
+        for name, func in [("orjson", encode), ("orjson-stream", stream)]:
+            results.append((name, bench(func, records, args.rounds)))
+    else:
+        print("orjson is not installed")
+
+    base = results[0][1]
+    for name, cost in results:
+        print(
+            f"{name:<14} records={args.records} {cost * 1000:.1f}ms "
+            f"records/sec={args.records / cost:.0f} speedup={base / cost:.1f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+RedisRunnerInfo 微基准测试：模拟多个 runner 并发读写 runner info，输出 ops/sec。
+
+legacy 模式复现旧实现(全局 SETNX 锁 + 逐字段 HGET/HSET)，用于前后对比。
+
+usage:
+    cd eval-controller/eval-controller
+    python3 -m benchmark.redis_runner_info --host 127.0.0.1 --password root
+"""
+import argparse
+import threading
+import time
+import uuid
+
+import redis
+
+from eval_lib.databases.redis import const
+from eval_lib.databases.redis.runner_info import RedisRunnerInfo
+
+
+class LegacyRedisRunnerInfo(RedisRunnerInfo):
+    """
+    旧实现：每个操作都持有全局锁，update 逐字段比较后写入。
+    """
+
+    def update_runner_info(self, uuid, info: dict):
+        key_name = self.runner_key(uuid)
+        lock = self.acquire_lock(const.GLOBAL_LOCK)
+        conn = redis.Redis(connection_pool=self.conn_pool)
+        for k, v in info.items():
+            if conn.hget(key_name, k) != v:
+                conn.hset(key_name, k, v)
+        self.release_lock(const.GLOBAL_LOCK, lock)
+
+    def get_runner_info(self, uuid) -> dict:
+        lock = self.acquire_lock(const.GLOBAL_LOCK)
+        conn = redis.Redis(connection_pool=self.conn_pool)
+        hash_all = conn.hgetall(self.runner_key(uuid))
+        self.release_lock(const.GLOBAL_LOCK, lock)
+        return {k.decode(): v.decode() for k, v in hash_all.items()}
+
+
+def worker(redis_db: RedisRunnerInfo, case_uuid, deadline, counter, lock):
+    ops = 0
+    while time.time() < deadline:
+        redis_db.get_runner_info(uuid=case_uuid)
+        redis_db.update_runner_info(
+            uuid=case_uuid, info={
+                "runner-status": const.CASE_STATUS_RUNNING,
+                "case-status": const.CASE_STATUS_RUNNING,
+            }
+        )
+        ops += 2
+    with lock:
+        counter[0] += ops
+
+
+def bench(redis_db: RedisRunnerInfo, runners, duration) -> float:
+    uuids = [str(uuid.uuid4()) for _ in range(runners)]
+    for case_uuid in uuids:
+        redis_db.init_runner_info(uuid=case_uuid)
+    counter = [0]
+    lock = threading.Lock()
+    deadline = time.time() + duration
+    threads = [
+        threading.Thread(
+            target=worker, args=(redis_db, case_uuid, deadline, counter, lock)
+        ) for case_uuid in uuids
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for case_uuid in uuids:
+        redis_db.delete_runner_info(uuid=case_uuid)
+    return counter[0] / duration
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--db", default="0")
+    parser.add_argument("--runners", type=int, default=50)
+    parser.add_argument("--duration", type=int, default=10)
+    args = parser.parse_args()
+
+    for name, cls in [
+        ("legacy(global lock)", LegacyRedisRunnerInfo),
+        ("atomic", RedisRunnerInfo),
+    ]:
+        redis_db = cls(
+            host=args.host, port=args.port, password=args.password,
+            db=args.db, max_connections=args.runners
+        )
+        ops = bench(redis_db, args.runners, args.duration)
+        print(f"{name:<20} runners={args.runners} ops/sec={ops:.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+import datetime
+import os
+import threading
+
+from typing import Dict, List
+
+from common.const import CASE_STATUS_FLUSH_INTERVAL, CASE_STATUS_FLUSH_MAX_RETRY
+from eval_lib.common.logger import get_logger
+from eval_lib.databases.mysql.db import db
+from eval_lib.databases.mysql import const as db_const
+from eval_lib.databases.mysql.models.models import CaseRecord, CaseStatusEvent
+
+log = get_logger()
+
+# 进入这些状态后 case 不再更新，释放缓存的最近写入字段
+CASE_FINAL_STATUSES = {
+    db_const.CASE_RECORD_STATUS_FINISHED,
+    db_const.CASE_RECORD_STATUS_ERROR,
+    db_const.CASE_RECORD_STATUS_EXCEPTION,
+}
+
+
+class CaseStatusWriter(threading.Thread):
+    """
+    case 记录的延迟合并写入。
+
+    update() 只把待更新的字段合并到内存中(同一 case 的多次更新只保留最新值)，
+    后台线程每隔 interval 秒在一个事务中批量写入，字段取值相同的 case 合并为一条 UPDATE。
+    调用方需要等待写入完成时(如回复 server 之前)调用 flush()。
+    同时在内存中保存每个 case 最近写入的字段，与之相同的更新直接跳过；
+    case 结束或删除后释放，缓存只在写入它的进程内有效，不用于读取。
+    更新 status 时本进程没有缓存的状态，先从数据库读取，状态变化事件的 old_status 不为空。
+    status 变化时记录一条状态变化事件，与 case 记录在同一个事务中写入。
+    """
+
+    def __init__(self, interval=CASE_STATUS_FLUSH_INTERVAL):
+        super().__init__(name="case-status-writer", daemon=True)
+        self.interval = interval
+        # uuid -> 待写入的字段
+        self.pending: Dict[str, dict] = {}
+        # uuid -> 最近写入(或待写入)的字段
+        self.last_known: Dict[str, dict] = {}
+        # 待写入的状态变化事件
+        self.events: List[dict] = []
+        # uuid -> 连续写入失败次数
+        self.retries: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        # 保证同一时刻只有一个 flush 在写数据库，写入顺序与更新顺序一致
+        self.flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.flush()
+        self.flush()
+
+    def update(self, uuid, cause=None, **kwargs):
+        """
+        :param cause: status 变化的原因，记录在状态变化事件中
+        """
+        if "status" in kwargs:
+            self.load_status(uuid)
+        with self.lock:
+            known = self.last_known.setdefault(uuid, {})
+            changed = {
+                k: v for k, v in kwargs.items()
+                if k not in known or known[k] != v
+            }
+            if not changed:
+                return
+            if "status" in changed:
+                self.events.append({
+                    "uuid": uuid,
+                    "old_status": known.get("status"),
+                    "new_status": changed["status"],
+                    "cause": cause,
+                    "created_at": datetime.datetime.now(),
+                })
+            known.update(changed)
+            self.pending.setdefault(uuid, {}).update(changed)
+            if (
+                known.get("status") in CASE_FINAL_STATUSES
+                or known.get("deleted") == db_const.CASE_RECORD_DELETED
+            ):
+                self.last_known.pop(uuid, None)
+
+    def load_status(self, uuid):
+        """
+        本进程没有 case 的状态时(由其他进程写入、缓存已释放或进程重启后)，
+        从数据库读取当前状态，作为状态变化事件的 old_status。
+        """
+        with self.lock:
+            if "status" in self.last_known.get(uuid, {}):
+                return
+            pending = self.pending.get(uuid, {})
+            if "status" in pending:
+                self.last_known.setdefault(uuid, {})["status"] = pending["status"]
+                return
+        try:
+            cr = CaseRecord.select(CaseRecord.status).where(
+                CaseRecord.uuid == uuid
+            ).first()
+        except Exception as e:
+            log.error(f"get case record status: {uuid}, failed: {e}")
+            return
+        if cr is None:
+            return
+        with self.lock:
+            self.last_known.setdefault(uuid, {}).setdefault("status", cr.status)
+
+    def forget(self, uuid):
+        """
+        case 不再更新时释放缓存，待写入的字段仍会写入。
+        """
+        with self.lock:
+            self.last_known.pop(uuid, None)
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, {}
+                events, self.events = self.events, []
+            if not batch and not events:
+                return
+            # 字段取值完全相同的 case 合并为一条 UPDATE ... WHERE uuid IN (...)
+            groups: Dict[tuple, list] = {}
+            for uuid, fields in batch.items():
+                key = tuple(sorted(fields.items(), key=lambda item: item[0]))
+                groups.setdefault(key, []).append(uuid)
+            try:
+                with db.atomic():
+                    for key, uuids in groups.items():
+                        CaseRecord.update(**dict(key)).where(
+                            CaseRecord.uuid.in_(uuids)
+                        ).execute()
+                    if events:
+                        CaseStatusEvent.insert_many(events).execute()
+            except Exception as e:
+                log.error(f"update case records: {batch}, failed: {e}")
+                self.requeue(batch, events)
+                return
+            with self.lock:
+                for uuid in batch:
+                    self.retries.pop(uuid, None)
+            log.info(
+                f"update case records success: {len(batch)} cases, {len(groups)} statements"
+            )
+
+    def requeue(self, batch: Dict[str, dict], events: List[dict]):
+        """
+        写入失败的字段放回待写入队列，期间的新更新优先；多次失败后丢弃。
+        """
+        with self.lock:
+            self.events = events + self.events
+            for uuid, fields in batch.items():
+                retries = self.retries.get(uuid, 0) + 1
+                if retries > CASE_STATUS_FLUSH_MAX_RETRY:
+                    log.error(f"drop case record update: {uuid}, {fields}")
+                    self.retries.pop(uuid, None)
+                    # 未写入的字段不能作为最近写入的值，否则相同的更新会被跳过
+                    known = self.last_known.get(uuid, {})
+                    for k, v in fields.items():
+                        if known.get(k) == v:
+                            known.pop(k)
+                    continue
+                self.retries[uuid] = retries
+                self.pending[uuid] = {**fields, **self.pending.get(uuid, {})}
+
+
+_case_status_writer: CaseStatusWriter = None
+_case_status_writer_pid = None
+_case_status_writer_lock = threading.Lock()
+
+
+def get_case_status_writer() -> CaseStatusWriter:
+    """
+    获取当前进程的 CaseStatusWriter 单例，server 和 manager 进程各自写入。
+    """
+    global _case_status_writer, _case_status_writer_pid
+    with _case_status_writer_lock:
+        if _case_status_writer is None or _case_status_writer_pid != os.getpid():
+            _case_status_writer = CaseStatusWriter()
+            _case_status_writer_pid = os.getpid()
+            _case_status_writer.start()
+        return _case_status_writer
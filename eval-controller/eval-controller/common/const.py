@@ -7,3 +7,86 @@ MANAGER_SSH_USERNAME_DEFAULT = "root"
 
 POD_MAX_ABNORMAL_STATUS_NUMBER = 10
 WAIT_MYSQL_RUNNING_TIMEOUT = 600
+
+POD_STATUS_NAMESPACE = "evaluation"
+POD_STATUS_REFRESH_INTERVAL = 5
+# pod 状态缓存超过该时长未刷新时，视为缓存过期而非 pod 异常
+POD_STATUS_STALE_TIMEOUT = 30
+
+REDIS_POOL_STATS_INTERVAL = 60
+# runner 事件订阅断开后的重连间隔
+RUNNER_EVENT_RETRY_INTERVAL = 5
+# 未收到 runner 事件时检查 runner 状态的间隔，防止事件丢失
+RUNNER_STATUS_CHECK_INTERVAL = 5
+
+RUNNER_TIMEOUT = 60 * 60
+# 单个步骤超过该时长未推进时，标记为卡住的步骤
+RUNNER_STEP_STALL_TIMEOUT = 30 * 60
+# 暂停、恢复、取消后等待 runner 进入目标状态的最长时间(秒)
+RUNNER_CASE_SYNC_TIMEOUT = 10 * 60
+# 接管失败的 case 残留的 release 清理失败时的重试间隔(秒)和次数
+RUNNER_RECOVERY_CLEANUP_INTERVAL = 60
+RUNNER_RECOVERY_CLEANUP_RETRY = 10
+# runner 生命周期状态
+RUNNER_STATE_INIT = "init"
+RUNNER_STATE_EXEC_ENV = "exec_env"
+RUNNER_STATE_WAIT = "wait"
+RUNNER_STATE_GET_RESULTS = "get_results"
+RUNNER_STATE_REMOVE_ENV = "remove_env"
+RUNNER_STATE_DONE = "done"
+# 无历史数据时 runner 执行时长的估计值，用于估算排队 case 的开始时间
+RUNNER_DURATION_ESTIMATE = 30 * 60
+# manager 读取控制消息的阻塞时长(毫秒)
+MESSAGE_QUEUE_BLOCK = 5000
+# 预热池中空闲 runner 的 release 名称前缀
+RUNNER_POOL_RELEASE_PREFIX = "runner-pool-"
+RUNNER_POOL_REFILL_INTERVAL = 10
+# 空闲 runner 安装后超过该时长仍未就绪时卸载重建
+RUNNER_POOL_START_TIMEOUT = 300
+
+# 日志长轮询/推送时检查日志文件大小的间隔(秒)，用于发现其他进程写入的日志
+LOG_TAIL_CHECK_INTERVAL = 1
+LOG_TAIL_MAX_TIMEOUT = 60
+LOG_STREAM_KEEPALIVE_INTERVAL = 15
+# 单个日志推送连接默认的最长时间，超时后客户端通过 Last-Event-ID 重连
+LOG_STREAM_MAX_DURATION = 60
+# 日志上传请求体解压后的最大字节数
+LOG_POST_MAX_SIZE = 16 * 1024 * 1024
+# 日志写入线程每次最多合并的日志批数
+LOG_INGEST_BATCH_SIZE = 256
+# 日志写入队列满时请求等待的时长(秒)
+LOG_INGEST_PUT_TIMEOUT = 1
+# 结果压缩包上传、校验时每次读写的大小
+RESULT_UPLOAD_CHUNK_SIZE = 1024 * 1024
+# 结果解压任务超过该时长(秒)仍未完成时视为已丢失
+RESULT_EXTRACT_JOB_TIMEOUT = 60 * 60
+# 没有对应未完成任务的结果压缩包超过该时长(秒)后删除，避免误删刚提交的任务
+RESULT_UPLOAD_ORPHAN_AGE = 60
+# runner 执行过程中允许增量上传的结果目录
+RESULT_ARTIFACT_DIRS = ("report", "allure-result", "log")
+# 异步任务 long-poll 的最长等待时间
+TASK_WAIT_MAX_TIMEOUT = 60
+# 异步任务超过该时长仍未完成时，不再阻止对同一 case 下发新的状态修改
+TASK_PENDING_TIMEOUT = 10 * 60
+# case 记录分页查询的默认和最大每页数量
+AUTO_TEST_PAGE_DEFAULT_LIMIT = 100
+AUTO_TEST_PAGE_MAX_LIMIT = 1000
+# case 记录延迟写入的批量写入间隔(秒)和失败重试次数
+CASE_STATUS_FLUSH_INTERVAL = 0.5
+CASE_STATUS_FLUSH_MAX_RETRY = 3
+# case 各阶段耗时统计的默认和最大时间范围(小时)
+CASE_STATUS_STATS_DEFAULT_HOURS = 24
+CASE_STATUS_STATS_MAX_HOURS = 24 * 30
+# 读多写少接口在进程内缓存的响应数量
+RESPONSE_CACHE_MAX_ENTRIES = 256
+# 记录数不少于该值的列表响应分批序列化并流式返回，每批序列化的记录数
+JSON_STREAM_MIN_ITEMS = 500
+JSON_STREAM_BATCH_SIZE = 200
+# 进程退出时等待日志写入线程写完队列的最长时间(秒)
+LOG_INGEST_CLOSE_TIMEOUT = 20
+# runner 结束前等待 controller 写完已发送日志的最长时间(秒)
+LOG_INGEST_DRAIN_TIMEOUT = 10
+# 修改 case 状态的跨进程锁，获取锁的最长等待时间和锁的过期时间(秒)
+UPDATE_LOCK_KEY = "auto-test-update"
+UPDATE_LOCK_ACQUIRE_TIMEOUT = 10
+UPDATE_LOCK_TIMEOUT = 20
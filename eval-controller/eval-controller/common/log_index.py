@@ -0,0 +1,305 @@
+import fcntl
+import os
+import struct
+import time
+
+# 索引中每个偏移量占 8 字节(无符号整数，小端)
+OFFSET_SIZE = 8
+# 更新索引时每次读取的日志大小
+INDEX_READ_SIZE = 1024 * 1024
+# 暂存的日志批次等待前面日志的最长时间(秒)，超时后不再等待直接追加
+LOG_HOLD_TIMEOUT = 60
+
+
+class LogIndex(object):
+    """
+    日志文件的行偏移索引。
+
+    索引文件(<日志文件>.idx)依次保存每一行结束位置(换行符之后)的偏移量，
+    追加日志时增量更新，读取任意行范围时通过偏移量直接定位，
+    不需要从头扫描日志文件，读取耗时与日志大小无关。
+    非通过 append 写入的日志(如 runner 上传的日志)在读取时补齐索引。
+    """
+
+    def __init__(self, log_file):
+        self.log_file = log_file
+        self.index_file = f"{log_file}.idx"
+        # 已写入的日志在发送方已发送日志(UTF-8 编码)中的结束位置，用于重发去重
+        self.seq_file = f"{log_file}.seq"
+        # 先于前面的日志到达的批次，按 seq 暂存在该目录中
+        self.hold_dir = f"{log_file}.hold"
+        # 写入失败时记录需要发送方重发的起始位置
+        self.resend_file = f"{log_file}.resend"
+
+    def append(self, data: str, seq=None) -> int:
+        """
+        追加日志并更新索引。
+
+        :param seq: 本批日志在发送方已发送日志(UTF-8 编码)中的起始位置，已写入的部分不会重复写入
+        :return: 实际写入的字节数
+        """
+        writer = LogIndexWriter(self.log_file)
+        try:
+            return writer.write([(data, seq)])
+        finally:
+            writer.close(fsync=False)
+
+    def release_held(self) -> int:
+        """
+        写入已等待超时的暂存批次。发送方不再发送日志(如 case 的最后一批之前有缺失)时，
+        暂存的批次不会再由后续写入带出，由写入管道定期调用。
+
+        :return: 实际写入的字节数
+        """
+        if not os.path.isdir(self.hold_dir):
+            return 0
+        writer = LogIndexWriter(self.log_file)
+        try:
+            return writer.write([])
+        finally:
+            writer.close(fsync=False)
+
+    def resend_seq(self):
+        """
+        :return: 需要发送方从该位置重发日志，没有写入失败时返回 None
+        """
+        try:
+            with open(self.resend_file, "r") as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def request_resend(self):
+        """
+        写入失败后要求发送方从已写入的位置重发，已有未完成的重发请求时保持不变。
+        """
+        if self.resend_seq() is not None:
+            return
+        with open(self.resend_file, "w") as f:
+            f.write(str(self._read_seq()))
+
+    def _read_seq(self) -> int:
+        try:
+            with open(self.seq_file, "r") as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_seq(self, seq):
+        with open(self.seq_file, "w") as f:
+            f.write(str(seq))
+
+    def read(self, line_index, line_size, complete_only=False) -> tuple:
+        """
+        读取指定范围的日志。
+
+        :param line_index: 起始行号，从 1 开始
+        :param line_size: 读取的行数，小于 1 时读取到文件末尾
+        :param complete_only: 不返回、也不计入没有换行符的最后一行(仍在写入中)，
+            用于按行号续读的场景，避免续读时跳过该行的剩余部分
+        :return: (日志行列表, 日志总行数)
+        """
+        with open(self.index_file, "ab+") as idx:
+            fcntl.flock(idx, fcntl.LOCK_SH)
+            try:
+                # 有未索引的新日志，或日志被截断时更新索引
+                if self._indexed_end(idx) != os.path.getsize(self.log_file):
+                    fcntl.flock(idx, fcntl.LOCK_EX)
+                    self._update(idx)
+                return self._read(idx, line_index, line_size, complete_only)
+            finally:
+                fcntl.flock(idx, fcntl.LOCK_UN)
+
+    def _offset(self, idx, line_number) -> int:
+        """
+        :return: 第 line_number 行结束位置的偏移量，line_number 为 0 时返回 0
+        """
+        if line_number < 1:
+            return 0
+        data = os.pread(
+            idx.fileno(), OFFSET_SIZE, (line_number - 1) * OFFSET_SIZE
+        )
+        return struct.unpack("<Q", data)[0]
+
+    def _indexed_lines(self, idx) -> int:
+        return os.fstat(idx.fileno()).st_size // OFFSET_SIZE
+
+    def _indexed_end(self, idx) -> int:
+        return self._offset(idx, self._indexed_lines(idx))
+
+    def _update(self, idx):
+        """
+        从已索引的位置读取新写入的日志，追加每个换行符之后的偏移量。
+        """
+        log_size = os.path.getsize(self.log_file)
+        offset = self._indexed_end(idx)
+        if log_size < offset:
+            # 日志被截断或重写，重建索引
+            os.ftruncate(idx.fileno(), 0)
+            offset = 0
+        with open(self.log_file, "rb") as f:
+            f.seek(offset)
+            while offset < log_size:
+                data = f.read(min(INDEX_READ_SIZE, log_size - offset))
+                if not data:
+                    break
+                offsets = []
+                pos = data.find(b"\n")
+                while pos != -1:
+                    offsets.append(offset + pos + 1)
+                    pos = data.find(b"\n", pos + 1)
+                if offsets:
+                    idx.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+                offset += len(data)
+        idx.flush()
+
+    def _read(self, idx, line_index, line_size, complete_only) -> tuple:
+        log_size = os.path.getsize(self.log_file)
+        indexed_lines = self._indexed_lines(idx)
+        indexed_end = self._offset(idx, indexed_lines)
+        # 最后一行没有换行符时也计入总行数
+        line_count = indexed_lines + (
+            1 if log_size > indexed_end and not complete_only else 0
+        )
+        line_index = max(line_index, 1)
+        if line_index > line_count:
+            return [], line_count
+        start = self._offset(idx, line_index - 1)
+        last_line = line_count if line_size < 1 else min(
+            line_index + line_size - 1, line_count
+        )
+        end = self._offset(
+            idx, last_line
+        ) if last_line <= indexed_lines else log_size
+        with open(self.log_file, "rb") as f:
+            data = os.pread(f.fileno(), end - start, start)
+        lines = data.decode("utf-8", errors="replace").split("\n")
+        if lines and lines[-1] == "":
+            lines.pop()
+        return lines, line_count
+
+
+class LogIndexWriter(LogIndex):
+    """
+    保持日志文件和索引文件打开的写入器，一次写入多批日志。
+    多个进程同时写入时通过索引文件的文件锁互斥。
+    同一 runner 的相邻两批日志可能由不同的 server 进程处理，后发送的批次先写入时，
+    先暂存到前面的日志写入后再追加，保证日志顺序。
+    """
+
+    def __init__(self, log_file):
+        super().__init__(log_file)
+        self.idx = open(self.index_file, "ab+")
+        self.log = open(self.log_file, "ab")
+        # 有未 fsync 的写入
+        self.dirty = False
+
+    def write(self, chunks: list) -> int:
+        """
+        :param chunks: [(日志, seq)]，seq 为 None 时不去重
+        :return: 实际写入的字节数
+        """
+        fcntl.flock(self.idx, fcntl.LOCK_EX)
+        try:
+            written = None
+            buffer = []
+            for data, seq in chunks:
+                data = data.encode()
+                if seq is not None:
+                    if written is None:
+                        written = start = self._read_seq()
+                    if seq > written:
+                        self._hold(seq, data)
+                        continue
+                    end = seq + len(data)
+                    if end <= written:
+                        continue
+                    # 部分重叠时只写入新的部分
+                    data = data[max(written - seq, 0):]
+                    written = end
+                buffer.append(data)
+            if written is None and os.path.isdir(self.hold_dir):
+                written = start = self._read_seq()
+            released = []
+            if written is not None:
+                held, released, written = self._release(written)
+                buffer.extend(held)
+            data = b"".join(buffer)
+            size = os.fstat(self.log.fileno()).st_size
+            try:
+                if data:
+                    self.log.write(data)
+                    self.log.flush()
+                    self.dirty = True
+                if written is not None:
+                    self._write_seq(written)
+            except Exception:
+                # 日志和写入位置回退到写入前，发送方重发后可以完整写入
+                self._rollback(size, start if written is not None else None)
+                raise
+            for path in released:
+                os.remove(path)
+            if released and not os.listdir(self.hold_dir):
+                os.rmdir(self.hold_dir)
+            if written is not None:
+                self._clear_resend(written)
+            self._update(self.idx)
+            return len(data)
+        finally:
+            fcntl.flock(self.idx, fcntl.LOCK_UN)
+
+    def _hold(self, seq, data):
+        os.makedirs(self.hold_dir, exist_ok=True)
+        with open(f"{self.hold_dir}/{seq}", "wb") as f:
+            f.write(data)
+
+    def _release(self, written) -> tuple:
+        """
+        取出与已写入日志衔接的暂存批次，暂存文件在写入成功后由调用方删除。
+
+        :return: (待追加的日志列表, 已取出的暂存文件, 追加后的结束位置)
+        """
+        if not os.path.isdir(self.hold_dir):
+            return [], [], written
+        held = []
+        released = []
+        now = time.time()
+        for seq in sorted(int(name) for name in os.listdir(self.hold_dir)):
+            path = f"{self.hold_dir}/{seq}"
+            # 前面的日志丢失(如发送方放弃重试)时不能一直等待
+            if seq > written and now - os.path.getmtime(path) < LOG_HOLD_TIMEOUT:
+                break
+            with open(path, "rb") as f:
+                data = f.read()
+            released.append(path)
+            if seq + len(data) > written:
+                # 等待超时的批次(seq > written)整批追加
+                held.append(data[max(written - seq, 0):])
+                written = seq + len(data)
+        return held, released, written
+
+    def _rollback(self, size, seq):
+        os.ftruncate(self.log.fileno(), size)
+        if seq is not None:
+            self._write_seq(seq)
+
+    def _clear_resend(self, written):
+        resend_seq = self.resend_seq()
+        # 重发的日志已写入
+        if resend_seq is not None and written > resend_seq:
+            os.remove(self.resend_file)
+
+    def fsync(self):
+        if not self.dirty:
+            return
+        os.fsync(self.log.fileno())
+        os.fsync(self.idx.fileno())
+        self.dirty = False
+
+    def close(self, fsync=True):
+        try:
+            if fsync:
+                self.fsync()
+        finally:
+            self.log.close()
+            self.idx.close()
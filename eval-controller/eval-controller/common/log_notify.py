@@ -0,0 +1,54 @@
+import threading
+
+from typing import Dict
+
+
+class LogNotifier(object):
+    """
+    按 uuid 通知日志追加事件，唤醒等待该 case 新日志的请求。
+
+    只在当前进程内有效，等待方需同时周期性检查日志文件大小，
+    以发现其他进程写入的日志。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # uuid -> [Condition, 版本号, 等待数]
+        self.watches: Dict[str, list] = {}
+
+    def notify(self, uuid):
+        with self.lock:
+            watch = self.watches.get(uuid)
+        if watch is None:
+            return
+        with watch[0]:
+            watch[1] += 1
+            watch[0].notify_all()
+
+    def version(self, uuid) -> int:
+        with self.lock:
+            watch = self.watches.get(uuid)
+            return watch[1] if watch else 0
+
+    def wait(self, uuid, version, timeout) -> bool:
+        """
+        等待 uuid 的日志版本号不再是 version。
+
+        :return: 有新日志时返回 True，超时返回 False
+        """
+        with self.lock:
+            watch = self.watches.setdefault(uuid, [threading.Condition(), version, 0])
+            watch[2] += 1
+        try:
+            with watch[0]:
+                return watch[0].wait_for(
+                    lambda: watch[1] != version, timeout=timeout
+                )
+        finally:
+            with self.lock:
+                watch[2] -= 1
+                if watch[2] == 0:
+                    self.watches.pop(uuid, None)
+
+
+log_notifier = LogNotifier()
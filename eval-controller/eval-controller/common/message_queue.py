@@ -0,0 +1,16 @@
+from eval_lib.databases.redis.message_queue import RedisMessageQueue
+from config import conf
+
+
+def new_message_queue() -> RedisMessageQueue:
+    """
+    创建 server 与 manager 之间的控制消息队列。
+    消息保存在 Redis Stream 中，manager 处理后才确认，manager 重启后会重新处理未确认的消息。
+    """
+    return RedisMessageQueue(
+        host=conf.redis_host, port=conf.redis_port,
+        password=conf.redis_password, db=conf.redis_db,
+        max_connections=conf.redis_max_connections,
+        health_check_interval=conf.redis_health_check_interval,
+        socket_keepalive=conf.redis_socket_keepalive
+    )
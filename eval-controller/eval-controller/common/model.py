@@ -1,12 +1,16 @@
 import uuid
 from eval_lib.common.exceptions import BadRequestException
 from eval_lib.model.base import BaseStruct
+from common.const import LOG_TAIL_MAX_TIMEOUT, AUTO_TEST_PAGE_DEFAULT_LIMIT, AUTO_TEST_PAGE_MAX_LIMIT
 from eval_lib.model.const import CASE_PARAMS_STATUS_CREATE, CASE_PARAMS_STATUS_PAUSE, CASE_PARAMS_STATUS_CANCEL, CASE_PARAMS_STATUS_RESUME
 
 
 class AutoTestCreate(BaseStruct):
 
-    KEYS = ["uuid", "case_name", "process_num", "runner_image_tag"]
+    KEYS = [
+        "uuid", "case_name", "process_num", "runner_image_tag", "user",
+        "priority"
+    ]
 
     def init(self, **kwargs):
         super().init(**kwargs)
@@ -16,6 +20,8 @@ class AutoTestCreate(BaseStruct):
         # TODO
         if not (self.uuid):
             raise BadRequestException("bad request")
+        if self.priority is not None and not isinstance(self.priority, int):
+            raise BadRequestException(f"bad request priority {self.priority}")
 
 
 class AutoTestUpdate(BaseStruct):
@@ -46,12 +52,43 @@ class AutoTestDelete(BaseStruct):
 
 class AutoTestFilter(BaseStruct):
 
-    KEYS = ["uuid", "uuids", "status"]
+    KEYS = ["uuid", "uuids", "status", "cursor", "limit", "fields", "order"]
+    # 分页查询参数，不作为过滤条件
+    # cursor: 上一页返回的 next_cursor; limit: 每页数量; fields: 逗号分隔的返回字段; order: 按创建时间 asc 或 desc(默认)
+    PAGE_KEYS = ["cursor", "limit", "fields", "order"]
+
+    def is_valid(self):
+        if self.limit is None:
+            self.limit = AUTO_TEST_PAGE_DEFAULT_LIMIT
+        try:
+            self.limit = int(self.limit)
+        except (TypeError, ValueError):
+            raise BadRequestException(f"bad request limit {self.limit}")
+        if not 0 < self.limit <= AUTO_TEST_PAGE_MAX_LIMIT:
+            raise BadRequestException(f"bad request limit {self.limit}")
+        if self.order is None:
+            self.order = "desc"
+        if self.order not in ["asc", "desc"]:
+            raise BadRequestException(f"bad request order {self.order}")
+        if isinstance(self.fields, str):
+            self.fields = [f for f in self.fields.split(",") if f]
+
+    def where_json(self) -> dict:
+        return {
+            key: getattr(self, key)
+            for key in self.KEYS if key not in self.PAGE_KEYS
+        }
 
 
 class ResultPostLog(BaseStruct):
 
-    KEYS = ["uuid", "type", "data"]
+    # seq: 本批日志在 runner 日志文件中的起始位置，用于去重，旧版本 runner 不携带
+    # flush: 等待已发送的日志写入后再返回，runner 结束前调用
+    KEYS = ["uuid", "type", "data", "seq", "flush"]
+
+    def init(self, **kwargs):
+        super().init(**kwargs)
+        self.seq = int(self.seq) if self.seq is not None else self.seq
 
     def is_valid(self):
         # TODO
@@ -81,6 +118,17 @@ class ResultGetLog(BaseStruct):
         return True
 
 
+class ResultTailLog(ResultGetLog):
+
+    KEYS = ["uuid", "type", "line_index", "line_size", "timeout"]
+
+    def init(self, **kwargs):
+        super().init(**kwargs)
+        self.timeout = min(
+            int(self.timeout or LOG_TAIL_MAX_TIMEOUT), LOG_TAIL_MAX_TIMEOUT
+        )
+
+
 class ResultLogResponse(BaseStruct):
 
     KEYS = ["uuid", "logs", "line_index", "line_size", "line_count"]
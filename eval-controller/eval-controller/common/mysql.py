@@ -1,8 +1,13 @@
+import datetime
 import time
+from peewee import DateTimeField
+from playhouse.migrate import MySQLMigrator, migrate
 from . import const
 from eval_lib.databases.mysql.db import db
 from eval_lib.common.logger import get_logger
-from eval_lib.databases.mysql.models.models import CaseRecord, CaseReport, Component
+from eval_lib.databases.mysql.models.models import CaseRecord, CaseReport, Component, Task, CaseStatusEvent
+from eval_lib.databases.mysql import const as db_const
+from .case_status import get_case_status_writer
 
 log = get_logger()
 
@@ -16,7 +21,12 @@ def init_mysql():
     while True:
         try:
             db.connect()
-            db.create_tables([CaseRecord, CaseReport, Component])
+            models = [CaseRecord, CaseReport, Component, Task, CaseStatusEvent]
+            db.create_tables(models)
+            for model in models:
+                add_missing_columns(model)
+                ensure_datetime_precision(model)
+                ensure_indexes(model)
             break  # 如果成功连接并创建表，则退出循环
         except Exception as e:
             if time.time() - start_time > const.WAIT_MYSQL_RUNNING_TIMEOUT:
@@ -26,19 +36,95 @@ def init_mysql():
             time.sleep(20)  # 等待 20 秒后重试连接
 
 
-def update_case_record(uuid: str, **kwargs):
+def add_missing_columns(model):
+    """
+    为已存在的表补充模型中新增的字段，create_tables 不会修改已存在的表。
+    新增字段需允许为空或设置默认值。
+    """
+    table_name = model._meta.table_name
+    columns = {column.name for column in db.get_columns(table_name)}
+    migrator = MySQLMigrator(db)
+    operations = [
+        migrator.add_column(table_name, field.column_name, field)
+        for field in model._meta.sorted_fields
+        if field.column_name not in columns
+    ]
+    if operations:
+        log.info(f"add columns to {table_name}: {len(operations)}")
+        migrate(*operations)
+
+
+def ensure_datetime_precision(model):
+    """
+    已存在的表中精度与模型不同的日期时间字段(如秒级改为微秒级)修改为模型中的类型，
+    create_tables 不会修改已存在的字段类型。
+    """
+    fields = {
+        field.column_name: field.get_modifiers()[0]
+        for field in model._meta.sorted_fields
+        if isinstance(field, DateTimeField) and field.get_modifiers()
+    }
+    if not fields:
+        return
+    table_name = model._meta.table_name
+    cursor = db.execute_sql(
+        "SELECT column_name, datetime_precision FROM information_schema.columns "
+        "WHERE table_schema = DATABASE() AND table_name = %s", (table_name, )
+    )
+    precisions = {name: precision for name, precision in cursor.fetchall()}
+    migrator = MySQLMigrator(db)
+    operations = [
+        migrator.alter_column_type(
+            table_name, column_name, model._meta.columns[column_name]
+        )
+        for column_name, precision in fields.items()
+        if column_name in precisions and precisions[column_name] != precision
+    ]
+    if operations:
+        log.info(f"alter datetime precision of {table_name}: {len(operations)}")
+        migrate(*operations)
+
+
+def ensure_indexes(model):
+    """
+    为已存在的表补充模型中新增的索引，create_tables 只在建表时创建索引。
+    """
+    table_name = model._meta.table_name
+    indexes = {index.name for index in db.get_indexes(table_name)}
+    for index in model._meta.fields_to_index():
+        if index._name in indexes:
+            continue
+        log.info(f"add index to {table_name}: {index._name}")
+        db.execute(model._schema._create_index(index, safe=False))
+
+
+def update_case_record(uuid: str, cause=None, **kwargs):
     """
     更新特定测试记录的信息。
+    更新先在内存中合并，由后台线程批量写入数据库；状态变化时同时记录状态变化事件。
+    需要立即读到时调用 get_case_status_writer().flush()。
 
     参数:
     - uuid: str，要更新的案例记录的唯一标识符。
+    - cause: 状态变化的原因。
     - **kwargs: 额外的关键字参数，代表要更新的字段及其新值。
     """
+    get_case_status_writer().update(uuid, cause=cause, **kwargs)
+
+
+def finish_task(task_id: str, uuid: str, error=None):
+    """
+    更新异步任务中一个测试用例的执行结果。
+
+    参数:
+    - task_id: str，异步任务的唯一标识符。
+    - uuid: str，测试用例的唯一标识符。
+    - error: 执行失败的原因，成功时为空。
+    """
+    status = db_const.TASK_STATUS_FAILED if error else db_const.TASK_STATUS_DONE
     try:
-        # 根据UUID更新案例记录中的信息
-        CaseRecord.update(**kwargs).where(CaseRecord.uuid == uuid).execute()
-        log.info(f"update case record {uuid} success")
+        Task.update(
+            status=status, error=error, finished_at=datetime.datetime.now()
+        ).where((Task.task_id == task_id) & (Task.uuid == uuid)).execute()
     except Exception as e:
-        # 记录更新失败的日志并抛出异常
-        log.error(f"update case record: {uuid} , {kwargs}, failed: {e}")
-        # raise e
+        log.error(f"finish task: {task_id}, {uuid}, failed: {e}")
@@ -0,0 +1,103 @@
+import collections
+import hashlib
+import threading
+
+from typing import Callable, Dict
+
+from flask import request, Response
+
+from common.const import RESPONSE_CACHE_MAX_ENTRIES
+
+
+class ResponseCache(object):
+    """
+    读多写少接口的进程内响应缓存。
+
+    每个响应按 key 缓存，并记录生成时的数据版本(如文件 mtime、记录版本号)，
+    版本不变时直接返回缓存的响应体，不再读取文件或重新序列化；
+    缓存数量超过 max_entries 时淘汰最久未使用的响应。
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        # key -> (版本, 响应体, etag)，按最近使用排序
+        self.entries: Dict[str, tuple] = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, version, build: Callable[[], str]) -> tuple:
+        """
+        :param build: 缓存不存在或版本变化时生成响应体
+        :return: (响应体, etag)
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(key)
+                return entry[1], entry[2]
+        body = build()
+        etag = hashlib.sha1(body.encode()).hexdigest()
+        with self.lock:
+            self.entries[key] = (version, body, etag)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return body, etag
+
+
+response_cache = ResponseCache()
+
+
+def version_etag(key, version) -> str:
+    return hashlib.sha1(f"{key}:{version!r}".encode()).hexdigest()
+
+
+def conditional_response(
+    key, build: Callable[[], str], version=None, last_modified=None
+) -> Response:
+    """
+    带 ETag/Last-Modified 的响应，客户端缓存仍有效时返回 304。
+
+    :param key: 缓存 key
+    :param build: 生成响应体(json 字符串)
+    :param version: 数据版本，不为 None 时由 key 和版本计算 ETag，
+        返回 304 时不需要读取数据；为 None 时数据不会变化，按响应体内容计算 ETag
+    :param last_modified: 数据最后修改时间(时间戳)
+    """
+    if version is not None:
+        etag = version_etag(key, version)
+        if is_fresh(etag, last_modified):
+            return not_modified(etag, last_modified)
+    body, body_etag = response_cache.get(key, version, build)
+    if version is None:
+        etag = body_etag
+        if is_fresh(etag, last_modified):
+            return not_modified(etag, last_modified)
+    response = Response(body)
+    set_validators(response, etag, last_modified)
+    return response
+
+
+def is_fresh(etag, last_modified) -> bool:
+    # 客户端携带 If-None-Match 时只按 ETag 判断
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    return (
+        last_modified is not None and since is not None
+        and int(last_modified) <= since.timestamp()
+    )
+
+
+def not_modified(etag, last_modified) -> Response:
+    response = Response(status=304)
+    set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response: Response, etag, last_modified):
+    # 响应体可能被 gzip 压缩，使用弱 ETag
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = int(last_modified)
+    # 客户端每次使用缓存前都需要重新校验
+    response.headers["Cache-Control"] = "no-cache"
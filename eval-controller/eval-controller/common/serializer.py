@@ -0,0 +1,50 @@
+import json
+
+from datetime import date
+
+from eval_lib.databases.mysql.models.base import BaseModel
+
+# orjson 为可选依赖，未安装时使用标准库 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class EvalEncoder(json.JSONEncoder):
+
+    def default(self, obj):
+        if isinstance(obj, BaseModel):
+            return obj.to_json()
+        elif isinstance(obj, date):
+            return obj.strftime(DATE_FORMAT)
+        else:
+            return super(EvalEncoder, self).default(obj)
+
+
+def orjson_default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.to_json()
+    elif isinstance(obj, date):
+        return obj.strftime(DATE_FORMAT)
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    # 时间交给 orjson_default 按 DATE_FORMAT 输出，与标准库 json 的输出保持一致
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+_encoder = EvalEncoder()
+
+
+def dumps(obj) -> str:
+    """
+    序列化接口响应，安装了 orjson 时使用 orjson。
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            obj, default=orjson_default, option=ORJSON_OPTIONS
+        ).decode()
+    return _encoder.encode(obj)
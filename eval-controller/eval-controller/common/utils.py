@@ -1,13 +1,12 @@
 import traceback
-import json
 
-from datetime import date
 from functools import wraps
+from flask import Response
 from common import const
+from common.serializer import dumps
 from eval_lib.common.ssh import SSHPool
 from eval_lib.common import logger
-from eval_lib.common.exceptions import BadRequestException, InternalServerErrorException
-from eval_lib.databases.mysql.models.base import BaseModel
+from eval_lib.common.exceptions import BadRequestException, InternalServerErrorException, ServiceUnavailableException
 
 log = logger.get_logger()
 
@@ -37,6 +36,12 @@ def exception_decorate(function):
                 status=e.status, description=str(e), wait_callback=False
             ), 500
 
+        except ServiceUnavailableException as e:
+            log.error(e)
+            return json_response(
+                status=e.status, description=str(e), wait_callback=False
+            ), 503
+
         except Exception as e:
             log.error(traceback.format_exc())
             return json_response(
@@ -46,17 +51,6 @@ def exception_decorate(function):
     return wrapper
 
 
-class EvalEncoder(json.JSONEncoder):
-
-    def default(self, obj):
-        if isinstance(obj, BaseModel):
-            return obj.to_json()
-        elif isinstance(obj, date):
-            return obj.strftime("%Y-%m-%d %H:%M:%S")
-        else:
-            return super(EvalEncoder, self).default(obj)
-
-
 def json_response(
     status="SUCCESS", description=None, data=None, type=None,
     wait_callback=False, task=None, page=None, flag=None, error_message=None
@@ -81,7 +75,33 @@ def json_response(
         error_message
     )
 
-    return EvalEncoder().encode(data)
+    return dumps(data)
+
+
+def json_stream_response(data: list, type=None, page=None) -> Response:
+    '''Stream a large list as the DATA of a json response
+
+    Rows are serialized JSON_STREAM_BATCH_SIZE at a time, so the whole
+    response body is never built in memory.
+
+    :param data: resource data
+    :types data: list
+    :param type:
+    :param page:
+    :return:
+    '''
+    if type is None and data:
+        type = data[0].__class__.__name__
+    head = dumps(dict_response(type=type, page=page))
+
+    def generate():
+        yield head[:-1] + ',"DATA":['
+        for i in range(0, len(data), const.JSON_STREAM_BATCH_SIZE):
+            rows = dumps(data[i:i + const.JSON_STREAM_BATCH_SIZE])[1:-1]
+            yield rows if i == 0 else "," + rows
+        yield "]}"
+
+    return Response(generate(), mimetype="application/json")
 
 
 def dict_response(
@@ -1,5 +1,5 @@
 import yaml
-from common.const import CONTROLLER_CONFIG_PATH
+from common.const import CONTROLLER_CONFIG_PATH, LOG_STREAM_MAX_DURATION
 import sys
 
 
@@ -25,6 +25,18 @@ class EvaluationConf():
                     'runner_data_dir', "/var/evaluation"
                 )
                 self.max_runner_num = yml.get('max_runner_num', 10)
+                # manager 执行阻塞操作的线程数
+                self.manager_worker_num = yml.get('manager_worker_num', 16)
+                # 各镜像标签预先启动的空闲 runner 数量，如 {"latest": 2}
+                self.runner_pool = yml.get('runner_pool') or {}
+                # helm repo update 的最小间隔(秒)，期间复用本地缓存的 chart
+                self.helm_repo_update_ttl = yml.get('helm_repo_update_ttl', 600)
+                self.parse_server(yml)
+                self.parse_log_ingest(yml)
+                # 解压结果压缩包的线程数
+                self.result_extract_worker_num = yml.get(
+                    'result_extract_worker_num', 2
+                )
                 self.parse_agent_tools(yml)
                 self.parse_platform_tools(yml)
                 self.parse_mysql(yml)
@@ -39,6 +51,39 @@ class EvaluationConf():
     def parse_platform_tools(self, yml):
         self.platform_tools = yml.get("platform-tools", {})
 
+    def parse_server(self, yml):
+        self.server = yml.get("server") or {}
+        # production 使用 gunicorn 多进程服务，development 使用 Flask 自带的单进程服务
+        self.server_mode = self.server.get("mode", "production")
+        # gunicorn 工作进程数
+        self.server_workers = self.server.get("workers", 4)
+        # 每个工作进程处理请求的线程数
+        self.server_threads = self.server.get("threads", 8)
+        # 工作进程处理单个请求的超时时间(秒)，超时后由 gunicorn 重启该进程
+        self.server_timeout = self.server.get("timeout", 120)
+        # 响应体不小于该大小(字节)且客户端支持时使用 gzip 压缩，为 0 时不压缩
+        self.server_gzip_min_size = self.server.get("gzip_min_size", 1024)
+        # 每个工作进程同时等待新日志(长轮询和日志推送)的请求数，超过时返回 503
+        self.server_log_watch_max = self.server.get("log_watch_max", 2)
+        # 日志长轮询的最长等待时间和日志推送连接的最长时间(秒)
+        self.server_log_tail_max_timeout = self.server.get(
+            "log_tail_max_timeout", 20
+        )
+        self.server_log_stream_max_duration = self.server.get(
+            "log_stream_max_duration", LOG_STREAM_MAX_DURATION
+        )
+
+    def parse_log_ingest(self, yml):
+        self.log_ingest = yml.get("log_ingest") or {}
+        # 日志写入线程数，同一 case 的日志由同一线程写入
+        self.log_writer_num = self.log_ingest.get("writer_num", 4)
+        # 每个写入线程的队列长度(批)
+        self.log_queue_size = self.log_ingest.get("queue_size", 1024)
+        # 所有写入线程保持打开的日志文件总数
+        self.log_max_open_files = self.log_ingest.get("max_open_files", 256)
+        # fsync 间隔(秒)，为 0 时每次写入后 fsync
+        self.log_fsync_interval = self.log_ingest.get("fsync_interval", 5)
+
     def parse_mysql(self, yml):
         self.mysql = yml.get("mysql", {})
         self.mysql_host = self.mysql.get("host", "127.0.0.1")
@@ -53,6 +98,11 @@ class EvaluationConf():
         self.redis_port = self.redis.get("port", 6379)
         self.redis_password = self.redis.get("password", "root")
         self.redis_db = self.redis.get("db", "0")
+        self.redis_max_connections = self.redis.get("max_connections", 50)
+        self.redis_health_check_interval = self.redis.get(
+            "health_check_interval", 30
+        )
+        self.redis_socket_keepalive = self.redis.get("socket_keepalive", True)
 
     def is_valid(self):
         return self.listen_port and self.log_dir and self.runner_data_dir
@@ -1,5 +1,4 @@
 import sys
-import multiprocessing
 
 from eval_lib.common.logger import LoggerManager
 from manager.manager import Manager
@@ -19,17 +18,13 @@ if __name__ == '__main__':
     # 初始化MySQL连接
     init_mysql()
 
-    # 使用多进程管理器创建一个消息队列
-    # httpServer写入消息，manager读取消息
-    m = multiprocessing.Manager()
-    message_queue = m.Queue()
-
+    # httpServer 通过 Redis Stream 消息队列写入消息，manager 读取消息
     # 初始化并启动runner管理进程
-    manager = Manager(message_queue)
+    manager = Manager()
     manager.start()
 
     # 初始化并启动服务进程
-    server = ServerProcess(queue=message_queue)
+    server = ServerProcess()
     server.start()
     # 等待服务进程执行完毕
     server.join()
@@ -0,0 +1,81 @@
+import heapq
+import time
+
+from typing import Dict, List
+
+from eval_lib.model.base import CaseParams
+
+
+class AdmissionQueue(object):
+    """
+    等待 runner 空位的 case 队列。
+
+    出队顺序：优先级高的 case 先执行；优先级相同时按用户公平分配，
+    当前占用 runner 越少的用户越先执行；同一用户内按入队时间先后执行。
+    队列内容持久化在 CaseRecord 中(状态为 Init)，Manager 重启后从数据库重建。
+    """
+
+    def __init__(self):
+        self.pending: Dict[str, CaseParams] = {}
+        self.enqueued_at: Dict[str, float] = {}
+
+    def __len__(self):
+        return len(self.pending)
+
+    def __contains__(self, uuid):
+        return uuid in self.pending
+
+    def push(self, params: CaseParams, enqueued_at: float = None):
+        self.pending[params.uuid] = params
+        self.enqueued_at[params.uuid] = enqueued_at or time.time()
+
+    def remove(self, uuid) -> CaseParams:
+        self.enqueued_at.pop(uuid, None)
+        return self.pending.pop(uuid, None)
+
+    def order(self, running_by_user: Dict[str, int]) -> List[CaseParams]:
+        """
+        计算完整的出队顺序。
+
+        :param running_by_user: 各用户当前正在执行的 case 数，未指定用户的 case 记为 ""
+        :return: 按出队顺序排列的 CaseParams 列表，下标即排队位置
+        """
+        # 每个用户内部按 (优先级降序, 入队时间) 排序
+        user_queues: Dict[str, List[CaseParams]] = {}
+        for params in self.pending.values():
+            user_queues.setdefault(params.user or "", []).append(params)
+        for queue in user_queues.values():
+            queue.sort(key=self._case_key)
+
+        load = dict(running_by_user)
+        heap = []
+        for user, queue in user_queues.items():
+            heapq.heappush(heap, self._heap_item(queue[-1], load.get(user, 0)))
+        ordered = []
+        while heap:
+            _, _, _, user = heapq.heappop(heap)
+            params = user_queues[user].pop()
+            ordered.append(params)
+            load[user] = load.get(user, 0) + 1
+            if user_queues[user]:
+                heapq.heappush(
+                    heap, self._heap_item(user_queues[user][-1], load[user])
+                )
+        return ordered
+
+    def pop(self, running_by_user: Dict[str, int]) -> CaseParams:
+        ordered = self.order(running_by_user)
+        if not ordered:
+            return None
+        return self.remove(ordered[0].uuid)
+
+    def _case_key(self, params: CaseParams):
+        # 升序排序后列表尾部为最先出队的 case
+        return (params.priority, -self.enqueued_at[params.uuid])
+
+    def _heap_item(self, params: CaseParams, user_load: int):
+        # 用户名放在最后，仅用于避免比较 CaseParams 对象
+        return (
+            -params.priority, user_load, self.enqueued_at[params.uuid],
+            params.user or ""
+        )
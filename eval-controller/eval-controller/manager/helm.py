@@ -0,0 +1,209 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+from typing import Dict
+
+import yaml
+
+from common.const import POD_STATUS_NAMESPACE
+from common.utils import ssh_pool_default
+from eval_lib.common.logger import get_logger
+from config import conf
+
+log = get_logger()
+
+RUNNER_REPO = "evaluation"
+RUNNER_CHART = f"{RUNNER_REPO}/evaluation-runner"
+
+
+def runner_config() -> dict:
+    """
+    runner 的公共配置，写入 helm values 的 runnerConfig。
+    """
+    return {
+        "redis": conf.redis,
+        "mysql": conf.mysql,
+        "listen_port": conf.listen_port,
+        "agent-tools": conf.agent_tools,
+        "platform-tools": conf.platform_tools,
+        "runner_data_dir": conf.runner_data_dir,
+    }
+
+
+def exec_command(command) -> bool:
+    ssh_client = ssh_pool_default.get(conf.local_host_ip)
+    _, stdout, stderr = ssh_client.exec_command(command)
+    output = stdout.read().decode()
+    error = stderr.read().decode()
+    if error:
+        log.error(f"exec cmd {command} error: {error}")
+        return False
+    log.info(f"exec cmd {command} output: {output}")
+    return True
+
+
+class HelmCache(object):
+    """
+    runner chart 和 values 文件的缓存。
+
+    helm repo update 在 repo_update_ttl 秒内最多执行一次，更新后将 chart 拉取到本地，
+    install 直接使用本地 chart；每个镜像标签的公共 values 只生成一次，
+    每个 case 只写入自己的少量配置，install 时通过多个 -f 合并。
+    同时记录各阶段(repo_update/pull/render/install)的耗时。
+    """
+
+    def __init__(self, repo_update_ttl):
+        self.repo_update_ttl = repo_update_ttl
+        self.chart_dir = f"{conf.runner_data_dir}/charts"
+        self.values_dir = f"{conf.runner_data_dir}/tmp"
+        self.chart_path = None
+        # 上一个版本的 chart，下次更新时删除，避免删除正在 install 的 chart
+        self.old_chart_path = None
+        self.repo_updated_at = 0
+        # 镜像标签 -> 公共 values 文件路径
+        self.base_values: Dict[str, str] = {}
+        self.lock = threading.Lock()
+        # 阶段 -> {"count", "total", "max"}
+        self.phase_stats: Dict[str, dict] = {}
+        self.stats_lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def timer(self, phase, timings: dict = None):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            if timings is not None:
+                timings[phase] = round(elapsed, 3)
+            with self.stats_lock:
+                stats = self.phase_stats.setdefault(
+                    phase, {"count": 0, "total": 0.0, "max": 0.0}
+                )
+                stats["count"] += 1
+                stats["total"] += elapsed
+                stats["max"] = max(stats["max"], elapsed)
+
+    def stats(self) -> dict:
+        with self.stats_lock:
+            return {
+                phase: {
+                    "count": stats["count"],
+                    "avg": round(stats["total"] / stats["count"], 3),
+                    "max": round(stats["max"], 3),
+                } for phase, stats in self.phase_stats.items()
+            }
+
+    def get_chart(self, timings: dict = None) -> str:
+        """
+        :return: 本地 chart 路径，拉取失败时返回仓库中的 chart
+        """
+        with self.lock:
+            if self.chart_path and time.time(
+            ) - self.repo_updated_at < self.repo_update_ttl:
+                return self.chart_path
+            with self.timer("repo_update", timings):
+                if not exec_command(f"helm repo update {RUNNER_REPO}"):
+                    return self.chart_path or RUNNER_CHART
+            chart_dir = f"{self.chart_dir}/{int(time.time())}"
+            with self.timer("pull", timings):
+                if not exec_command(
+                    f"helm pull {RUNNER_CHART} --untar -d {chart_dir}"
+                ):
+                    return self.chart_path or RUNNER_CHART
+            expired_chart_path = self.old_chart_path
+            self.old_chart_path = self.chart_path
+            self.chart_path = f"{chart_dir}/evaluation-runner"
+            self.repo_updated_at = time.time()
+            chart_path = self.chart_path
+        if expired_chart_path:
+            exec_command(f"rm -rf {os.path.dirname(expired_chart_path)}")
+        return chart_path
+
+    def get_base_values(self, image_tag) -> str:
+        with self.lock:
+            values_path = self.base_values.get(image_tag)
+            if values_path is None:
+                values_path = f"{self.values_dir}/runner-values-{image_tag}.yaml"
+                write_values(values_path, {
+                    "runnerConfig": runner_config(),
+                    "image": {"tag": image_tag},
+                })
+                self.base_values[image_tag] = values_path
+            return values_path
+
+    def install(self, release_name, image_tag, config: dict) -> bool:
+        """
+        :param config: case 相关的 runnerConfig，与公共 values 合并
+        """
+        timings = {}
+        try:
+            chart = self.get_chart(timings)
+            with self.timer("render", timings):
+                base_values_path = self.get_base_values(image_tag)
+                values_path = f"{self.values_dir}/{release_name}.yaml"
+                write_values(values_path, {"runnerConfig": config})
+            with self.timer("install", timings):
+                result = exec_command(
+                    f"helm install {release_name} {chart} -n {POD_STATUS_NAMESPACE} --create-namespace -f {base_values_path} -f {values_path}"
+                )
+            # values 已写入 release，不再需要
+            os.remove(values_path)
+            return result
+        except Exception as e:
+            log.error(f"helm install {release_name} error: {e}")
+            return False
+        finally:
+            log.info(f"helm install {release_name} timings: {timings}")
+
+
+def write_values(file_path, values: dict):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'w') as file:
+        yaml.dump(values, file)
+    if not os.path.exists(file_path):
+        log.error(f"file :{file_path} not found")
+
+
+_helm_cache: HelmCache = None
+_helm_cache_lock = threading.Lock()
+
+
+def get_helm_cache() -> HelmCache:
+    global _helm_cache
+    with _helm_cache_lock:
+        if _helm_cache is None:
+            _helm_cache = HelmCache(conf.helm_repo_update_ttl)
+        return _helm_cache
+
+
+def install(release_name, image_tag, config: dict) -> bool:
+    return get_helm_cache().install(release_name, image_tag, config)
+
+
+def uninstall(release_name) -> bool:
+    command = f"helm uninstall {release_name} -n {POD_STATUS_NAMESPACE}"
+    ssh_client = ssh_pool_default.get(conf.local_host_ip)
+    _, _, stderr = ssh_client.exec_command(command)
+    error = stderr.read().decode()
+    if error:
+        log.error(f"uninstall env {release_name} error: {error}")
+        return False
+    return True
+
+
+def list_releases() -> set:
+    command = f"helm list -n {POD_STATUS_NAMESPACE} -a -o json"
+    ssh_client = ssh_pool_default.get(conf.local_host_ip)
+    _, stdout, stderr = ssh_client.exec_command(command)
+    output = stdout.read().decode()
+    if not output:
+        raise Exception(f"exec cmd {command} error: {stderr.read().decode()}")
+    return {release["name"] for release in json.loads(output)}
+
+
+def stats() -> dict:
+    return get_helm_cache().stats()
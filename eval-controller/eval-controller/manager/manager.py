@@ -1,119 +1,487 @@
-import multiprocessing
+import asyncio
+import datetime
+import heapq
+import functools
+import json
 import time
-import threading
 import traceback
 import sys
 import os
-import traceback
 
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
 from multiprocessing import Process
 
 from eval_lib.model.base import CaseParams
 from eval_lib.databases.mysql.models.models import CaseRecord
 from eval_lib.databases.mysql import const as db_const
 from manager.runner import Runner
+from manager.pod_status import PodStatusCache
+from manager.admission import AdmissionQueue
+from manager.recovery import RunnerRecovery
+from manager.runner_pool import RunnerPool
+from manager.runner_events import RunnerEventListener
+from manager import helm
+from common.const import REDIS_POOL_STATS_INTERVAL, RUNNER_DURATION_ESTIMATE, MESSAGE_QUEUE_BLOCK, RUNNER_POOL_REFILL_INTERVAL, RUNNER_RECOVERY_CLEANUP_INTERVAL, RUNNER_RECOVERY_CLEANUP_RETRY
+from common.mysql import update_case_record, finish_task
+from common.case_status import get_case_status_writer
+from common.message_queue import new_message_queue
+from eval_lib.databases.redis.client import pool_stats as redis_pool_stats
+from eval_lib.databases.redis.message_queue import RedisMessageQueue
 from eval_lib.common.logger import get_logger
-from eval_lib.model.const import CASE_PARAMS_STATUS_CREATE, CASE_PARAMS_STATUS_PAUSE, CASE_PARAMS_STATUS_CANCEL, CASE_PARAMS_STATUS_RESUME
+from eval_lib.model.const import CASE_PARAMS_STATUS_CREATE, CASE_PARAMS_STATUS_PAUSE, CASE_PARAMS_STATUS_CANCEL, CASE_PARAMS_STATUS_RESUME, CASE_PARAMS_STATUS_FROCE_END
 from config import conf
 
 log = get_logger()
-RUNNER_TIMEOUT = 60 * 60
 
 
 class Manager(Process):
+    """
+    runner 调度进程。
+
+    所有 runner 的生命周期由同一个 asyncio 事件循环以状态机方式驱动，
+    SSH/MySQL/Redis 等阻塞操作统一提交到固定大小的线程池中执行，
+    不再为每个 case 创建一个线程。
+    新建的 case 先进入排队队列，runner 数量低于 max_runner_num 时按优先级和用户公平性出队执行。
+    控制消息从 Redis Stream 读取，处理后确认，重启后重新处理未确认的消息。
+    runner 执行完成的事件通过 Redis 订阅接收，收到结果后回复确认，runner 随即退出。
+    重启后接管仍在运行的 runner，继续等待其执行完成。
+    按配置为每个镜像标签维护预热的空闲 runner，case 优先分配给空闲 runner。
+    """
 
-    def __init__(self, q):
+    def __init__(self):
         super().__init__()
-        self.message_queue: multiprocessing.Queue = q
-        self.runner_queue: List[Runner] = []
+        self.message_queue: RedisMessageQueue = None
+        self.runners: Dict[str, Runner] = {}
+        self.admission_queue = AdmissionQueue()
+        # 已写入数据库的排队信息，uuid -> (排队位置, 预计开始时间)
+        self.queue_info: Dict[str, tuple] = {}
+        # runner 平均执行时长，用于估算排队 case 的开始时间
+        self.runner_duration = RUNNER_DURATION_ESTIMATE
+        # 刷新排队信息的 task，同一时刻只有一个
+        self.queue_info_task: asyncio.Task = None
+        # 刷新期间排队队列又发生变化，刷新完成后需要再刷新一次
+        self.queue_info_dirty = False
+        self.pod_status_cache = PodStatusCache(conf.local_host_ip)
+        self.runner_pool: RunnerPool = None
+        self.runner_events: RunnerEventListener = None
+        self.loop: asyncio.AbstractEventLoop = None
         self.init()
 
     def init(self):
         try:
             main_file_path = os.path.abspath(sys.modules['__main__'].__file__)
             os.chdir(os.path.dirname(main_file_path))
-            CaseRecord.update(status=db_const.CASE_RECORD_STATUS_EXCEPTION
-                              ).where(
-                                  CaseRecord.status.not_in([
-                                      db_const.CASE_RECORD_STATUS_FINISHED,
-                                      db_const.CASE_RECORD_STATUS_ERROR,
-                                      db_const.CASE_RECORD_STATUS_EXCEPTION
-                                  ])
-                              ).execute()
         except Exception as e:
             log.error(e)
 
     def run(self):
-        monitor_t = threading.Thread(target=self.monitor_runner_queue)
-        monitor_t.start()
+        # 在子进程中启动共享的 pod 状态刷新线程
+        self.pod_status_cache.start()
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        # 阻塞操作使用的线程池
+        self.loop.set_default_executor(
+            ThreadPoolExecutor(
+                max_workers=conf.manager_worker_num,
+                thread_name_prefix="manager-worker"
+            )
+        )
+        # 消息队列的 get 会阻塞，单独占用一个线程
+        queue_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="manager-queue"
+        )
+        self.message_queue = new_message_queue()
+        # runner 完成等事件通过 Redis 订阅通知，不再依赖轮询
+        self.runner_events = RunnerEventListener(self.loop)
+        self.runner_events.start()
+        self.runner_pool = RunnerPool(self.pod_status_cache)
+        self.monitor_task = self.loop.create_task(self.monitor())
+        # 先接管仍在运行的 runner，再恢复排队中的 case
+        await self.recover()
+        if self.runner_pool.sizes:
+            # 清理遗留的空闲 runner 需在调度前完成，否则可能卸载刚分配给 case 的 release
+            await self.cleanup_runner_pool()
+            self.runner_pool_task = self.loop.create_task(
+                self.maintain_runner_pool()
+            )
+        try:
+            await self.load_pending()
+        except Exception as e:
+            log.error(traceback.format_exc())
+            log.error(f"load pending cases error: {e}")
         while True:
             try:
-                message = self.message_queue.get()
-                log.info(f"get message {vars(message)}")
-                if message.status == CASE_PARAMS_STATUS_CREATE:
-                    log.info(f"insert test queue: {vars(message)}")
-                    self.insert(message)
-                elif message.status == CASE_PARAMS_STATUS_PAUSE:
-                    log.info(f"pause test queue: {vars(message)}")
-                    self.pause(message)
-                elif message.status == CASE_PARAMS_STATUS_CANCEL:
-                    log.info(f"cancel test queue: {vars(message)}")
-                    self.cancel(message)
-                elif message.status == CASE_PARAMS_STATUS_RESUME:
-                    log.info(f"resume test queue: {vars(message)}")
-                    self.resume(message)
+                await self.loop.run_in_executor(
+                    queue_executor, self.message_queue.ensure_group
+                )
+                while True:
+                    messages = await self.loop.run_in_executor(
+                        queue_executor, self.message_queue.get,
+                        MESSAGE_QUEUE_BLOCK
+                    )
+                    for message_id, message in messages:
+                        # 消息在回复时确认，回复前 manager 重启时重新处理
+                        params = None
+                        try:
+                            params = CaseParams(message)
+                            self.dispatch(message_id, params)
+                        except Exception as e:
+                            log.error(traceback.format_exc())
+                            log.error(f"dispatch message {message_id} error: {e}")
+                            if params is not None:
+                                self.reply(message_id, params, error=str(e))
+                            else:
+                                # 无法解析的消息不再重新处理
+                                await self.loop.run_in_executor(
+                                    queue_executor, self.message_queue.ack,
+                                    message_id
+                                )
             except Exception as e:
                 log.error(e)
-                log.error(traceback.print_exc())
-                time.sleep(5)
+                log.error(traceback.format_exc())
+                await asyncio.sleep(5)
+
+    def dispatch(self, message_id, message: CaseParams):
+        log.info(f"get message {message_id} {vars(message)}")
+        reply = functools.partial(self.reply, message_id, message)
+        if message.status == CASE_PARAMS_STATUS_CREATE:
+            log.info(f"insert test queue: {vars(message)}")
+            self.insert(message)
+            reply()
+        elif message.status == CASE_PARAMS_STATUS_PAUSE:
+            log.info(f"pause test queue: {vars(message)}")
+            self.pause(message, reply)
+        elif message.status == CASE_PARAMS_STATUS_CANCEL:
+            log.info(f"cancel test queue: {vars(message)}")
+            self.cancel(message, reply)
+        elif message.status == CASE_PARAMS_STATUS_RESUME:
+            log.info(f"resume test queue: {vars(message)}")
+            self.resume(message, reply)
+        elif message.status == CASE_PARAMS_STATUS_FROCE_END:
+            log.info(f"force end test queue: {vars(message)}")
+            self.force_end(message, reply)
+        else:
+            reply(error="unsupported status")
+
+    def reply(self, message_id, message: CaseParams, error=None):
+        """
+        回复 server，server 收到回复后返回请求结果。
+        暂停、取消等消息在 runner 开始处理(进入中间状态)时才回复，回复后确认消息，
+        此前 manager 重启时消息会重新处理。
+        """
+        self.loop.run_in_executor(
+            None, self.send_reply, message_id, message, error
+        )
+
+    def send_reply(self, message_id, message: CaseParams, error=None):
+        reply = {
+            "uuid": message.uuid,
+            "status": message.status,
+            "error": error
+        }
+        # 在线程池中执行，异常不会被调用方获取，需在此记录
+        try:
+            # 回复前写入合并中的 case 状态，server 收到回复后即可读到
+            get_case_status_writer().flush()
+        except Exception as e:
+            log.error(f"flush case status before reply error: {e}")
+        try:
+            if message.task_id:
+                # 异步任务的消息：先更新任务状态，再唤醒等待该任务的请求
+                finish_task(message.task_id, message.uuid, error)
+                self.message_queue.notify(message.task_id)
+            else:
+                self.message_queue.reply(message_id, reply)
+        except Exception as e:
+            log.error(traceback.format_exc())
+            log.error(f"reply message {message_id} error: {e}")
+        try:
+            self.message_queue.ack(message_id)
+        except Exception as e:
+            log.error(f"ack message {message_id} error: {e}")
+
+    async def recover(self):
+        """
+        接管 controller 重启前仍在运行的 runner，只有找不到 release 或 runner 信息的 case 标记为异常；
+        接管失败时所有未接管的执行中 case 标记为异常。
+        """
+        recovery = RunnerRecovery(self.pod_status_cache)
+        try:
+            runners, orphans = await self.loop.run_in_executor(
+                None, recovery.recover
+            )
+            for runner in runners:
+                self.add_runner(runner)
+            log.info(f"recover runners: {len(runners)}, orphans: {orphans}")
+            return
+        except Exception as e:
+            log.error(traceback.format_exc())
+            log.error(f"recover runners error: {e}")
+        # 接管失败时未接管的 case 标记为异常
+        try:
+            lost = await self.loop.run_in_executor(
+                None, recovery.mark_lost, set(self.runners)
+            )
+            log.info(f"mark unrecovered cases exception: {lost}")
+        except Exception as e:
+            log.error(traceback.format_exc())
+            log.error(f"mark unrecovered cases error: {e}")
+            return
+        if lost:
+            self.loop.create_task(self.remove_lost(recovery, lost))
+
+    async def remove_lost(self, recovery: RunnerRecovery, uuids):
+        """
+        清理接管失败的 case 残留的 release 和 runner 信息，helm 或 Redis 仍不可用时稍后重试。
+        """
+        for _ in range(RUNNER_RECOVERY_CLEANUP_RETRY):
+            try:
+                uuids = await self.loop.run_in_executor(
+                    None, recovery.remove_lost, uuids
+                )
+            except Exception as e:
+                log.error(traceback.format_exc())
+                log.error(f"remove lost runners error: {e}")
+            if not uuids:
+                return
+            await asyncio.sleep(RUNNER_RECOVERY_CLEANUP_INTERVAL)
+        log.error(f"remove lost runners failed: {uuids}")
+
+    async def load_pending(self):
+        """
+        从数据库恢复排队中的 case。
+        """
+        crs = await self.loop.run_in_executor(
+            None, lambda: list(
+                CaseRecord.select().where(
+                    (CaseRecord.status == db_const.CASE_RECORD_STATUS_INIT) &
+                    (CaseRecord.deleted == db_const.CASE_RECORD_NOT_DELETED)
+                )
+            )
+        )
+        for cr in crs:
+            if cr.case_params:
+                params = CaseParams(json.loads(cr.case_params))
+            else:
+                params = CaseParams(
+                    uuid=cr.uuid, case_name=cr.case_name, user=cr.user,
+                    runner_image_tag=cr.runner_image_tag,
+                    priority=cr.priority
+                )
+            params.status = CASE_PARAMS_STATUS_CREATE
+            enqueued_at = cr.created_at.timestamp() if cr.created_at else None
+            self.admission_queue.push(params, enqueued_at)
+        log.info(f"load pending cases: {len(crs)}")
+        self.schedule()
 
     def insert(self, params: CaseParams):
-        r = Runner(params)
-        self.runner_queue.append(r)
-        r.start()
-
-    def pause(self, params: CaseParams):
-        for runner in self.runner_queue:
-            if runner.uuid == params.uuid:
-                runner.signal(runner.pause)
+        if params.uuid in self.runners or params.uuid in self.admission_queue:
+            log.error(f"insert: runner {params.uuid} already exists")
+            return
+        self.admission_queue.push(params)
+        self.schedule()
+
+    def running_by_user(self) -> Dict[str, int]:
+        running = {}
+        for runner in self.runners.values():
+            user = runner.case_params.user or ""
+            running[user] = running.get(user, 0) + 1
+        return running
+
+    def schedule(self):
+        """
+        有空闲 runner 时从排队队列中取出 case 执行，并刷新排队位置和预计开始时间。
+        runner 结束后立即调用，空出的 runner 马上被复用。
+        """
+        while len(self.runners) < conf.max_runner_num:
+            params = self.admission_queue.pop(self.running_by_user())
+            if params is None:
                 break
+            log.info(f"start runner {params.uuid}, pending: {len(self.admission_queue)}")
+            self.start_runner(params)
+        if self.queue_info_task is None or self.queue_info_task.done():
+            self.queue_info_task = self.loop.create_task(
+                self.update_queue_info()
+            )
         else:
-            log.error("pause: not found runner")
+            self.queue_info_dirty = True
+
+    def start_runner(self, params: CaseParams):
+        self.queue_info.pop(params.uuid, None)
+        self.add_runner(
+            Runner(params, self.pod_status_cache, self.runner_pool)
+        )
+
+    def add_runner(self, runner: Runner):
+        self.runners[runner.uuid] = runner
+        runner.runner_events = self.runner_events
+        # 事件循环只持有 task 的弱引用，由 runner 持有
+        runner.task = self.loop.create_task(self.supervise(runner))
+
+    async def supervise(self, runner: Runner):
+        try:
+            await runner.run()
+        except Exception as e:
+            log.error(traceback.format_exc())
+            log.error(f"runner {runner.uuid} error: {e}")
+        finally:
+            # 移除runner，未处理的控制消息直接回复
+            self.runners.pop(runner.uuid, None)
+            self.runner_events.unregister(runner.uuid)
+            get_case_status_writer().forget(runner.uuid)
+            runner.reply_signal()
+            duration = time.time() - runner.start_time
+            self.runner_duration = 0.8 * self.runner_duration + 0.2 * duration
+            self.schedule()
+
+    def estimate_start_times(self, count) -> list:
+        """
+        估算排队中前 count 个 case 的开始时间。
+        每个 runner 的剩余时长按平均执行时长估算，依次分配给排队的 case。
+        """
+        now = time.time()
+        slots = [
+            now + max(self.runner_duration - (now - r.start_time), 0)
+            for r in self.runners.values()
+        ]
+        slots += [now] * max(conf.max_runner_num - len(slots), 0)
+        if not slots:
+            return [None] * count
+        heapq.heapify(slots)
+        start_times = []
+        for _ in range(count):
+            start_time = heapq.heappop(slots)
+            start_times.append(start_time)
+            heapq.heappush(slots, start_time + self.runner_duration)
+        return start_times
 
-    def cancel(self, params: CaseParams):
-        for runner in self.runner_queue:
-            if runner.uuid == params.uuid:
-                runner.signal(runner.cancel)
+    async def update_queue_info(self):
+        """
+        刷新排队位置和预计开始时间，刷新期间的多次调度合并为一次后续刷新。
+        """
+        while True:
+            self.queue_info_dirty = False
+            try:
+                await self.write_queue_info()
+            except Exception as e:
+                log.error(traceback.format_exc())
+                log.error(f"update queue info error: {e}")
+            if not self.queue_info_dirty:
                 break
-        else:
+
+    async def write_queue_info(self):
+        ordered = self.admission_queue.order(self.running_by_user())
+        start_times = self.estimate_start_times(len(ordered))
+        updates = {}
+        for position, (params, start_time) in enumerate(
+            zip(ordered, start_times), start=1
+        ):
+            # 预计开始时间精确到分钟，避免频繁写库
+            expected_start_at = datetime.datetime.fromtimestamp(
+                start_time // 60 * 60
+            ) if start_time else None
+            info = (position, expected_start_at)
+            if self.queue_info.get(params.uuid) != info:
+                self.queue_info[params.uuid] = info
+                updates[params.uuid] = info
+        for uuid, (position, expected_start_at) in updates.items():
+            await self.loop.run_in_executor(
+                None, lambda: update_case_record(
+                    uuid, queue_position=position,
+                    expected_start_at=expected_start_at
+                )
+            )
+
+    def pause(self, params: CaseParams, reply):
+        runner = self.runners.get(params.uuid)
+        if runner is None:
+            log.error("pause: not found runner")
+            reply(error="runner not found")
+            return
+        runner.signal(runner.pause, reply)
+
+    def cancel(self, params: CaseParams, reply):
+        if params.uuid in self.admission_queue:
+            self.dequeue(params.uuid)
+            reply()
+            return
+        runner = self.runners.get(params.uuid)
+        if runner is None:
             log.error("cancel: not found runner")
+            reply(error="runner not found")
+            return
+        runner.signal(runner.cancel, reply)
 
-    def resume(self, params: CaseParams):
-        for runner in self.runner_queue:
-            if runner.uuid == params.uuid:
-                runner.signal(runner.resume)
-                break
-        else:
+    def force_end(self, params: CaseParams, reply):
+        if params.uuid in self.admission_queue:
+            self.dequeue(params.uuid)
+            reply()
+            return
+        runner = self.runners.get(params.uuid)
+        if runner is not None:
+            # 运行中的 runner 不再收集结果，直接卸载 release
+            runner.force_end()
+        reply()
+
+    def dequeue(self, uuid):
+        """
+        取消排队中的 case。
+        """
+        self.admission_queue.remove(uuid)
+        self.queue_info.pop(uuid, None)
+        self.loop.run_in_executor(
+            None, lambda: update_case_record(
+                uuid, status=db_const.CASE_RECORD_STATUS_FINISHED,
+                queue_position=None, expected_start_at=None,
+                cause="cancelled in queue"
+            )
+        )
+        self.schedule()
+
+    def resume(self, params: CaseParams, reply):
+        runner = self.runners.get(params.uuid)
+        if runner is None:
             log.error("resume: not found runner")
+            reply(error="runner not found")
+            return
+        runner.signal(runner.resume, reply)
+
+    async def cleanup_runner_pool(self):
+        """
+        卸载上次运行遗留的空闲 runner，接管的 runner 使用的 release 不卸载。
+        """
+        try:
+            in_use = {runner.release_name for runner in self.runners.values()}
+            await self.loop.run_in_executor(
+                None, self.runner_pool.cleanup, in_use
+            )
+        except Exception as e:
+            log.error(traceback.format_exc())
+            log.error(f"cleanup runner pool error: {e}")
+
+    async def maintain_runner_pool(self):
+        """
+        补齐预热池中的空闲 runner。
+        """
+        while True:
+            try:
+                await self.loop.run_in_executor(None, self.runner_pool.refill)
+            except Exception as e:
+                log.error(traceback.format_exc())
+                log.error(f"refill runner pool error: {e}")
+            await asyncio.sleep(RUNNER_POOL_REFILL_INTERVAL)
 
-    def monitor_runner_queue(self):
+    async def monitor(self):
         while True:
             try:
-                for r in self.runner_queue:
-                    if not r.is_alive():
-                        pass
-                    elif r.timeout(RUNNER_TIMEOUT):
-                        r.cancel()
-                    else:
-                        continue
-                    # TODO：收集结果
-
-                    # 移除runner
-                    r.remove_env()
-                    self.runner_queue.remove(r)
-                time.sleep(3)
+                # 输出 redis 连接池使用情况，用于评估连接池大小
+                log.info(f"redis pool stats: {redis_pool_stats()}")
+                log.info(f"active runners: {len(self.runners)}")
+                log.info(f"helm phase timings: {helm.stats()}")
             except Exception as e:
                 log.error(traceback.format_exc())
                 log.error(e)
-                time.sleep(3)
+            await asyncio.sleep(REDIS_POOL_STATS_INTERVAL)
@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+
+from typing import Dict
+
+from common.const import POD_STATUS_NAMESPACE, POD_STATUS_REFRESH_INTERVAL
+from common.utils import ssh_pool_default
+from eval_lib.common.logger import get_logger
+
+log = get_logger()
+
+
+class PodStatusCache(threading.Thread):
+    """
+    evaluation 命名空间下 pod 状态的共享缓存。
+
+    由 Manager 持有，每个刷新周期只执行一次 `kubectl get pods -o json`，
+    所有 Runner 从内存中读取自己 pod 的状态，避免每个 Runner 各自通过 SSH 轮询。
+    """
+
+    def __init__(
+        self, host_ip, namespace=POD_STATUS_NAMESPACE,
+        interval=POD_STATUS_REFRESH_INTERVAL
+    ):
+        super().__init__(name="pod-status-cache", daemon=True)
+        self.host_ip = host_ip
+        self.namespace = namespace
+        self.interval = interval
+        # pod 名称 -> pod 状态(Pending/Running/Succeeded/Failed/Unknown)
+        self.pods: Dict[str, str] = {}
+        self.last_refresh_time = 0
+        self.lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                log.error(f"refresh pod status error: {e}")
+            self._stop_event.wait(self.interval)
+
+    def refresh(self):
+        command = f"kubectl get pods -n {self.namespace} -o json"
+        ssh_client = ssh_pool_default.get(self.host_ip)
+        _, stdout, stderr = ssh_client.exec_command(command)
+        output = stdout.read().decode()
+        if not output:
+            log.error(f"exec cmd {command} error: {stderr.read().decode()}")
+            return
+        pods = {}
+        for item in json.loads(output).get("items", []):
+            name = item.get("metadata", {}).get("name")
+            if not name:
+                continue
+            pods[name] = self.pod_status(item)
+        with self.lock:
+            self.pods = pods
+            self.last_refresh_time = time.time()
+
+    @staticmethod
+    def pod_status(item: dict) -> str:
+        """
+        计算 pod 状态，与 `kubectl get pod` 输出中的 STATUS 含义保持一致：
+        phase 为 Running 但容器未就绪(如 CrashLoopBackOff)时不视为 Running。
+        """
+        status = item.get("status", {})
+        phase = status.get("phase", "Unknown")
+        if item.get("metadata", {}).get("deletionTimestamp"):
+            return "Terminating"
+        if phase != "Running":
+            return phase
+        for container in status.get("containerStatuses", []):
+            if "running" not in container.get("state", {}):
+                return "NotReady"
+        return phase
+
+    def get_pods(self, prefix: str) -> Dict[str, str]:
+        with self.lock:
+            return {
+                name: status
+                for name, status in self.pods.items()
+                if name.startswith(prefix)
+            }
+
+    def is_running(self, prefix: str) -> bool:
+        return "Running" in self.get_pods(prefix).values()
+
+    def refresh_age(self) -> float:
+        """
+        距上次成功刷新的秒数，从未刷新成功时返回无穷大。
+        """
+        with self.lock:
+            if not self.last_refresh_time:
+                return float("inf")
+            return time.time() - self.last_refresh_time
@@ -0,0 +1,170 @@
+import json
+import time
+
+from typing import List, Tuple
+
+from common.const import RUNNER_STATE_WAIT, RUNNER_STATE_GET_RESULTS
+from manager import helm
+from common.mysql import update_case_record
+from manager.runner import Runner
+from manager.pod_status import PodStatusCache
+from eval_lib.common.logger import get_logger
+from eval_lib.model.base import CaseParams
+from eval_lib.databases.mysql.models.models import CaseRecord
+from eval_lib.databases.mysql import const as db_const
+from eval_lib.databases.redis import const as redis_const
+
+log = get_logger()
+
+# 重启前仍在执行中的 case 状态，排队中(Init)的 case 由排队队列恢复
+ACTIVE_CASE_RECORD_STATUS = [
+    db_const.CASE_RECORD_STATUS_STARTED,
+    db_const.CASE_RECORD_STATUS_STARTING,
+    db_const.CASE_RECORD_STATUS_PENDING,
+    db_const.CASE_RECORD_STATUS_PAUSED,
+    db_const.CASE_RECORD_STATUS_PAUSING,
+    db_const.CASE_RECORD_STATUS_STOPPING,
+]
+
+
+class RunnerRecovery(object):
+    """
+    controller 重启后接管仍在运行的 runner。
+
+    对每个执行中的 case，helm release 和 Redis 中的 runner 信息都存在时，
+    重建 Runner 并从 wait(或 get_results)状态继续执行；
+    否则视为孤儿 case，清理残留的 release 和 runner 信息后标记为异常；
+    单个 case 接管出错时同样按孤儿处理，不影响其他 case。
+    所有方法都是阻塞的，由 Manager 在线程池中调用。
+    """
+
+    def __init__(self, pod_status_cache: PodStatusCache):
+        self.pod_status_cache = pod_status_cache
+
+    def recover(self) -> Tuple[List[Runner], List[str]]:
+        """
+        :return: (可以继续执行的 runner, 已标记为异常的 case uuid)
+        """
+        crs = list(
+            CaseRecord.select().where(
+                CaseRecord.status.in_(ACTIVE_CASE_RECORD_STATUS) &
+                (CaseRecord.deleted == db_const.CASE_RECORD_NOT_DELETED)
+            )
+        )
+        if not crs:
+            return [], []
+        releases = helm.list_releases()
+        runners = []
+        orphans = []
+        for cr in crs:
+            runner = self.new_runner(cr)
+            cause = "runner lost on restart"
+            try:
+                try:
+                    runner_info = runner.redis_db.get_runner_info(uuid=cr.uuid)
+                except Exception as e:
+                    log.error(f"get runner info {cr.uuid} error: {e}")
+                    runner_info = {}
+                # 预热池中的 runner 使用自己的 release 名称
+                runner.release_name = runner_info.get(
+                    "release-name", runner.release_name
+                )
+                if runner.release_name in releases and runner_info:
+                    self.attach(runner, cr, runner_info)
+                    runners.append(runner)
+                    continue
+                log.warning(
+                    f"orphan case {cr.uuid}: release exists: {runner.release_name in releases}, runner info exists: {bool(runner_info)}"
+                )
+            except Exception as e:
+                log.error(f"recover runner {cr.uuid} error: {e}")
+                cause = "runner recovery failed"
+            # 清理残留的 release 和 runner 信息
+            runner.remove_env()
+            update_case_record(
+                cr.uuid, status=db_const.CASE_RECORD_STATUS_EXCEPTION,
+                cause=cause
+            )
+            orphans.append(cr.uuid)
+        return runners, orphans
+
+    def mark_lost(self, recovered) -> List[str]:
+        """
+        接管失败(如 helm 或 Redis 不可用)时的兜底处理：
+        除已接管的 case 外，所有执行中的 case 标记为异常，避免一直停留在执行中状态；
+        残留的 release 和 runner 信息由 remove_lost 清理。
+
+        :param recovered: 已接管的 case uuid
+        :return: 标记为异常的 case uuid
+        """
+        crs = CaseRecord.select(CaseRecord.uuid).where(
+            CaseRecord.status.in_(ACTIVE_CASE_RECORD_STATUS) &
+            (CaseRecord.deleted == db_const.CASE_RECORD_NOT_DELETED)
+        )
+        lost = [cr.uuid for cr in crs if cr.uuid not in recovered]
+        for uuid in lost:
+            update_case_record(
+                uuid, status=db_const.CASE_RECORD_STATUS_EXCEPTION,
+                cause="runner recovery failed"
+            )
+        return lost
+
+    def remove_lost(self, uuids) -> List[str]:
+        """
+        尽力卸载已标记为异常的 case 残留的 release 并删除 runner 信息，
+        避免 pod 泄漏一直占用集群资源。
+
+        :return: 清理失败、需要稍后重试的 case uuid
+        """
+        try:
+            releases = helm.list_releases()
+        except Exception as e:
+            log.error(f"list releases error: {e}")
+            return list(uuids)
+        failed = []
+        for uuid in uuids:
+            runner = Runner(CaseParams(uuid=uuid), self.pod_status_cache)
+            try:
+                runner_info = runner.redis_db.get_runner_info(uuid=uuid)
+                runner.release_name = runner_info.get(
+                    "release-name", runner.release_name
+                )
+                if runner.release_name in releases and not helm.uninstall(
+                    runner.release_name
+                ):
+                    raise Exception(f"uninstall {runner.release_name} failed")
+                runner.redis_db.delete_runner_info(uuid=uuid)
+            except Exception as e:
+                log.error(f"remove lost runner {uuid} error: {e}")
+                failed.append(uuid)
+        return failed
+
+    def new_runner(self, cr: CaseRecord) -> Runner:
+        if cr.case_params:
+            params = CaseParams(json.loads(cr.case_params))
+        else:
+            params = CaseParams(
+                uuid=cr.uuid, case_name=cr.case_name, user=cr.user,
+                runner_image_tag=cr.runner_image_tag, priority=cr.priority
+            )
+        return Runner(params, self.pod_status_cache)
+
+    def attach(self, runner: Runner, cr: CaseRecord, runner_info: dict):
+        runner.create_data_dir()
+        # 重启前的执行时长未知，超时时间从接管时开始计算
+        runner.start_time = int(time.time())
+        if runner_info.get("runner-status") == redis_const.CASE_STATUS_COMPLETED:
+            runner.state = RUNNER_STATE_GET_RESULTS
+        else:
+            runner.state = RUNNER_STATE_WAIT
+            # 已暂停/正在暂停的 case 不能被改回执行中
+            runner.runner_started = cr.status not in [
+                db_const.CASE_RECORD_STATUS_STARTING,
+                db_const.CASE_RECORD_STATUS_PENDING
+            ]
+            # 重启时正在处理的暂停/取消请求重新下发
+            if cr.status == db_const.CASE_RECORD_STATUS_PAUSING:
+                runner.signal(runner.pause)
+            elif cr.status == db_const.CASE_RECORD_STATUS_STOPPING:
+                runner.signal(runner.cancel)
+        log.info(f"recover runner {runner.uuid}, state: {runner.state}")
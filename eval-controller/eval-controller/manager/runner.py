@@ -1,110 +1,233 @@
+import asyncio
 import datetime
-import threading
+import functools
 import time
+import traceback
 import requests
-import yaml
 from config import conf
-from common.const import POD_MAX_ABNORMAL_STATUS_NUMBER
+from common.const import POD_MAX_ABNORMAL_STATUS_NUMBER, POD_STATUS_STALE_TIMEOUT, RUNNER_TIMEOUT, RUNNER_STATUS_CHECK_INTERVAL, RUNNER_STEP_STALL_TIMEOUT, RUNNER_CASE_SYNC_TIMEOUT
+from common.const import RUNNER_STATE_INIT, RUNNER_STATE_EXEC_ENV, RUNNER_STATE_WAIT, RUNNER_STATE_GET_RESULTS, RUNNER_STATE_REMOVE_ENV, RUNNER_STATE_DONE
 from eval_lib.databases.redis.runner_info import RedisRunnerInfo
-from common.utils import ssh_pool_default
 from eval_lib.common.logger import get_logger
 from eval_lib.model.base import CaseParams
 from eval_lib.databases.mysql import const as db_const
 from eval_lib.databases.redis import const as redis_const
 from common.mysql import update_case_record
 from report.report import ReportManager
+from manager.pod_status import PodStatusCache
+from manager.runner_pool import RunnerPool
+from manager.runner_events import RunnerEventListener
+from manager import helm
 import os
 
 ALLURE_SERVER = "http://10.1.19.19:20080"
 log = get_logger()
 
 
-class Runner(threading.Thread):
+class Runner(object):
 
-    def __init__(self, params: CaseParams):
-        super().__init__()
+    def __init__(
+        self, params: CaseParams, pod_status_cache: PodStatusCache,
+        runner_pool: RunnerPool = None
+    ):
         self.case_params = params
         self.uuid = params.uuid
         self.image_tag = params.runner_image_tag
         self.start_time = int(time.time())
         self.redis_db = RedisRunnerInfo(
             host=conf.redis_host, port=conf.redis_port,
-            password=conf.redis_password, db=conf.redis_db, max_connections=10
+            password=conf.redis_password, db=conf.redis_db,
+            max_connections=conf.redis_max_connections,
+            health_check_interval=conf.redis_health_check_interval,
+            socket_keepalive=conf.redis_socket_keepalive
         )
         self.local_host_ip = conf.local_host_ip
         self.runner_data_path = f"{conf.runner_data_dir}/runner-{self.uuid}"
         self.release_name = f"runner-{self.uuid[:8]}"
+        self.pod_status_cache = pod_status_cache
+        self.runner_pool = runner_pool
+        # 由 Manager 设置，用于在 runner 状态变化或收到控制消息时立即唤醒等待
+        self.runner_events: RunnerEventListener = None
+        # 是否使用预热池中的空闲 runner
+        self.pooled = False
         self.callback = None
-        self.signal_lock = threading.Lock()
+        self.callback_reply = None
+        # runner pod 已开始执行，case 状态不再是启动中
+        self.runner_started = False
+        # 是否收到过 runner 心跳，收到后心跳过期即视为 runner 失败
+        self.heartbeat_seen = False
+        # 已标记为卡住的步骤
+        self.stalled_step = None
+        # case 已被删除，不再等待执行完成和收集结果，直接清理环境
+        self.force_ended = False
+        self.state = RUNNER_STATE_INIT
+        self.task: asyncio.Task = None
 
-    def signal(self, input=None):
+    def signal(self, input=None, reply=None):
         """
-        处理信号回调函数的设置和获取。
+        处理信号回调函数的设置和获取。仅在 Manager 的事件循环中调用。
         
-        :param input: 指定一个新的回调函数，如果提供，则替换当前的回调函数。
+        :param input: 指定一个新的回调函数(协程函数)，如果提供，则替换当前的回调函数。
         :type input: function
+        :param reply: 回调函数开始处理(case 进入中间状态)时调用，用于回复 server。
+        :type reply: function
         :return: 如果设置了回调函数且此次调用未提供新的回调函数，则返回当前的回调函数；否则返回None。
         """
-        with self.signal_lock:  # 确保设置或获取回调函数时的线程安全
-            if input is not None:  # 设置新的回调函数
-                self.callback = input
-                return None
-            else:  # 获取当前的回调函数
-                return self.callback
+        if input is not None:  # 设置新的回调函数
+            # 被替换的回调函数不再执行，直接回复
+            self.reply_signal()
+            self.callback = input
+            self.callback_reply = reply
+            # 唤醒 wait，立即处理控制消息
+            if self.runner_events is not None:
+                self.runner_events.notify(self.uuid)
+            return None
+        else:  # 获取当前的回调函数
+            return self.callback
 
-    def run(self):
+    def force_end(self):
+        """
+        强制结束 runner。仅在 Manager 的事件循环中调用。
+        尚未开始等待的 runner 跳过后续阶段，等待中的 runner 在下一次检查时退出等待，
+        随后卸载 release 释放 pod；正在收集结果时等待收集完成。
+        """
+        self.force_ended = True
+        # 未处理的控制消息不再执行
+        self.callback = None
+        self.reply_signal()
+        if self.runner_events is not None:
+            self.runner_events.notify(self.uuid)
 
-        # TODO: leyi 更新更多信息
-        update_case_record(
-            self.uuid, status=db_const.CASE_RECORD_STATUS_STARTING
+    def reply_signal(self):
+        reply, self.callback_reply = self.callback_reply, None
+        if reply is not None:
+            reply()
+
+    async def run_blocking(self, func, *args, **kwargs):
+        """
+        在 Manager 的线程池中执行阻塞操作(SSH/MySQL/Redis/HTTP)，避免阻塞事件循环。
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(func, *args, **kwargs)
         )
-        self.create_data_dir()
-        self.exec_env()
 
-        self.wait()
+    async def run(self):
+        """
+        以状态机方式驱动 runner 的生命周期：
+        init → exec_env → wait → get_results → remove_env → done
+        任一阶段异常时直接进入 remove_env 清理环境。
+        """
+        handlers = {
+            RUNNER_STATE_INIT: self.on_init,
+            RUNNER_STATE_EXEC_ENV: self.on_exec_env,
+            RUNNER_STATE_WAIT: self.on_wait,
+            RUNNER_STATE_GET_RESULTS: self.on_get_results,
+            RUNNER_STATE_REMOVE_ENV: self.on_remove_env,
+        }
+        while self.state != RUNNER_STATE_DONE:
+            try:
+                next_state = await handlers[self.state]()
+            except Exception as e:
+                log.error(traceback.format_exc())
+                log.error(f"runner {self.uuid} state {self.state} error: {e}")
+                if self.state == RUNNER_STATE_REMOVE_ENV:
+                    next_state = RUNNER_STATE_DONE
+                else:
+                    next_state = RUNNER_STATE_REMOVE_ENV
+            if self.force_ended and next_state in (
+                RUNNER_STATE_EXEC_ENV, RUNNER_STATE_WAIT
+            ):
+                next_state = RUNNER_STATE_REMOVE_ENV
+            log.info(f"runner {self.uuid} state: {self.state} -> {next_state}")
+            self.state = next_state
 
-        update_case_record(
-            self.uuid, status=db_const.CASE_RECORD_STATUS_STOPPING
+    async def on_init(self):
+        # TODO: leyi 更新更多信息
+        await self.run_blocking(
+            update_case_record, self.uuid,
+            status=db_const.CASE_RECORD_STATUS_STARTING, queue_position=None,
+            expected_start_at=None, cause="runner scheduled"
         )
-        self.get_results()
+        await self.run_blocking(self.create_data_dir)
+        if self.runner_pool is not None:
+            release_name = await self.run_blocking(
+                self.runner_pool.acquire, self.image_tag
+            )
+            if release_name is not None:
+                log.info(f"runner {self.uuid} use idle runner {release_name}")
+                self.release_name = release_name
+                self.pooled = True
+        return RUNNER_STATE_EXEC_ENV
 
-        update_case_record(
-            self.uuid, status=db_const.CASE_RECORD_STATUS_FINISHED
+    async def on_exec_env(self):
+        if self.pooled:
+            # 空闲 runner 已就绪，直接分配 case
+            await self.run_blocking(self.assign_pooled)
+            return RUNNER_STATE_WAIT
+        await self.run_blocking(self.exec_env)
+        # 等待 pod 创建
+        await asyncio.sleep(10)
+        return RUNNER_STATE_WAIT
+
+    async def on_wait(self):
+        if await self.wait():
+            return RUNNER_STATE_GET_RESULTS
+        # 超时被取消的 case 不再收集结果
+        return RUNNER_STATE_REMOVE_ENV
+
+    async def on_get_results(self):
+        # runner 完成时结果已上传，通知 runner 立即退出，释放 pod
+        await self.run_blocking(self.redis_db.ack_results, uuid=self.uuid)
+        await self.run_blocking(
+            update_case_record, self.uuid,
+            status=db_const.CASE_RECORD_STATUS_STOPPING,
+            cause="case completed"
         )
+        await self.run_blocking(self.get_results)
+        await self.run_blocking(
+            update_case_record, self.uuid,
+            status=db_const.CASE_RECORD_STATUS_FINISHED,
+            cause="results collected"
+        )
+        return RUNNER_STATE_REMOVE_ENV
+
+    async def on_remove_env(self):
+        if self.force_ended:
+            log.info(f"runner {self.uuid} force ended")
+            await self.run_blocking(
+                update_case_record, self.uuid,
+                status=db_const.CASE_RECORD_STATUS_FINISHED, cause="force end"
+            )
+        await self.run_blocking(self.remove_env)
+        return RUNNER_STATE_DONE
 
     def exec_env(self):
         # TODO: leyi 创建pod, 写入redis
-        runner_yaml_path = f"{self.runner_data_path}/{self.release_name}.yaml"
-        self.create_runner_yaml_file(runner_yaml_path)
-        cmds = [
-            "helm repo update evaluation",
-            f"helm install {self.release_name} evaluation/evaluation-runner -n evaluation --create-namespace -f {runner_yaml_path}",
-        ]
-        ssh_client = ssh_pool_default.get(self.local_host_ip)
-        try:
-            for cmd in cmds:
-                _, stdout, stderr = ssh_client.exec_command(cmd)
-                output = stdout.read().decode()
-                error = stderr.read().decode()
-                if error:
-                    log.error(f"exec cmd {cmd} error: {error}")
-                    return
-                log.info(f"exec cmd {cmd} output: {output}")
-        except Exception as e:
-            log.error(f"exec_env: error: {e}")
+        if not helm.install(
+            self.release_name, self.image_tag,
+            {"case_params": self.case_params.to_json()}
+        ):
+            return
         # redis 添加信息
-        self.redis_db.init_runner_info(uuid=self.uuid)
-        time.sleep(10)
+        self.redis_db.init_runner_info(
+            uuid=self.uuid, release_name=self.release_name
+        )
+
+    def assign_pooled(self):
+        # 先写入 runner 信息，runner 领取 case 后即可更新状态
+        self.redis_db.init_runner_info(
+            uuid=self.uuid, release_name=self.release_name
+        )
+        self.runner_pool.assign(self.release_name, self.case_params.to_json())
 
     def check_runner_pod_running(self):
-        command = f"kubectl get pod -n evaluation |grep {self.release_name}-evaluation-runner "
-        ssh_client = ssh_pool_default.get(self.local_host_ip)
-        _, stdout, _ = ssh_client.exec_command(command)
-        output = stdout.read().decode()
-        if "Running" in output:
-            return True
-        else:
-            return False
+        return self.pod_status_cache.is_running(
+            f"{self.release_name}-evaluation-runner"
+        )
+
+    def pod_status_cache_stale(self):
+        return self.pod_status_cache.refresh_age() > POD_STATUS_STALE_TIMEOUT
 
     def check_runner_pod_completed(self):
         runner_info = self.redis_db.get_runner_info(uuid=self.uuid)
@@ -113,106 +236,188 @@ class Runner(threading.Thread):
         else:
             return False
 
-    def wait(self):
+    async def wait(self) -> bool:
         """
         等待测试用例执行完成。
         此函数会周期性地检查 Runner Pod 的状态，直到 Pod 运行完成或达到最大异常状态次数。
-        如果检测到 Runner Pod 完成运行，则会记录执行状态并返回。
+        如果检测到 Runner Pod 完成运行，则会记录执行状态并返回 True。
         如果 Runner Pod 未完成运行且存在回调函数，则会调用回调函数。
+        如果执行超时，则取消执行并返回 False。
         如果 Runner Pod 的状态长时间未就绪，则会记录错误状态并抛出异常。
         """
         log.info("wait for case execution to complete")
         count = 0
-        runner_started = False
         while count < POD_MAX_ABNORMAL_STATUS_NUMBER:
+            if self.force_ended:
+                return False
+            if self.timeout(RUNNER_TIMEOUT):
+                log.error(f"runner {self.uuid} timeout, cancel case")
+                await self.cancel()
+                return False
+            # pod 状态缓存过期时无法判断 pod 是否异常，不计入异常次数
+            if self.pod_status_cache_stale():
+                log.warning(
+                    f"pod status cache is stale, age: {self.pod_status_cache.refresh_age()}s"
+                )
+                await asyncio.sleep(10)
+                continue
             # 检查 Runner Pod 是否正在运行
             if not self.check_runner_pod_running():
-                time.sleep(10)
+                # runner 曾上报心跳且已过期，无需等待多次 pod 状态检查
+                if self.heartbeat_seen and not await self.run_blocking(
+                    self.check_heartbeat
+                ):
+                    await self.heartbeat_lost()
+                await asyncio.sleep(10)
                 count += 1
-                if runner_started:
+                if self.runner_started:
                     # 如果测试用例已经开始执行，但当前检测到未运行，则将其状态更新为待定，并重置开始标志
-                    update_case_record(
-                        self.uuid, status=db_const.CASE_RECORD_STATUS_PENDING
+                    await self.run_blocking(
+                        update_case_record, self.uuid,
+                        status=db_const.CASE_RECORD_STATUS_PENDING,
+                        cause="runner pod not running"
                     )
-                    runner_started = False
+                    self.runner_started = False
                 continue
 
-            if not runner_started:
+            if not self.runner_started:
                 # 当检测到 Runner Pod 开始运行时，更新用例记录为执行中状态
-                update_case_record(
-                    self.uuid, status=db_const.CASE_RECORD_STATUS_STARTED
+                await self.run_blocking(
+                    update_case_record, self.uuid,
+                    status=db_const.CASE_RECORD_STATUS_STARTED,
+                    cause="runner pod running"
                 )
-                runner_started = True
+                self.runner_started = True
 
             # 检查 Runner Pod 是否已完成执行
-            if not self.check_runner_pod_completed():
+            if not await self.run_blocking(self.check_runner_pod_completed):
+                # pod 仍在运行但 runner 心跳过期，runner 进程已失败
+                if not await self.run_blocking(self.check_heartbeat):
+                    await self.heartbeat_lost()
                 # 如果 Runner Pod 未完成执行，且存在回调函数，则调用回调函数
                 callback = self.signal()
                 if callback is not None:
-                    callback()
                     self.callback = None
-                time.sleep(5)
+                    await callback()
+                await self.wait_runner_event(RUNNER_STATUS_CHECK_INTERVAL)
                 continue
             else:
                 # 如果 Runner Pod 完成执行，记录相关信息并返回
-                log.info(
-                    f"case exec finished, runner_status: {self.redis_db.get_runner_info(uuid=self.uuid)}"
+                runner_info = await self.run_blocking(
+                    self.redis_db.get_runner_info, uuid=self.uuid
                 )
-                return
+                log.info(f"case exec finished, runner_status: {runner_info}")
+                return True
 
         # 如果达到最大异常状态次数，更新用例记录为错误状态，并抛出异常
-        update_case_record(self.uuid, status=db_const.CASE_RECORD_STATUS_ERROR)
+        await self.run_blocking(
+            update_case_record, self.uuid,
+            status=db_const.CASE_RECORD_STATUS_ERROR,
+            cause="runner pod status not ready"
+        )
         log.error("runner pod status not ready")
         raise Exception("runner pod status not ready")
 
+    def check_heartbeat(self) -> bool:
+        """
+        检查 runner 心跳，并标记长时间未推进的步骤。
+
+        :return: 心跳过期时返回 False；runner 尚未开始上报心跳时返回 True
+        """
+        heartbeat = self.redis_db.get_heartbeat(uuid=self.uuid)
+        if not heartbeat:
+            return not self.heartbeat_seen
+        self.heartbeat_seen = True
+        step = heartbeat.get("step")
+        stalled_step = None
+        if step and time.time() - float(heartbeat["step-at"]) > RUNNER_STEP_STALL_TIMEOUT:
+            # 暂停中的 case 步骤不推进是正常的
+            runner_info = self.redis_db.get_runner_info(uuid=self.uuid)
+            if runner_info.get("case-status") != redis_const.CASE_STATUS_PAUSED:
+                stalled_step = step
+        if stalled_step != self.stalled_step:
+            if stalled_step:
+                log.warning(
+                    f"runner {self.uuid} step stalled: {stalled_step}, progress: {heartbeat.get('progress')}"
+                )
+            update_case_record(self.uuid, stalled_step=stalled_step)
+            self.stalled_step = stalled_step
+        return True
+
+    async def heartbeat_lost(self):
+        await self.run_blocking(
+            update_case_record, self.uuid,
+            status=db_const.CASE_RECORD_STATUS_ERROR,
+            cause="runner heartbeat lost"
+        )
+        log.error(f"runner {self.uuid} heartbeat lost")
+        raise Exception("runner heartbeat lost")
+
+    async def wait_runner_event(self, timeout):
+        """
+        等待 runner 事件或控制消息，最多等待 timeout 秒。
+        """
+        if self.runner_events is None:
+            await asyncio.sleep(timeout)
+            return
+        event = self.runner_events.register(self.uuid)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        event.clear()
+
     def remove_env(self):
         # TODO: leyi 删除pod
-        command = f"helm uninstall {self.release_name} -n evaluation"
-        ssh_client = ssh_pool_default.get(self.local_host_ip)
         try:
-            _, _, stderr = ssh_client.exec_command(command)
-            error = stderr.read().decode()
-            if error:
-                log.error(f"uninstall env {self.release_name} error: {error}")
-                # raise
+            helm.uninstall(self.release_name)
             self.redis_db.delete_runner_info(uuid=self.uuid)
         except Exception as e:
             log.error(f"remove_env: error: {e}")
 
-    def cancel(self):
+    async def cancel(self):
         # TODO: leyi 中断当前执行,立即生成结果
-        update_case_record(
-            uuid=self.uuid, status=db_const.CASE_RECORD_STATUS_STOPPING
+        await self.run_blocking(
+            update_case_record, uuid=self.uuid,
+            status=db_const.CASE_RECORD_STATUS_STOPPING, cause="cancel"
         )
-        self.redis_db.cancel_case(uuid=self.uuid)
+        self.reply_signal()
+        await self.run_blocking(self.redis_db.cancel_case, uuid=self.uuid)
         log.info("cancel case")
-        self.wait_case_sync()
-        update_case_record(
-            uuid=self.uuid, status=db_const.CASE_RECORD_STATUS_FINISHED
+        await self.wait_case_sync()
+        await self.run_blocking(
+            update_case_record, uuid=self.uuid,
+            status=db_const.CASE_RECORD_STATUS_FINISHED, cause="cancelled"
         )
 
-    def pause(self):
+    async def pause(self):
         # TODO: leyi 暂停当前执行
-        update_case_record(
-            uuid=self.uuid, status=db_const.CASE_RECORD_STATUS_PAUSING
+        await self.run_blocking(
+            update_case_record, uuid=self.uuid,
+            status=db_const.CASE_RECORD_STATUS_PAUSING, cause="pause"
         )
-        self.redis_db.pause_case(uuid=self.uuid)
+        self.reply_signal()
+        await self.run_blocking(self.redis_db.pause_case, uuid=self.uuid)
         log.info("pause case")
         # TODO：leyi 检查是否完成暂停
-        self.wait_case_sync()
-        update_case_record(
-            uuid=self.uuid, status=db_const.CASE_RECORD_STATUS_PAUSED
+        await self.wait_case_sync()
+        await self.run_blocking(
+            update_case_record, uuid=self.uuid,
+            status=db_const.CASE_RECORD_STATUS_PAUSED, cause="paused"
         )
 
-    def resume(self):
-        update_case_record(
-            uuid=self.uuid, status=db_const.CASE_RECORD_STATUS_STARTING
+    async def resume(self):
+        await self.run_blocking(
+            update_case_record, uuid=self.uuid,
+            status=db_const.CASE_RECORD_STATUS_STARTING, cause="resume"
         )
-        self.redis_db.resume_case(uuid=self.uuid)
+        self.reply_signal()
+        await self.run_blocking(self.redis_db.resume_case, uuid=self.uuid)
         log.info("resume case")
-        self.wait_case_sync()
-        update_case_record(
-            uuid=self.uuid, status=db_const.CASE_RECORD_STATUS_STARTED
+        await self.wait_case_sync()
+        await self.run_blocking(
+            update_case_record, uuid=self.uuid,
+            status=db_const.CASE_RECORD_STATUS_STARTED, cause="resumed"
         )
 
     def timeout(self, timeout: int) -> bool:
@@ -220,14 +425,33 @@ class Runner(threading.Thread):
             return True
         return False
 
-    def wait_case_sync(self):
+    async def wait_case_sync(self, timeout=RUNNER_CASE_SYNC_TIMEOUT):
+        """
+        等待 runner 进入控制状态。runner 心跳过期或超时未进入时标记为错误并抛出异常，
+        由状态机进入 remove_env 释放 runner。
+        """
+        deadline = time.time() + timeout
         while True:
-            time.sleep(5)
-            runner_info = self.redis_db.get_runner_info(uuid=self.uuid)
+            await asyncio.sleep(RUNNER_STATUS_CHECK_INTERVAL)
+            if self.force_ended:
+                raise Exception("runner force ended")
+            runner_info = await self.run_blocking(
+                self.redis_db.get_runner_info, uuid=self.uuid
+            )
             if runner_info["case-control-status"] == runner_info[
                 "case-status"] or runner_info[
                     "case-status"] == redis_const.CASE_STATUS_COMPLETED:
                 break
+            if not await self.run_blocking(self.check_heartbeat):
+                await self.heartbeat_lost()
+            if time.time() > deadline:
+                await self.run_blocking(
+                    update_case_record, self.uuid,
+                    status=db_const.CASE_RECORD_STATUS_ERROR,
+                    cause="runner case sync timeout"
+                )
+                log.error(f"runner {self.uuid} case sync timeout")
+                raise Exception("runner case sync timeout")
 
     def create_data_dir(self):
         self.runner_report_path = f"{self.runner_data_path}/report"
@@ -248,23 +472,6 @@ class Runner(threading.Thread):
             except FileExistsError:
                 pass
 
-    def create_runner_yaml_file(self, file_path):
-        helm_value_dict = {}
-        runner_config_dict = {}
-        runner_config_dict["case_params"] = self.case_params.to_json()
-        runner_config_dict["redis"] = conf.redis
-        runner_config_dict["mysql"] = conf.mysql
-        runner_config_dict["listen_port"] = conf.listen_port
-        runner_config_dict["agent-tools"] = conf.agent_tools
-        runner_config_dict["platform-tools"] = conf.platform_tools
-        runner_config_dict["runner_data_dir"] = conf.runner_data_dir
-        helm_value_dict["runnerConfig"] = runner_config_dict
-        helm_value_dict["image"] = {"tag": self.image_tag}
-        with open(file_path, 'w') as file:
-            yaml.dump(helm_value_dict, file)
-        if not os.path.exists(file_path):
-            log.error(f"file :{file_path} not found")
-
     def get_results(self):
         self.push_allure_results()
         self.get_performance_results()
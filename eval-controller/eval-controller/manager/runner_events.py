@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+
+from typing import Dict
+
+from common.const import RUNNER_EVENT_RETRY_INTERVAL
+from eval_lib.databases.redis.runner_info import RedisRunnerInfo
+from eval_lib.common.logger import get_logger
+from config import conf
+
+log = get_logger()
+
+
+class RunnerEventListener(threading.Thread):
+    """
+    订阅所有 runner 的事件通道(如 runner-status 变为 completed)。
+
+    由 Manager 持有，后台线程收到事件后在事件循环中唤醒对应 Runner 的等待，
+    Runner 无需每隔几秒轮询 Redis 就能立即发现执行完成。
+    事件只用于提前唤醒，Runner 仍以 Redis 中的 runner info 为准。
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        super().__init__(name="runner-events", daemon=True)
+        self.loop = loop
+        self.redis_db = RedisRunnerInfo(
+            host=conf.redis_host, port=conf.redis_port,
+            password=conf.redis_password, db=conf.redis_db,
+            max_connections=conf.redis_max_connections,
+            health_check_interval=conf.redis_health_check_interval,
+            socket_keepalive=conf.redis_socket_keepalive
+        )
+        # uuid -> 等待事件的 asyncio.Event，仅在事件循环中读写
+        self.events: Dict[str, asyncio.Event] = {}
+
+    def register(self, uuid) -> asyncio.Event:
+        event = self.events.get(uuid)
+        if event is None:
+            event = self.events[uuid] = asyncio.Event()
+        return event
+
+    def unregister(self, uuid):
+        self.events.pop(uuid, None)
+
+    def notify(self, uuid):
+        event = self.events.get(uuid)
+        if event is not None:
+            event.set()
+
+    def run(self):
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.redis_db.subscribe_runner_events()
+                while True:
+                    message = pubsub.get_message(timeout=60)
+                    if not message or message["type"] != "pmessage":
+                        continue
+                    uuid = self.redis_db.runner_uuid_from_channel(
+                        message["channel"].decode()
+                    )
+                    self.loop.call_soon_threadsafe(self.notify, uuid)
+            except Exception as e:
+                log.error(f"runner event subscriber error: {e}")
+                time.sleep(RUNNER_EVENT_RETRY_INTERVAL)
+            finally:
+                if pubsub is not None:
+                    pubsub.close()
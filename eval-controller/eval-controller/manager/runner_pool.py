@@ -0,0 +1,123 @@
+import threading
+import time
+import uuid
+
+from typing import Dict
+
+from common.const import RUNNER_POOL_RELEASE_PREFIX, RUNNER_POOL_START_TIMEOUT
+from manager import helm
+from manager.pod_status import PodStatusCache
+from eval_lib.common.logger import get_logger
+from eval_lib.databases.redis.runner_pool import RedisRunnerPool
+from config import conf
+
+log = get_logger()
+
+
+class RunnerPool(object):
+    """
+    按镜像标签预先启动的空闲 runner pod 池。
+
+    空闲 runner 启动后在 Redis 中登记并等待分配 case，
+    case 开始时直接把 CaseParams 交给空闲 runner，省去 helm install 和拉取镜像的时间。
+    被分配的 release 由 Runner 负责卸载，池在后台补齐。
+    所有方法都是阻塞的，由 Manager 在线程池中调用。
+    """
+
+    def __init__(self, pod_status_cache: PodStatusCache):
+        self.pod_status_cache = pod_status_cache
+        # 镜像标签 -> 空闲 runner 数量
+        self.sizes: Dict[str, int] = conf.runner_pool
+        # 镜像标签 -> {已安装但未分配的 release: 安装时间}
+        self.releases: Dict[str, Dict[str, float]] = {
+            tag: {} for tag in self.sizes
+        }
+        self.lock = threading.Lock()
+        self.redis_db = RedisRunnerPool(
+            host=conf.redis_host, port=conf.redis_port,
+            password=conf.redis_password, db=conf.redis_db,
+            max_connections=conf.redis_max_connections,
+            health_check_interval=conf.redis_health_check_interval,
+            socket_keepalive=conf.redis_socket_keepalive
+        )
+
+    def cleanup(self, in_use: set):
+        """
+        卸载上次运行遗留的空闲 runner，controller 重启后重新补齐。
+
+        :param in_use: 已分配给 case 的 release，不卸载
+        """
+        for tag in self.sizes:
+            self.redis_db.clear(tag)
+        for release_name in helm.list_releases() - in_use:
+            if release_name.startswith(RUNNER_POOL_RELEASE_PREFIX):
+                log.info(f"uninstall idle runner {release_name}")
+                helm.uninstall(release_name)
+
+    def refill(self):
+        for tag, size in self.sizes.items():
+            self.remove_failed(tag)
+            while True:
+                with self.lock:
+                    if len(self.releases[tag]) >= size:
+                        break
+                    release_name = f"{RUNNER_POOL_RELEASE_PREFIX}{uuid.uuid4().hex[:8]}"
+                    self.releases[tag][release_name] = time.time()
+                if not self.install(tag, release_name):
+                    with self.lock:
+                        self.releases[tag].pop(release_name, None)
+                    break
+
+    def remove_failed(self, image_tag):
+        """
+        卸载超时仍未就绪的空闲 runner。
+        """
+        now = time.time()
+        with self.lock:
+            releases = dict(self.releases[image_tag])
+        for release_name, installed_at in releases.items():
+            if now - installed_at < RUNNER_POOL_START_TIMEOUT:
+                continue
+            if self.pod_status_cache.is_running(
+                f"{release_name}-evaluation-runner"
+            ):
+                continue
+            log.warning(f"idle runner {release_name} not ready, uninstall")
+            with self.lock:
+                self.releases[image_tag].pop(release_name, None)
+            helm.uninstall(release_name)
+
+    def install(self, image_tag, release_name) -> bool:
+        log.info(f"install idle runner {release_name}, image tag: {image_tag}")
+        return helm.install(
+            release_name, image_tag, {
+                "runner_pool": {
+                    "image_tag": image_tag,
+                    "release_name": release_name
+                }
+            }
+        )
+
+    def acquire(self, image_tag) -> str:
+        """
+        取出一个就绪的空闲 runner。
+
+        :return: runner 的 release 名称，没有就绪的空闲 runner 时返回 None
+        """
+        if image_tag not in self.sizes:
+            return None
+        while True:
+            release_name = self.redis_db.pop_idle(image_tag)
+            if release_name is None:
+                return None
+            with self.lock:
+                self.releases[image_tag].pop(release_name, None)
+            if self.pod_status_cache.is_running(
+                f"{release_name}-evaluation-runner"
+            ):
+                return release_name
+            log.warning(f"idle runner {release_name} not running, uninstall")
+            helm.uninstall(release_name)
+
+    def assign(self, release_name, case_params: dict):
+        self.redis_db.assign(release_name, case_params)
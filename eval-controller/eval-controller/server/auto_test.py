@@ -1,9 +1,12 @@
 from flask import request, Blueprint
 from common.model import AutoTestCreate, AutoTestUpdate, AutoTestDelete, AutoTestFilter
-from common.utils import json_response, exception_decorate
-from common.const import API_PREFIX
+from common.utils import json_response, json_stream_response, exception_decorate
+from common.const import API_PREFIX, CASE_STATUS_STATS_DEFAULT_HOURS, CASE_STATUS_STATS_MAX_HOURS
+from common.const import JSON_STREAM_MIN_ITEMS
 from eval_lib.common import logger
+from eval_lib.common.exceptions import BadRequestException
 from service.auto_test import AutoTest
+from service.case_stats import CaseStatusStats
 
 auto_test_app = Blueprint('auto_test_app', __name__, url_prefix=API_PREFIX)
 log = logger.get_logger()
@@ -16,8 +19,8 @@ def exec_tests():
     at = AutoTestCreate(json_data)
     at.is_valid()
 
-    res = AutoTest(auto_test_app.queue).Post(info=at)
-    return json_response(data=res), 200
+    res, task_id = AutoTest(auto_test_app.queue).Post(info=at)
+    return json_response(data=res, task=task_id), 200
 
 
 @auto_test_app.route("/auto-test", methods=["PATCH"])
@@ -27,8 +30,8 @@ def update_test():
     at = AutoTestUpdate(json_data)
     at.is_valid()
 
-    res = AutoTest(auto_test_app.queue).Update(info=at)
-    return json_response(data=res), 200
+    res, task_id = AutoTest(auto_test_app.queue).Update(info=at)
+    return json_response(data=res, task=task_id), 200
 
 
 @auto_test_app.route("/auto-test", methods=["DELETE"])
@@ -38,8 +41,8 @@ def delete_tests():
     at = AutoTestDelete(json_data)
     at.is_valid()
 
-    res = AutoTest(auto_test_app.queue).Update(info=at)
-    return json_response(data=res), 200
+    res, task_id = AutoTest(auto_test_app.queue).Update(info=at)
+    return json_response(data=res, task=task_id), 200
 
 
 @auto_test_app.route("/auto-test", methods=["GET"])
@@ -47,6 +50,20 @@ def delete_tests():
 def get_tests():
     args = request.args
     at = AutoTestFilter(**args)
+    at.is_valid()
 
-    res = AutoTest(auto_test_app.queue).Get(info=at)
+    res, page = AutoTest(auto_test_app.queue).List(info=at)
+    if len(res) >= JSON_STREAM_MIN_ITEMS:
+        return json_stream_response(res, type="CaseRecord", page=page)
+    return json_response(data=res, type="CaseRecord", page=page), 200
+
+
+@auto_test_app.route("/auto-test/status-stats", methods=["GET"])
+@exception_decorate
+def get_status_stats():
+    # hours: 统计最近多少小时内的状态变化
+    hours = request.args.get("hours", str(CASE_STATUS_STATS_DEFAULT_HOURS))
+    if not hours.isdigit() or not 0 < int(hours) <= CASE_STATUS_STATS_MAX_HOURS:
+        raise BadRequestException(f"bad request hours {hours}")
+    res = CaseStatusStats().phase_durations(int(hours))
     return json_response(data=res), 200
@@ -2,6 +2,7 @@ from flask import Blueprint
 
 from common.const import API_PREFIX
 from common.utils import json_response, exception_decorate
+from common.response_cache import conditional_response
 from service.dictonary import DictionaryWorker
 from eval_lib.common import logger
 
@@ -13,5 +14,8 @@ log = logger.get_logger()
 @exception_decorate
 def get_resource_dictionary(resource_name):
     log.info(f'get_resource_dictionary: {resource_name}')
-    res = DictionaryWorker(resource_name).Get()
-    return json_response(data=res), 200
+    # 字典在进程运行期间不会变化，响应体只生成一次
+    return conditional_response(
+        f"dictionary:{resource_name}",
+        lambda: json_response(data=DictionaryWorker(resource_name).Get())
+    )
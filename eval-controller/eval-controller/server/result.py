@@ -1,13 +1,16 @@
-from flask import request, Blueprint
-from zipfile import ZipFile
+import json
+import zlib
 
-from common.model import ResultPostLog, ResultGetLog, ResultGetFile
+from flask import request, Blueprint, Response, stream_with_context
+
+from common.model import ResultPostLog, ResultGetLog, ResultGetFile, ResultTailLog
 from common.utils import json_response, exception_decorate
-from common.const import API_PREFIX
+from common.response_cache import conditional_response
+from common.const import API_PREFIX, LOG_POST_MAX_SIZE
 from eval_lib.common import logger
 from eval_lib.common.exceptions import BadRequestException
 from eval_lib.model.const import RESULT_TYPE_LOG_RAW, RESULT_TYPE_PERFORMANCE_MD
-from service.result import ResultWorker
+from service.result import ResultWorker, log_watch_limiter
 
 result_app = Blueprint('result_app', __name__, url_prefix=API_PREFIX)
 log = logger.get_logger()
@@ -23,15 +26,78 @@ def post_result_zip():
     if file.filename == "":
         raise BadRequestException("No selected file")
 
-    zip_file = ZipFile(file)
-    r = ResultWorker().post_zip(filename=file.filename, zipfile=zip_file)
+    r = ResultWorker().post_zip(filename=file.filename, file_storage=file)
+    return json_response(data=r), 200
+
+
+@result_app.route("/result/zip/upload/<filename>", methods=["GET"])
+@exception_decorate
+def get_result_zip_upload(filename):
+    r = ResultWorker().get_zip_upload(filename)
+    return json_response(data=r), 200
+
+
+@result_app.route("/result/zip/upload/<filename>", methods=["PUT"])
+@exception_decorate
+def put_result_zip_upload(filename):
+    offset = request.args.get("offset", "0")
+    if not offset.isdigit():
+        raise BadRequestException("bad offset")
+    r = ResultWorker().put_zip_upload(filename, int(offset), request.stream)
     return json_response(data=r), 200
 
 
+@result_app.route("/result/zip/upload/<filename>/complete", methods=["POST"])
+@exception_decorate
+def complete_result_zip_upload(filename):
+    json_data = request.get_json(silent=True) or {}
+    r = ResultWorker().complete_zip_upload(filename, json_data.get("sha256"))
+    return json_response(data=r), 200
+
+
+@result_app.route("/result/zip/job/<job_id>", methods=["GET"])
+@exception_decorate
+def get_result_zip_job(job_id):
+    r = ResultWorker().get_zip_job(job_id)
+    return json_response(data=r), 200
+
+
+@result_app.route("/result/artifact/<uuid>", methods=["GET"])
+@exception_decorate
+def get_result_artifacts(uuid):
+    r = ResultWorker().get_artifacts(uuid)
+    return json_response(data=r), 200
+
+
+@result_app.route("/result/artifact/<uuid>/<path:path>", methods=["PUT"])
+@exception_decorate
+def put_result_artifact(uuid, path):
+    r = ResultWorker().put_artifact(
+        uuid, path, request.args.get("sha256"), request.stream
+    )
+    return json_response(data=r), 200
+
+
+def request_json(max_size=LOG_POST_MAX_SIZE):
+    """
+    解析请求体中的 json，支持 gzip 压缩的请求体，解压后超过 max_size 字节时拒绝。
+    """
+    if request.headers.get("Content-Encoding", "").lower() != "gzip":
+        return request.json
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        body = decompressor.decompress(request.get_data(), max_size)
+    except zlib.error as e:
+        raise BadRequestException(f"bad gzip body: {e}")
+    if decompressor.unconsumed_tail:
+        raise BadRequestException("request body too large")
+    return json.loads(body)
+
+
 @result_app.route("/result/log", methods=["POST"])
 @exception_decorate
 def post_result_log():
-    json_data = request.json
+    json_data = request_json()
     rpl = ResultPostLog(json_data)
     rpl.is_valid()
 
@@ -41,6 +107,13 @@ def post_result_log():
     return json_response(data=r), 200
 
 
+@result_app.route("/result/log/stats", methods=["GET"])
+@exception_decorate
+def get_result_log_stats():
+    r = ResultWorker().get_log_ingest_stats()
+    return json_response(data=r), 200
+
+
 @result_app.route("/result/log", methods=["GET"])
 @exception_decorate
 def get_result_log():
@@ -54,6 +127,47 @@ def get_result_log():
     return json_response(data=r), 200
 
 
+@result_app.route("/result/log/tail", methods=["GET"])
+@exception_decorate
+def tail_result_log():
+    args = request.args
+    rtl = ResultTailLog(**args)
+    rtl.is_valid()
+
+    if rtl.type != RESULT_TYPE_LOG_RAW:
+        raise BadRequestException("Log File type is not suport")
+    r = ResultWorker().tail_log(rtl)
+    return json_response(data=r), 200
+
+
+@result_app.route("/result/log/stream", methods=["GET"])
+@exception_decorate
+def stream_result_log():
+    args = request.args
+    rtl = ResultTailLog(**args)
+    rtl.is_valid()
+
+    if rtl.type != RESULT_TYPE_LOG_RAW:
+        raise BadRequestException("Log File type is not suport")
+    # 断线重连时从最后收到的事件继续
+    last_event_id = request.headers.get("Last-Event-ID")
+    if last_event_id and last_event_id.isdigit():
+        rtl.line_index = int(last_event_id)
+    # 推送期间占用工作线程，超过并发上限时返回 503，连接关闭时释放
+    log_watch_limiter.acquire()
+    try:
+        response = Response(
+            stream_with_context(ResultWorker().stream_log(rtl)),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    except Exception:
+        log_watch_limiter.release()
+        raise
+    response.call_on_close(log_watch_limiter.release)
+    return response
+
+
 @result_app.route("/result/performance", methods=["GET"])
 @exception_decorate
 def get_result_performance():
@@ -61,8 +175,13 @@ def get_result_performance():
     rgl = ResultGetFile(**args)
     rgl.is_valid()
 
-    if rgl.type == RESULT_TYPE_PERFORMANCE_MD:
-        r = ResultWorker().get_performance_md(rgl)
-    else:
+    if rgl.type != RESULT_TYPE_PERFORMANCE_MD:
         raise BadRequestException("Performance File type is not support")
-    return json_response(data=r), 200
+    worker = ResultWorker()
+    # 报告文件未变化时不重新读取，客户端携带的 ETag 仍有效时返回 304
+    version, last_modified = worker.get_performance_md_version(rgl)
+    return conditional_response(
+        f"performance-md:{rgl.uuid}",
+        lambda: json_response(data=worker.get_performance_md(rgl)),
+        version=version, last_modified=last_modified
+    )
@@ -1,9 +1,16 @@
-from flask import Flask
+import gzip
+import time
+import zlib
+
+from flask import Flask, request, g
 from multiprocessing import Process
 from eval_lib.common import logger
 from .auto_test import auto_test_app
 from .result import result_app
 from .dictionary import dictionary_app
+from .task import task_app
+from common.message_queue import new_message_queue
+from service.log_ingest import close_log_ingestor
 from config import conf
 
 app = Flask(__name__)
@@ -11,13 +18,140 @@ log = logger.get_logger()
 app.register_blueprint(auto_test_app)
 app.register_blueprint(result_app)
 app.register_blueprint(dictionary_app)
+app.register_blueprint(task_app)
 
+# 压缩 gzip 响应体时使用的压缩级别，优先压缩速度
+GZIP_COMPRESS_LEVEL = 5
 
-class ServerProcess(Process):
 
-    def __init__(self, queue):
-        auto_test_app.queue = queue
-        super().__init__()
+@app.before_request
+def start_timer():
+    g.start_time = time.time()
+
+
+@app.after_request
+def finish_request(response):
+    """
+    按配置压缩响应体，并记录请求耗时。
+    """
+    gzip_response(response)
+    start_time = g.pop("start_time", None)
+    if start_time is not None:
+        log.info(
+            f"{request.method} {request.full_path.rstrip('?')} "
+            f"{response.status_code} {response.content_length or '-'} "
+            f"{(time.time() - start_time) * 1000:.1f}ms"
+        )
+    return response
+
+
+def gzip_response(response):
+    min_size = conf.server_gzip_min_size
+    if not min_size or response.status_code < 200 or response.status_code >= 300:
+        return
+    # 实时日志推送需要逐条到达客户端，不压缩
+    if response.direct_passthrough or response.mimetype == "text/event-stream":
+        return
+    if "Content-Encoding" in response.headers:
+        return
+    if not (
+        response.mimetype.startswith("text/")
+        or response.mimetype == "application/json"
+    ):
+        return
+    response.vary.add("Accept-Encoding")
+    if not request.accept_encodings["gzip"]:
+        return
+    if response.is_streamed:
+        # 流式返回的大列表大小未知，逐块压缩
+        response.response = gzip_stream(response.response)
+        response.headers["Content-Encoding"] = "gzip"
+        return
+    data = response.get_data()
+    if len(data) < min_size:
+        return
+    response.set_data(gzip.compress(data, compresslevel=GZIP_COMPRESS_LEVEL))
+    response.headers["Content-Encoding"] = "gzip"
+
+
+def gzip_stream(chunks):
+    compressor = zlib.compressobj(
+        GZIP_COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+    )
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def init_worker():
+    # 在处理请求的进程中创建消息队列的 redis 连接
+    auto_test_app.queue = new_message_queue()
+    task_app.queue = auto_test_app.queue
+
+
+def post_fork(server, worker):
+    init_worker()
+    log.info(f"server worker started, pid: {worker.pid}")
+
+
+def worker_exit(server, worker):
+    # 已返回成功的日志仍在写入队列中，退出前写完
+    close_log_ingestor()
+    log.info(f"server worker exited, pid: {worker.pid}")
+
+
+def run_gunicorn() -> bool:
+    """
+    使用 gunicorn 启动多个工作进程，每个进程多个线程处理请求。
+
+    :return: gunicorn 不可用时返回 False
+    """
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        log.error("gunicorn is not installed")
+        return False
+
+    class GunicornServer(BaseApplication):
+
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    GunicornServer(
+        app, {
+            "bind": f"0.0.0.0:{conf.listen_port}",
+            "workers": conf.server_workers,
+            "threads": conf.server_threads,
+            "worker_class": "gthread",
+            "timeout": conf.server_timeout,
+            "post_fork": post_fork,
+            "worker_exit": worker_exit,
+        }
+    ).run()
+    return True
+
+
+class ServerProcess(Process):
 
     def run(self):
-        app.run(host="0.0.0.0", port=conf.listen_port)
+        if conf.server_mode == "production" and run_gunicorn():
+            return
+        log.info("server runs in development mode")
+        init_worker()
+        try:
+            app.run(host="0.0.0.0", port=conf.listen_port, threaded=True)
+        finally:
+            close_log_ingestor()
@@ -0,0 +1,20 @@
+from flask import request, Blueprint
+from common.utils import json_response, exception_decorate
+from common.const import API_PREFIX
+from eval_lib.common import logger
+from eval_lib.common.exceptions import BadRequestException
+from service.task import TaskWorker
+
+task_app = Blueprint('task_app', __name__, url_prefix=API_PREFIX)
+log = logger.get_logger()
+
+
+@task_app.route("/task/<task_id>", methods=["GET"])
+@exception_decorate
+def get_task(task_id):
+    # timeout: 任务未完成时最多等待的秒数，默认立即返回
+    timeout = request.args.get("timeout", "0")
+    if not timeout.isdigit():
+        raise BadRequestException("bad timeout")
+    res = TaskWorker(task_app.queue).get(task_id, int(timeout))
+    return json_response(data=res), 200
@@ -1,20 +1,25 @@
-import time
+import base64
+import contextlib
+import datetime
+import json
 import threading
 
 from common.mysql import update_case_record
+from common.case_status import get_case_status_writer
+from common.const import TASK_PENDING_TIMEOUT, UPDATE_LOCK_KEY, UPDATE_LOCK_ACQUIRE_TIMEOUT, UPDATE_LOCK_TIMEOUT
 
-from eval_lib.common.exceptions import BadRequestException
+from eval_lib.common.exceptions import BadRequestException, InternalServerErrorException
 from eval_lib.common import logger
 from eval_lib.model import const as model_const
 from eval_lib.model.base import CaseParams
-from eval_lib.databases.mysql.models.models import CaseRecord
+from eval_lib.databases.mysql.models.models import CaseRecord, CaseStatusEvent, Task
 from eval_lib.databases.mysql import const as db_const
 from config import conf
 
 from common.model import AutoTestCreate, AutoTestUpdate, AutoTestDelete, AutoTestFilter
+from service.task import TaskWorker
 
 log = logger.get_logger()
-POST_TIMEOUT = 10
 # 下发的修改状态请求后，目标预计状态列表。列表中，进行时状态需在完成时状态之前
 CR_STATUS_TARGET_MAP = {
     # 暂停请求，预期目标状态为正在暂停和已暂停
@@ -45,9 +50,10 @@ PARAMS_STATUS_TARGET_MAP = {
     model_const.CASE_PARAMS_STATUS_PAUSE: [
         db_const.CASE_RECORD_STATUS_STARTED
     ],
-    # 取消请求，仅支持在运行和暂停状态时
+    # 取消请求，支持在排队、运行和暂停状态时
     model_const.CASE_PARAMS_STATUS_CANCEL: [
-        db_const.CASE_RECORD_STATUS_STARTED, db_const.CASE_RECORD_STATUS_PAUSED
+        db_const.CASE_RECORD_STATUS_INIT, db_const.CASE_RECORD_STATUS_STARTED,
+        db_const.CASE_RECORD_STATUS_PAUSED
     ],
     # 恢复请求，仅支持在暂停状态时
     model_const.CASE_PARAMS_STATUS_RESUME: [
@@ -71,6 +77,25 @@ PARAMS_STATUS_TARGET_MAP = {
 UPDATE_LOCK = threading.RLock()
 
 
+@contextlib.contextmanager
+def update_lock(redis_db):
+    """
+    修改 case 状态的锁。进程内的线程先通过 UPDATE_LOCK 互斥，
+    再通过 redis 与 server 的其他工作进程互斥。
+    """
+    with UPDATE_LOCK:
+        identifier = redis_db.acquire_lock(
+            UPDATE_LOCK_KEY, UPDATE_LOCK_ACQUIRE_TIMEOUT, UPDATE_LOCK_TIMEOUT
+        )
+        # acquire_lock 超时后同样返回标识，需确认锁属于当前请求
+        if redis_db.conn.get(UPDATE_LOCK_KEY) != identifier.encode():
+            raise InternalServerErrorException("acquire update lock timeout")
+        try:
+            yield
+        finally:
+            redis_db.release_lock(UPDATE_LOCK_KEY, identifier)
+
+
 class AutoTest(object):
 
     def __init__(self, queue) -> None:
@@ -78,56 +103,38 @@ class AutoTest(object):
 
     def Post(self, info: AutoTestCreate):
         """
-        将测试创建消息发布到队列，并等待直到相关测试用例记录创建完成。
+        创建测试用例记录并将测试创建消息发布到队列，不等待 manager 处理。
 
         参数:
         - info: AutoTestCreate 类型，包含测试用例的创建信息。
 
         返回值:
-        - crs: CaseRecord 查询结果，如果测试用例记录创建成功则返回该记录。
+        - crs: 新建的 CaseRecord 查询结果。
+        - task_id: 异步任务 ID，manager 确认接收(进入排队或开始执行)后任务完成。
         """
-        # 记录日志信息，将消息放入队列
-        with UPDATE_LOCK:
-            crs = self.Get(
-                AutoTestFilter(
-                    status=[
-                        db_const.CASE_RECORD_STATUS_INIT,
-                        db_const.CASE_RECORD_STATUS_STARTED,
-                        db_const.CASE_RECORD_STATUS_STARTING,
-                        db_const.CASE_RECORD_STATUS_PENDING,
-                        db_const.CASE_RECORD_STATUS_PAUSED,
-                        db_const.CASE_RECORD_STATUS_PAUSING,
-                        db_const.CASE_RECORD_STATUS_STOPPING
-                    ]
-                )
-            )
-            if len(crs) >= conf.runner_max_num:
-                raise BadRequestException("runner_max_num reached")
-                # 创建一个新的测试用例记录，并保存到数据库
-            msg = CaseParams(info.to_json())
-            cr = CaseRecord(
-                uuid=msg.uuid, case_name=msg.case_name,
-                process_num=msg.process_num,
-                status=db_const.CASE_RECORD_STATUS_INIT
-            )
-            cr.save()
-            log.info(f"put msg to manager: {msg}")
-            msg.status = model_const.CASE_PARAMS_STATUS_CREATE
-
-            self.queue.put(msg)
-
-        # 设置等待超时时间
-        wait_count = POST_TIMEOUT
-        at_filter = AutoTestFilter(uuid=msg.uuid)
-
-        # 循环等待，直到测试用例记录被创建或超时
-        while wait_count:
-            crs = self.Get(info=at_filter)
-            if crs:
-                return crs
-            time.sleep(1)  # 每秒检查一次
-            wait_count -= 1
-        return self.Get()
+        # runner 数量达到上限时不再拒绝请求，由 Manager 排队，有空闲 runner 时按优先级执行
+        # 创建一个新的测试用例记录，并保存到数据库
+        msg = CaseParams(info.to_json())
+        cr = CaseRecord(
+            uuid=msg.uuid, case_name=msg.case_name,
+            process_num=msg.process_num,
+            case_params=json.dumps(msg.to_json()), user=msg.user,
+            runner_image_tag=msg.runner_image_tag,
+            priority=msg.priority,
+            status=db_const.CASE_RECORD_STATUS_INIT
+        )
+        cr.save()
+        # 排队阶段的起点
+        CaseStatusEvent.create(
+            uuid=msg.uuid, new_status=db_const.CASE_RECORD_STATUS_INIT,
+            cause="created", created_at=cr.created_at
+        )
+        msg.status = model_const.CASE_PARAMS_STATUS_CREATE
+        task_id = TaskWorker(self.queue).create([msg])
+        log.info(f"put msg to manager: {msg}")
+        with update_lock(self.queue):
+            self.queue.put(msg.to_json())
+        return self.Get(info=AutoTestFilter(uuid=msg.uuid)), task_id
 
     def Get(self, info: AutoTestFilter = None) -> list:
         """
@@ -146,7 +153,7 @@ class AutoTest(object):
 
         if info:
             # 将过滤条件转换为 JSON 格式
-            json_where = info.to_json()
+            json_where = info.where_json()
             # 根据 JSON 格式的过滤条件生成 WHERE 子句
             where_clause = CaseRecord.visible_where_clause(json_where)
             # 如果过滤条件中包含删除状态，则加上未被删除的限制
@@ -161,6 +168,65 @@ class AutoTest(object):
         # 将查询结果转换为列表并返回
         return [cr for cr in crs]
 
+    def List(self, info: AutoTestFilter) -> tuple:
+        """
+        分页查询未被删除的测试用例记录。
+
+        按 (created_at, id) 排序，使用游标分页，翻页时从上一页最后一条记录处继续，
+        不需要像 OFFSET 一样扫描之前的记录；只查询 fields 指定的字段，不创建模型对象。
+
+        参数:
+        - info: AutoTestFilter 类型，已校验的过滤和分页条件。
+
+        返回值:
+        - list: 当前页的测试用例记录，每条记录为字段名(大写)到值的字典。
+        - dict: 分页信息，next_cursor 为空时没有下一页。
+        """
+        all_fields = [field.name for field in CaseRecord._meta.sorted_fields]
+        fields = info.fields or all_fields
+        unknown_fields = set(fields) - set(all_fields)
+        if unknown_fields:
+            raise BadRequestException(f"bad request fields {unknown_fields}")
+
+        where_clause = CaseRecord.deleted == db_const.CASE_RECORD_NOT_DELETED
+        filter_clause = CaseRecord.visible_where_clause(info.where_json())
+        if filter_clause is not None:
+            where_clause = (where_clause) & (filter_clause)
+        descending = info.order == "desc"
+        if info.cursor:
+            created_at, id = decode_cursor(info.cursor)
+            if descending:
+                where_clause = (where_clause) & (
+                    (CaseRecord.created_at < created_at) |
+                    ((CaseRecord.created_at == created_at) &
+                     (CaseRecord.id < id))
+                )
+            else:
+                where_clause = (where_clause) & (
+                    (CaseRecord.created_at > created_at) |
+                    ((CaseRecord.created_at == created_at) &
+                     (CaseRecord.id > id))
+                )
+        if descending:
+            order_by = [CaseRecord.created_at.desc(), CaseRecord.id.desc()]
+        else:
+            order_by = [CaseRecord.created_at.asc(), CaseRecord.id.asc()]
+
+        # 游标需要 created_at 和 id，未指定返回时也要查询
+        columns = set(fields) | {"id", "created_at"}
+        rows = list(
+            CaseRecord.select(
+                *[getattr(CaseRecord, column) for column in columns]
+            ).where(where_clause).order_by(*order_by
+                                           ).limit(info.limit + 1).dicts()
+        )
+        next_cursor = None
+        if len(rows) > info.limit:
+            rows = rows[:info.limit]
+            next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+        data = [{field.upper(): row[field] for field in fields} for row in rows]
+        return data, {"limit": info.limit, "next_cursor": next_cursor}
+
     def Update(self, info: AutoTestUpdate):
         """
         根据提供的AutoTestUpdate信息更新测试状态或记录。
@@ -170,18 +236,31 @@ class AutoTest(object):
     
         返回:
         - 返回调用Get方法的结果，该结果基于AutoTestFilter过滤条件获取。
+        - 修改状态时返回异步任务 ID，runner 进入目标状态(如正在暂停)后任务完成；否则为 None。
         """
+        at_filter = AutoTestFilter(uuids=info.uuids)
+        task_id = None
         if info.status is not None:
-            if info.status not in [PARAMS_STATUS_TARGET_MAP.keys()]:
+            if info.status not in PARAMS_STATUS_TARGET_MAP:
                 raise BadRequestException("status is invalid")
-            at_filter = AutoTestFilter(uuids=info.uuids)
-            # 更新锁。每次更新状态时，需要加锁，防止多个线程同时更新状态
-            with UPDATE_LOCK:
+            # 更新锁。检查状态和下发消息时加锁，防止多个线程或工作进程同时更新状态，不等待 manager 处理
+            with update_lock(self.queue):
                 # 根据info中的状态，获取对应的CR_STATUS_TARGET_MAP列表
                 cr_target_status_list = CR_STATUS_TARGET_MAP.get(info.status)
                 crs = self.Get(info=at_filter)
+                # 已下发但 manager 尚未处理的测试用例，状态还未变化，不重复下发
+                pending_uuids = {
+                    task.uuid for task in Task.select(Task.uuid).where(
+                        Task.uuid.in_([cr.uuid for cr in crs]) &
+                        (Task.status == db_const.TASK_STATUS_PENDING) &
+                        (Task.created_at > datetime.datetime.now() -
+                         datetime.timedelta(seconds=TASK_PENDING_TIMEOUT))
+                    )
+                } if crs else set()
                 need_update_crs = []
                 for cr in crs:
+                    if cr.uuid in pending_uuids:
+                        continue
                     if cr.status not in cr_target_status_list and cr.status in PARAMS_STATUS_TARGET_MAP.get(
                         info.status
                     ):
@@ -191,42 +270,49 @@ class AutoTest(object):
                         "no test cases available to modify the status"
                     )
 
-                # 遍历info中的UUID列表，为每个UUID创建CaseParams消息并放入队列
-                for cr in need_update_crs:
-                    uuid = cr.uuid
-                    msg = CaseParams(uuid=uuid, status=info.status)
+                # 为每个需要更新的测试用例创建CaseParams消息，创建任务后放入队列
+                messages = [
+                    CaseParams(uuid=cr.uuid, status=info.status)
+                    for cr in need_update_crs
+                ]
+                task_id = TaskWorker(self.queue).create(messages)
+                for msg in messages:
                     log.info(f"put msg to manager: {msg}")
-                    self.queue.put(msg)
-
-                # 设置等待超时时间
-                wait_count = POST_TIMEOUT
-                # 循环等待，直到所有相关测试记录的状态都符合预期
-                while wait_count:
-                    complete = 1
-                    crs = self.Get(info=at_filter)
-                    # 检查所有相关记录的状态是否都已更新
-                    for cr in crs:
-                        if cr.status not in cr_target_status_list:
-                            complete = 0
-                    if complete:
-                        break
-                    time.sleep(1)
-                    wait_count -= 1
+                    self.queue.put(msg.to_json())
         else:
             # 如果info中的状态为None，则从info中构建json_data，并更新CaseRecord表
             json_data = info.to_json()
             uuids = json_data.pop("uuids")
-            CaseRecord.update(**json_data).where(CaseRecord.uuid in uuids
-                                                 ).execute()
+            json_data = {k: v for k, v in json_data.items() if v is not None}
+            if json_data:
+                CaseRecord.update(**json_data).where(
+                    CaseRecord.uuid.in_(uuids)
+                ).execute()
         # 返回根据at_filter过滤得到的结果
-        return self.Get(info=at_filter)
+        return self.Get(info=at_filter), task_id
 
     def Delete(self, info: AutoTestDelete):
-        with UPDATE_LOCK:
+        with update_lock(self.queue):
             for uuid in info.uuids:
                 msg = CaseParams(
                     uuid=uuid, status=model_const.CASE_PARAMS_STATUS_FROCE_END
                 )
-                self.queue.put(msg)
+                self.queue.put(msg.to_json())
                 update_case_record(uuid, deleted=db_const.CASE_RECORD_DELETED)
+        # 删除标记合并为一次批量写入，写入后再查询
+        get_case_status_writer().flush()
         return self.Get()
+
+
+def encode_cursor(created_at: datetime.datetime, id: int) -> str:
+    cursor = f"{created_at.isoformat()}|{id}"
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        created_at, id = base64.urlsafe_b64decode(cursor.encode()
+                                                  ).decode().split("|")
+        return datetime.datetime.fromisoformat(created_at), int(id)
+    except Exception:
+        raise BadRequestException(f"bad request cursor {cursor}")
@@ -0,0 +1,76 @@
+import datetime
+
+from typing import Dict, List
+
+from eval_lib.common import logger
+from eval_lib.databases.mysql.models.models import CaseStatusEvent
+from eval_lib.databases.mysql import const as db_const
+
+log = logger.get_logger()
+
+# 各状态对应的阶段名称
+CASE_RECORD_STATUS_PHASES = {
+    db_const.CASE_RECORD_STATUS_INIT: "init",
+    db_const.CASE_RECORD_STATUS_STARTING: "starting",
+    db_const.CASE_RECORD_STATUS_STARTED: "started",
+    db_const.CASE_RECORD_STATUS_PENDING: "pending",
+    db_const.CASE_RECORD_STATUS_PAUSING: "pausing",
+    db_const.CASE_RECORD_STATUS_PAUSED: "paused",
+    db_const.CASE_RECORD_STATUS_STOPPING: "stopping",
+}
+
+
+def percentile(values: List[float], p) -> float:
+    """
+    最近秩法计算百分位数，values 需已排序。
+    """
+    index = max(int(len(values) * p / 100.0 + 0.5) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+class CaseStatusStats(object):
+    """
+    根据状态变化事件统计 case 在各阶段的耗时。
+
+    同一 case 相邻两次状态变化的时间差即为前一个状态的耗时，
+    用于定位排队、启动、执行、收集结果等阶段的瓶颈。
+    """
+
+    def phase_durations(self, hours) -> Dict[str, dict]:
+        """
+        统计最近 hours 小时内各阶段的耗时(秒)。
+
+        返回值:
+        - dict: 阶段名称 -> {count, avg, p50, p95, max}
+        """
+        since = datetime.datetime.now() - datetime.timedelta(hours=hours)
+        events = CaseStatusEvent.select(
+            CaseStatusEvent.uuid, CaseStatusEvent.new_status,
+            CaseStatusEvent.created_at
+        ).where(CaseStatusEvent.created_at >= since).order_by(
+            CaseStatusEvent.uuid, CaseStatusEvent.created_at,
+            CaseStatusEvent.id
+        ).tuples()
+
+        durations: Dict[str, List[float]] = {}
+        last = None
+        for uuid, status, created_at in events:
+            if last is not None and last[0] == uuid:
+                phase = CASE_RECORD_STATUS_PHASES.get(last[1])
+                if phase is not None:
+                    durations.setdefault(phase, []).append(
+                        (created_at - last[2]).total_seconds()
+                    )
+            last = (uuid, status, created_at)
+
+        stats = {}
+        for phase, values in durations.items():
+            values.sort()
+            stats[phase] = {
+                "count": len(values),
+                "avg": sum(values) / len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "max": values[-1],
+            }
+        return stats
@@ -0,0 +1,291 @@
+import collections
+import glob
+import os
+import queue
+import threading
+import time
+import zlib
+
+from typing import Dict, List
+
+from common.log_index import LogIndex, LogIndexWriter, LOG_HOLD_TIMEOUT
+from common.log_notify import log_notifier
+from common.const import LOG_INGEST_BATCH_SIZE, LOG_INGEST_PUT_TIMEOUT, LOG_INGEST_CLOSE_TIMEOUT, LOG_INGEST_DRAIN_TIMEOUT
+from eval_lib.common import logger
+from eval_lib.common.exceptions import InternalServerErrorException
+from config import conf
+
+log = logger.get_logger()
+
+# 写入线程队列中的结束标记
+STOP = object()
+
+
+class LogWriterThread(threading.Thread):
+    """
+    日志写入线程，负责按 uuid 分片后的一部分日志文件。
+
+    每次从队列中取出多批日志，按文件合并后一次写入；
+    文件句柄按 LRU 保持打开，并按 fsync_interval 定期 fsync。
+    """
+
+    def __init__(self, index, queue_size, max_open_files, fsync_interval):
+        super().__init__(name=f"log-writer-{index}", daemon=True)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.max_open_files = max_open_files
+        self.fsync_interval = fsync_interval
+        # 日志文件路径 -> 写入器，按最近使用排序
+        self.writers: Dict[str, LogIndexWriter] = collections.OrderedDict()
+        self.last_fsync_time = time.time()
+        self.lock = threading.Lock()
+        # 最近一批日志从入队到写入完成的耗时
+        self.lag = 0.0
+        self.chunks = 0
+        self.bytes = 0
+        self.errors = 0
+
+    def put(self, item):
+        self.queue.put(item, timeout=LOG_INGEST_PUT_TIMEOUT)
+
+    def stop(self):
+        """
+        写完队列中剩余的日志后关闭所有文件并退出。
+        """
+        self.queue.put(STOP)
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            try:
+                item = self.queue.get(timeout=self.fsync_interval or None)
+            except queue.Empty:
+                item = None
+            items = []
+            # 等待之前的日志写入完成的请求
+            drains = []
+            while item is not None:
+                if item is STOP:
+                    # 结束标记之前的日志都已取出
+                    stopping = True
+                    break
+                if isinstance(item, threading.Event):
+                    drains.append(item)
+                else:
+                    items.append(item)
+                if len(items) >= LOG_INGEST_BATCH_SIZE:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    item = None
+            self.write_safe(items)
+            for event in drains:
+                event.set()
+        for log_file in list(self.writers):
+            self.close_writer(log_file)
+
+    def write_safe(self, items):
+        try:
+            if items:
+                self.write(items)
+            self.fsync()
+        except Exception as e:
+            log.error(f"log writer error: {e}")
+
+    def write(self, items: List[tuple]):
+        """
+        :param items: [(入队时间, uuid, 日志文件路径, 日志, seq)]
+        """
+        files: Dict[str, list] = collections.OrderedDict()
+        uuids = set()
+        for _, uuid, log_file, data, seq in items:
+            files.setdefault(log_file, []).append((data, seq))
+            uuids.add(uuid)
+        written = 0
+        for log_file, chunks in files.items():
+            try:
+                written += self.get_writer(log_file).write(chunks)
+            except Exception as e:
+                log.error(f"write log {log_file} error: {e}")
+                self.close_writer(log_file)
+                with self.lock:
+                    self.errors += 1
+                # 发送方已收到成功响应，要求其从已写入的位置重发
+                if any(seq is not None for _, seq in chunks):
+                    try:
+                        LogIndex(log_file).request_resend()
+                    except Exception as e:
+                        log.error(f"request resend log {log_file} error: {e}")
+        now = time.time()
+        with self.lock:
+            self.lag = now - items[0][0]
+            self.chunks += len(items)
+            self.bytes += written
+        for uuid in uuids:
+            # 唤醒等待该 case 新日志的请求
+            log_notifier.notify(uuid)
+
+    def get_writer(self, log_file) -> LogIndexWriter:
+        writer = self.writers.get(log_file)
+        if writer is not None:
+            self.writers.move_to_end(log_file)
+            return writer
+        while len(self.writers) >= self.max_open_files:
+            self.close_writer(next(iter(self.writers)))
+        writer = LogIndexWriter(log_file)
+        self.writers[log_file] = writer
+        return writer
+
+    def close_writer(self, log_file):
+        writer = self.writers.pop(log_file, None)
+        if writer is None:
+            return
+        try:
+            writer.close()
+        except Exception as e:
+            log.error(f"close log {log_file} error: {e}")
+
+    def fsync(self):
+        if time.time() - self.last_fsync_time < self.fsync_interval:
+            return
+        self.last_fsync_time = time.time()
+        for log_file, writer in list(self.writers.items()):
+            try:
+                writer.fsync()
+            except Exception as e:
+                log.error(f"fsync log {log_file} error: {e}")
+                self.close_writer(log_file)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "queue_depth": self.queue.qsize(),
+                "lag": round(self.lag, 3),
+                "chunks": self.chunks,
+                "bytes": self.bytes,
+                "errors": self.errors,
+                "open_files": len(self.writers),
+            }
+
+
+class LogIngestor(object):
+    """
+    日志写入管道：请求只负责把日志放入队列，由写入线程异步写入文件。
+
+    同一 uuid 的日志固定由同一个写入线程处理，保证写入顺序；
+    队列满时等待 LOG_INGEST_PUT_TIMEOUT 秒后返回错误，由 runner 重试。
+    写入失败时要求 runner 从已写入的位置重发；进程退出前调用 close() 写完队列中的日志。
+    后台定期写入 log_dir 下等待超时的暂存批次。
+    """
+
+    def __init__(
+        self, writer_num, queue_size, max_open_files, fsync_interval,
+        log_dir
+    ):
+        self.log_dir = log_dir
+        self.threads = [
+            LogWriterThread(
+                i, queue_size, max(max_open_files // writer_num, 1),
+                fsync_interval
+            ) for i in range(writer_num)
+        ]
+        for thread in self.threads:
+            thread.start()
+        self._stop_event = threading.Event()
+        self.hold_sweeper = threading.Thread(
+            target=self.sweep_held, name="log-hold-sweeper", daemon=True
+        )
+        self.hold_sweeper.start()
+
+    def sweep_held(self):
+        while not self._stop_event.wait(LOG_HOLD_TIMEOUT / 2):
+            for hold_dir in glob.glob(f"{self.log_dir}/*.hold"):
+                log_file = hold_dir[:-len(".hold")]
+                try:
+                    LogIndex(log_file).release_held()
+                except Exception as e:
+                    log.error(f"release held log {log_file} error: {e}")
+
+    def close(self, timeout=LOG_INGEST_CLOSE_TIMEOUT):
+        """
+        停止接收日志，等待写入线程写完队列中的日志并关闭文件。
+        """
+        self._stop_event.set()
+        for thread in self.threads:
+            thread.stop()
+        deadline = time.time() + timeout
+        for thread in self.threads:
+            thread.join(max(deadline - time.time(), 0))
+            if thread.is_alive():
+                log.error(
+                    f"{thread.name} not finished, queued: {thread.queue.qsize()}"
+                )
+
+    def submit(self, uuid, log_file, data, seq=None):
+        try:
+            self.get_thread(uuid).put((time.time(), uuid, log_file, data, seq))
+        except queue.Full:
+            raise InternalServerErrorException("log ingest queue is full")
+
+    def drain(self, uuid, timeout=LOG_INGEST_DRAIN_TIMEOUT):
+        """
+        等待该 uuid 已放入队列的日志写入完成。
+        """
+        event = threading.Event()
+        try:
+            self.get_thread(uuid).put(event)
+        except queue.Full:
+            raise InternalServerErrorException("log ingest queue is full")
+        if not event.wait(timeout):
+            raise InternalServerErrorException("log ingest drain timeout")
+
+    def get_thread(self, uuid) -> LogWriterThread:
+        return self.threads[zlib.crc32(uuid.encode()) % len(self.threads)]
+
+    def stats(self) -> dict:
+        threads = [thread.stats() for thread in self.threads]
+        return {
+            "queue_depth": sum(t["queue_depth"] for t in threads),
+            "lag": max(t["lag"] for t in threads),
+            "chunks": sum(t["chunks"] for t in threads),
+            "bytes": sum(t["bytes"] for t in threads),
+            "errors": sum(t["errors"] for t in threads),
+            "open_files": sum(t["open_files"] for t in threads),
+            "writers": threads,
+        }
+
+
+_log_ingestor: LogIngestor = None
+_log_ingestor_pid = None
+_log_ingestor_lock = threading.Lock()
+
+
+def get_log_ingestor() -> LogIngestor:
+    """
+    获取当前进程的 LogIngestor，首次调用时启动写入线程。
+    """
+    global _log_ingestor, _log_ingestor_pid
+    with _log_ingestor_lock:
+        if _log_ingestor is None or _log_ingestor_pid != os.getpid():
+            _log_ingestor = LogIngestor(
+                writer_num=conf.log_writer_num,
+                queue_size=conf.log_queue_size,
+                max_open_files=conf.log_max_open_files,
+                fsync_interval=conf.log_fsync_interval,
+                log_dir=f"{conf.runner_data_dir}/tmp",
+            )
+            _log_ingestor_pid = os.getpid()
+        return _log_ingestor
+
+
+def close_log_ingestor():
+    """
+    进程退出前写完当前进程队列中的日志，未启动写入管道时不做任何操作。
+    """
+    global _log_ingestor
+    with _log_ingestor_lock:
+        ingestor = _log_ingestor
+        if ingestor is None or _log_ingestor_pid != os.getpid():
+            return
+        _log_ingestor = None
+    ingestor.close()
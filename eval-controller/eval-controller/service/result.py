@@ -1,43 +1,83 @@
-import subprocess
+import json
 import os
+import threading
+import time
 import traceback
 
 from eval_lib.common import logger
-from eval_lib.common.exceptions import InternalServerErrorException
-from common.model import ResultPostLog, ResultGetLog, ResultLogResponse, ResultGetFile, ResultFileResponse
+from eval_lib.common.exceptions import ServiceUnavailableException
+from common.log_index import LogIndex
+from common.log_notify import log_notifier
+from service.log_ingest import get_log_ingestor
+from service.result_upload import ResultUpload, get_extract_jobs
+from service.result_artifact import ResultArtifacts
+from common.const import LOG_TAIL_CHECK_INTERVAL, LOG_STREAM_KEEPALIVE_INTERVAL
+from common.model import ResultPostLog, ResultGetLog, ResultLogResponse, ResultGetFile, ResultFileResponse, ResultTailLog
 from config import conf
 
 log = logger.get_logger()
 POST_TIMEOUT = 10
 
 
+class LogWatchLimiter(object):
+    """
+    限制当前进程同时等待新日志的请求数。
+
+    长轮询和日志推送在等待期间一直占用一个工作线程，数量不受限时会占满线程，
+    runner 上报日志等请求无法处理；超过上限时返回 503，由客户端稍后重试。
+    """
+
+    def __init__(self, max_watchers):
+        self.semaphore = threading.BoundedSemaphore(max(max_watchers, 1))
+
+    def acquire(self):
+        if not self.semaphore.acquire(blocking=False):
+            raise ServiceUnavailableException("too many log watchers")
+
+    def release(self):
+        self.semaphore.release()
+
+
+log_watch_limiter = LogWatchLimiter(conf.server_log_watch_max)
+
+
 class ResultWorker(object):
 
     def post_log(self, msg: ResultPostLog):
         """
-        将日志消息写入到文件中。
+        将日志消息放入写入队列，由日志写入线程异步写入文件。
+        flush 为真时等待该 case 已放入队列的日志写入完成后再返回。
     
         参数:
         - msg: ResultPostLog 类型。
     
         返回值:
-        - 无
+        - dict: resend_seq 不为空时，之前的日志写入失败，runner 需从该位置重发
         """
         # 根据消息的uuid生成日志文件路径
         log_file = f"{conf.runner_data_dir}/tmp/runner-{msg.uuid}.log"
         # log.info(f"get post log msg {msg.uuid}, logfile: {log_file}")
 
-        # 如果消息数据为空，则不进行任何操作
-        if not msg.data:
-            return
-        try:
-            # 将日志数据追加写入到文件中
-            with open(log_file, 'a+') as file:
-                file.write(msg.data)
-        except Exception as e:
-            # 记录日志写入过程中的错误，并抛出异常
-            log.error(f"post log error {e}")
-            raise e
+        ingestor = get_log_ingestor()
+        if msg.data:
+            # 放入写入队列后立即返回，由写入线程追加到文件并更新行偏移索引
+            ingestor.submit(msg.uuid, log_file, msg.data, msg.seq)
+        if msg.flush:
+            # runner 结束前确认日志已写入，写入失败时由 resend_seq 要求重发
+            ingestor.drain(msg.uuid)
+        elif not msg.data:
+            # 如果消息数据为空，则不进行任何操作
+            return {"resend_seq": None}
+        return {"resend_seq": LogIndex(log_file).resend_seq()}
+
+    def get_log_ingest_stats(self) -> dict:
+        return get_log_ingestor().stats()
+
+    def log_file_path(self, uuid) -> str:
+        log_file = f"{conf.runner_data_dir}/tmp/runner-{uuid}.log"
+        if not os.path.exists(log_file):
+            log_file = f"{conf.runner_data_dir}/runner-{uuid}/log/runner.log"
+        return log_file
 
     def get_log(self, msg: ResultGetLog = None) -> dict:
         """
@@ -50,9 +90,7 @@ class ResultWorker(object):
         - 一个字典，包含日志响应的内容，UUID、日志条目、行数。
         """
         # 构造日志文件路径
-        log_file = f"{conf.runner_data_dir}/tmp/runner-{msg.uuid}.log"
-        if not os.path.exists(log_file):
-            log_file = f"{conf.runner_data_dir}/runner-{msg.uuid}/log/runner.log"
+        log_file = self.log_file_path(msg.uuid)
         log.info(f"get log msg {msg}, logfile: {log_file}")
 
         # 初始化日志响应对象
@@ -60,39 +98,16 @@ class ResultWorker(object):
         if not os.path.exists(log_file):
             return rlr
         try:
-            # 处理行大小设置，为0时则获取全部
-            line_size = "$" if msg.line_size < 1 else msg.line_size
-            # 使用sed命令获取指定行范围的日志内容
-            sed_cmd = f"sed -n '{msg.line_index},{line_size}p' {log_file}"
-            p = subprocess.run(
-                sed_cmd, shell=True, stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
+            # 通过行偏移索引直接读取指定行范围，line_size 小于 1 时读取到文件末尾
+            logs, line_count = LogIndex(log_file).read(
+                msg.line_index, msg.line_size
             )
-            logs = p.stdout.decode('utf-8')
-            err = p.stderr.decode('utf-8')
-            if err:
-                raise InternalServerErrorException(err)
-
-            # 使用wc命令计算日志文件的行数
-            wc_cmd = f"wc -l {log_file}"
-            p = subprocess.run(
-                wc_cmd, shell=True, stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            wc = p.stdout.decode('utf-8')
-            err = p.stderr.decode('utf-8')
-            if err:
-                raise InternalServerErrorException(err)
-
-            # 如果有日志内容，则处理并设置到rlr对象中
+            # 设置日志总行数
+            rlr.line_count = line_count
             if logs:
-                logs = logs.split("\n")[:-1]
                 rlr.line_size = len(logs)
                 rlr.logs = logs
                 rlr.line_index = msg.line_index
-                # 设置日志总行数
-                if wc:
-                    rlr.line_count = int(wc.split(" ")[0])
         except Exception as e:
             log.error(traceback.format_exc())
             log.error(f"get log error {e}")
@@ -101,31 +116,157 @@ class ResultWorker(object):
         # 将rlr对象转换为JSON格式返回
         return rlr.to_json()
 
+    def read_new_log(self, msg: ResultGetLog, last_size) -> tuple:
+        """
+        日志文件大小变化时读取 line_index 之后的新日志。
+
+        :return: (日志响应，没有新日志时为 None, 日志文件大小)
+        """
+        log_file = self.log_file_path(msg.uuid)
+        try:
+            size = os.path.getsize(log_file)
+        except FileNotFoundError:
+            return None, last_size
+        if size == last_size:
+            return None, size
+        # 只读取完整的行，下一次从 line_index + line_size 续读时不会丢失未写完的行
+        logs, line_count = LogIndex(log_file).read(
+            msg.line_index, msg.line_size, complete_only=True
+        )
+        if not logs:
+            return None, size
+        rlr = ResultLogResponse(
+            uuid=msg.uuid, logs=logs, line_index=msg.line_index,
+            line_size=len(logs), line_count=line_count
+        )
+        return rlr.to_json(), size
+
+    def tail_log(self, msg: ResultTailLog) -> dict:
+        """
+        长轮询获取 line_index 之后的新日志，没有新日志时等待直到有日志写入或超时。
+        除写入通知外每隔 LOG_TAIL_CHECK_INTERVAL 秒检查一次日志文件大小。
+
+        返回值:
+        - 日志响应，超时时 logs 为空；下一次请求的 line_index 为 line_index + line_size。
+        """
+        log_watch_limiter.acquire()
+        try:
+            return self.wait_new_log(
+                msg, min(msg.timeout, conf.server_log_tail_max_timeout)
+            )
+        finally:
+            log_watch_limiter.release()
+
+    def wait_new_log(self, msg: ResultTailLog, timeout) -> dict:
+        deadline = time.time() + timeout
+        size = None
+        while True:
+            version = log_notifier.version(msg.uuid)
+            rlr, size = self.read_new_log(msg, size)
+            if rlr is not None:
+                return rlr
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return ResultLogResponse(
+                    uuid=msg.uuid, logs=[], line_index=msg.line_index,
+                    line_size=0
+                ).to_json()
+            log_notifier.wait(
+                msg.uuid, version, min(LOG_TAIL_CHECK_INTERVAL, remaining)
+            )
+
+    def stream_log(self, msg: ResultTailLog):
+        """
+        以 server-sent events 推送 line_index 之后的新日志，事件 id 为下一行的行号，
+        客户端断线重连时通过 Last-Event-ID 从断点继续。
+        调用方需先调用 log_watch_limiter.acquire()，连接关闭时释放。
+        """
+        start_time = time.time()
+        keepalive_time = start_time
+        size = None
+        while time.time() - start_time < conf.server_log_stream_max_duration:
+            version = log_notifier.version(msg.uuid)
+            rlr, size = self.read_new_log(msg, size)
+            if rlr is not None:
+                msg.line_index += rlr["line_size"]
+                # 同一批日志未读完时，不等待文件大小变化
+                size = None
+                keepalive_time = time.time()
+                yield f"id: {msg.line_index}\ndata: {json.dumps(rlr)}\n\n"
+                continue
+            if time.time() - keepalive_time >= LOG_STREAM_KEEPALIVE_INTERVAL:
+                keepalive_time = time.time()
+                yield ": keepalive\n\n"
+            log_notifier.wait(msg.uuid, version, LOG_TAIL_CHECK_INTERVAL)
+
     def get_performance_results(self):
         # TODO: luyao 获取性能测试结果
         pass
 
     def get_performance_md(self, info: ResultGetFile):
-        prefix = f"runner-{info.uuid}"
-        md_dir = f"{conf.runner_data_dir}/{prefix}/report"
         data = []
-        if not os.path.exists(md_dir):
-            return []
-        for filename in os.listdir(md_dir):
-            if not filename.endswith(".md"):
-                continue
-            file_path = os.path.join(md_dir, filename)
-            if os.path.isfile(file_path):
+        for filename, file_path, _, _ in self.performance_md_files(info):
+            try:
                 with open(file_path, "r") as f:
                     data.append([filename, f.read()])
+            except FileNotFoundError:
+                continue
         return data
 
-    def post_zip(self, filename, zipfile):
+    def get_performance_md_version(self, info: ResultGetFile) -> tuple:
+        """
+        只读取文件状态，用于判断性能测试报告是否变化。
+
+        返回值:
+        - tuple: (版本, 最后修改时间)，版本为每个报告文件的文件名、mtime 和大小
+        """
+        files = self.performance_md_files(info)
+        version = tuple((f[0], f[2], f[3]) for f in files)
+        last_modified = max((f[2] for f in files), default=0) / 1e9
+        return version, last_modified or None
+
+    def performance_md_files(self, info: ResultGetFile) -> list:
+        """
+        :return: [(文件名, 文件路径, mtime(纳秒), 大小)]，按文件名排序
+        """
+        md_dir = f"{conf.runner_data_dir}/runner-{info.uuid}/report"
         try:
-            prefix = filename.split(".zip")[0]
-            zipfile.extractall(path=f"{conf.runner_data_dir}/")
-            files = os.listdir(f"{conf.runner_data_dir}/{prefix}")
-            log.info(files)
-        except Exception as e:
-            log.error(f"post zip error {e}")
-            raise e
+            entries = list(os.scandir(md_dir))
+        except FileNotFoundError:
+            return []
+        files = []
+        for entry in entries:
+            if not entry.name.endswith(".md") or not entry.is_file():
+                continue
+            st = entry.stat()
+            files.append((entry.name, entry.path, st.st_mtime_ns, st.st_size))
+        return sorted(files)
+
+    def post_zip(self, filename, file_storage) -> dict:
+        """
+        保存上传的完整压缩包并提交后台解压任务。
+
+        返回值:
+        - 解压任务，通过 get_zip_job 查询进度
+        """
+        upload = ResultUpload(filename)
+        upload.save(file_storage)
+        return upload.complete()
+
+    def get_zip_upload(self, filename) -> dict:
+        return {"size": ResultUpload(filename).size()}
+
+    def put_zip_upload(self, filename, offset, stream) -> dict:
+        return {"size": ResultUpload(filename).write(offset, stream)}
+
+    def complete_zip_upload(self, filename, sha256=None) -> dict:
+        return ResultUpload(filename).complete(sha256)
+
+    def get_zip_job(self, job_id) -> dict:
+        return get_extract_jobs().get(job_id)
+
+    def get_artifacts(self, uuid) -> dict:
+        return ResultArtifacts(uuid).manifest()
+
+    def put_artifact(self, uuid, path, sha256, stream) -> dict:
+        return ResultArtifacts(uuid).put(path, sha256, stream)
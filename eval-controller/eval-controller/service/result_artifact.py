@@ -0,0 +1,104 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import uuid
+
+from common.const import RESULT_UPLOAD_CHUNK_SIZE, RESULT_ARTIFACT_DIRS
+from eval_lib.common import logger
+from eval_lib.common.exceptions import BadRequestException
+from config import conf
+
+log = logger.get_logger()
+
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+UUID_PATTERN = re.compile(r"^[\w-]+$")
+
+
+def manifest_dir() -> str:
+    return f"{conf.runner_data_dir}/tmp/artifacts"
+
+
+class ResultArtifacts(object):
+    """
+    runner 执行过程中增量上传的结果文件。
+
+    文件直接写入 runner-<uuid> 下对应的目录，按内容 sha256 记录在清单中，
+    runner 只上传新增或内容变化的文件，重启后可通过清单得知哪些文件已上传。
+    """
+
+    def __init__(self, case_uuid):
+        if not UUID_PATTERN.match(case_uuid or ""):
+            raise BadRequestException(f"bad uuid {case_uuid}")
+        self.uuid = case_uuid
+        self.root = os.path.realpath(
+            f"{conf.runner_data_dir}/runner-{case_uuid}"
+        )
+        self.manifest_path = f"{manifest_dir()}/runner-{case_uuid}.json"
+
+    def manifest(self) -> dict:
+        """
+        :return: {相对路径: sha256}
+        """
+        try:
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def file_path(self, path) -> str:
+        """
+        只允许写入 runner-<uuid> 下的结果目录。
+        """
+        parts = (path or "").split("/")
+        if parts[0] not in RESULT_ARTIFACT_DIRS or len(parts) < 2:
+            raise BadRequestException(f"bad artifact path {path}")
+        file_path = os.path.realpath(os.path.join(self.root, path))
+        if not file_path.startswith(self.root + os.sep):
+            raise BadRequestException(f"bad artifact path {path}")
+        return file_path
+
+    def put(self, path, sha256, stream) -> dict:
+        """
+        保存上传的文件，内容与 sha256 不一致时丢弃。
+
+        :param stream: 请求体数据流，按块读取写入，不整体读入内存
+        :return: 文件的相对路径和 sha256
+        """
+        if not SHA256_PATTERN.match(sha256 or ""):
+            raise BadRequestException(f"bad sha256 {sha256}")
+        file_path = self.file_path(path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+        digest = hashlib.sha256()
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in iter(
+                    lambda: stream.read(RESULT_UPLOAD_CHUNK_SIZE), b""
+                ):
+                    digest.update(chunk)
+                    f.write(chunk)
+            if digest.hexdigest() != sha256:
+                raise BadRequestException(f"{path} sha256 mismatch")
+            os.replace(tmp_path, file_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.update_manifest(path, sha256)
+        return {"path": path, "sha256": sha256}
+
+    def update_manifest(self, path, sha256):
+        os.makedirs(manifest_dir(), exist_ok=True)
+        # 同一 runner 的多个文件可能由不同的 server 进程并发写入，清单的读改写加文件锁
+        with open(f"{self.manifest_path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                manifest = self.manifest()
+                manifest[path] = sha256
+                tmp_path = f"{self.manifest_path}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(manifest, f)
+                os.replace(tmp_path, self.manifest_path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,289 @@
+import concurrent.futures
+import fcntl
+import json
+import os
+import re
+import stat
+import threading
+import time
+import uuid
+import zipfile
+
+from common.const import RESULT_UPLOAD_CHUNK_SIZE, RESULT_EXTRACT_JOB_TIMEOUT, RESULT_UPLOAD_ORPHAN_AGE
+from eval_lib.common import logger
+from eval_lib.common.file import file_sha256
+from eval_lib.common.exceptions import BadRequestException
+from config import conf
+
+log = logger.get_logger()
+
+# 结果压缩包名称，解压后的目录为 runner-<uuid>
+RESULT_ZIP_NAME_PATTERN = re.compile(r"^runner-[\w-]+\.zip$")
+
+JOB_STATUS_PENDING = "pending"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_DONE = "done"
+JOB_STATUS_FAILED = "failed"
+JOB_ACTIVE_STATUS = (JOB_STATUS_PENDING, JOB_STATUS_RUNNING)
+
+
+def upload_dir() -> str:
+    return f"{conf.runner_data_dir}/tmp/uploads"
+
+
+def job_dir() -> str:
+    return f"{conf.runner_data_dir}/tmp/jobs"
+
+
+class ResultUpload(object):
+    """
+    可续传的结果压缩包上传。
+
+    数据按块追加写入 <文件名>.part，客户端断线后先查询已上传的大小，再从该位置继续上传；
+    上传完成后提交解压任务。
+    """
+
+    def __init__(self, filename):
+        if not RESULT_ZIP_NAME_PATTERN.match(filename or ""):
+            raise BadRequestException(f"bad result zip name {filename}")
+        self.filename = filename
+        self.part_path = f"{upload_dir()}/{filename}.part"
+
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.part_path)
+        except FileNotFoundError:
+            return 0
+
+    def write(self, offset, stream) -> int:
+        """
+        从 offset 处写入上传的数据，offset 为 0 时重新上传。
+
+        :param stream: 请求体数据流，按块读取写入，不整体读入内存
+        :return: 已上传的大小
+        """
+        os.makedirs(upload_dir(), exist_ok=True)
+        with open(self.part_path, "ab") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                size = os.fstat(f.fileno()).st_size
+                if offset == 0:
+                    f.truncate(0)
+                elif offset != size:
+                    raise BadRequestException(
+                        f"offset {offset} mismatch, uploaded size {size}"
+                    )
+                for chunk in iter(
+                    lambda: stream.read(RESULT_UPLOAD_CHUNK_SIZE), b""
+                ):
+                    f.write(chunk)
+                f.flush()
+                return os.fstat(f.fileno()).st_size
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def save(self, file_storage) -> int:
+        """
+        保存 multipart 上传的完整文件。
+        """
+        os.makedirs(upload_dir(), exist_ok=True)
+        file_storage.save(self.part_path, buffer_size=RESULT_UPLOAD_CHUNK_SIZE)
+        return self.size()
+
+    def complete(self, sha256=None) -> dict:
+        """
+        上传完成，提交解压任务。
+
+        :param sha256: 压缩包的 sha256，解压前校验
+        :return: 解压任务
+        """
+        if not os.path.exists(self.part_path):
+            raise BadRequestException(f"upload {self.filename} not found")
+        job_id = uuid.uuid4().hex
+        zip_path = f"{upload_dir()}/{job_id}.zip"
+        os.replace(self.part_path, zip_path)
+        return get_extract_jobs().submit(job_id, self.filename, zip_path, sha256)
+
+
+class ExtractJobs(object):
+    """
+    结果压缩包的后台解压任务。
+
+    在线程池中校验 sha256 和各文件的 CRC，检查每个文件的解压路径都在 runner-<uuid> 目录下，
+    再逐个解压。任务状态保存在 json 文件中，所有 server 进程都可以查询。
+    任务记录提交任务的进程，该进程退出后未完成的任务标记为失败。
+    """
+
+    def __init__(self, worker_num):
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=worker_num, thread_name_prefix="result-extract"
+        )
+        # 本进程提交且尚未完成的任务
+        self.job_ids = set()
+        self.recover()
+
+    def recover(self):
+        """
+        处理已退出的 server 进程遗留的任务：未完成的任务标记为失败，
+        删除没有对应未完成任务的压缩包。
+        """
+        active = set()
+        for name in self.listdir(job_dir()):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(f"{job_dir()}/{name}", "r") as f:
+                    job = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if job.get("status") not in JOB_ACTIVE_STATUS:
+                continue
+            if self.is_stale(job):
+                self.fail_stale(job)
+            else:
+                active.add(job["job_id"])
+        now = time.time()
+        for name in self.listdir(upload_dir()):
+            if not name.endswith(".zip") or name[:-len(".zip")] in active:
+                continue
+            zip_path = f"{upload_dir()}/{name}"
+            try:
+                if now - os.stat(zip_path).st_ctime > RESULT_UPLOAD_ORPHAN_AGE:
+                    os.remove(zip_path)
+                    log.info(f"remove orphan result zip {name}")
+            except OSError:
+                pass
+
+    @staticmethod
+    def listdir(path) -> list:
+        try:
+            return os.listdir(path)
+        except FileNotFoundError:
+            return []
+
+    def is_stale(self, job: dict) -> bool:
+        """
+        未完成的任务超时，或提交任务的进程已退出时视为已丢失。
+        """
+        if time.time() - job.get("created_at", 0) > RESULT_EXTRACT_JOB_TIMEOUT:
+            return True
+        pid = job.get("pid")
+        if pid is None:
+            return False
+        if pid == os.getpid():
+            return job["job_id"] not in self.job_ids
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    def fail_stale(self, job: dict):
+        log.warning(f"extract job {job['job_id']} of {job['filename']} lost")
+        job["status"] = JOB_STATUS_FAILED
+        job["error"] = "extract job lost, server worker exited"
+        job["finished_at"] = time.time()
+        self.save(job)
+        try:
+            os.remove(f"{upload_dir()}/{job['job_id']}.zip")
+        except OSError:
+            pass
+
+    def submit(self, job_id, filename, zip_path, sha256=None) -> dict:
+        job = {
+            "job_id": job_id,
+            "filename": filename,
+            "status": JOB_STATUS_PENDING,
+            "error": None,
+            "files": 0,
+            "created_at": time.time(),
+            "pid": os.getpid(),
+        }
+        self.job_ids.add(job_id)
+        self.save(job)
+        self.executor.submit(self.run, job, zip_path, sha256)
+        return job
+
+    def get(self, job_id) -> dict:
+        if not re.match(r"^\w+$", job_id or ""):
+            raise BadRequestException(f"bad job id {job_id}")
+        try:
+            with open(f"{job_dir()}/{job_id}.json", "r") as f:
+                job = json.load(f)
+        except FileNotFoundError:
+            raise BadRequestException(f"job {job_id} not found")
+        if job["status"] in JOB_ACTIVE_STATUS and self.is_stale(job):
+            self.fail_stale(job)
+        return job
+
+    def save(self, job: dict):
+        os.makedirs(job_dir(), exist_ok=True)
+        job_file = f"{job_dir()}/{job['job_id']}.json"
+        with open(f"{job_file}.tmp", "w") as f:
+            json.dump(job, f)
+        os.replace(f"{job_file}.tmp", job_file)
+
+    def run(self, job: dict, zip_path, sha256=None):
+        job["status"] = JOB_STATUS_RUNNING
+        self.save(job)
+        try:
+            if sha256 and file_sha256(zip_path, RESULT_UPLOAD_CHUNK_SIZE) != sha256:
+                raise Exception("sha256 mismatch")
+            job["files"] = self.extract(job["filename"], zip_path)
+            job["status"] = JOB_STATUS_DONE
+            log.info(f"extract {job['filename']} done, files: {job['files']}")
+        except Exception as e:
+            log.error(f"extract {job['filename']} error: {e}")
+            job["status"] = JOB_STATUS_FAILED
+            job["error"] = str(e)
+        finally:
+            job["finished_at"] = time.time()
+            self.save(job)
+            self.job_ids.discard(job["job_id"])
+            try:
+                os.remove(zip_path)
+            except OSError:
+                pass
+
+    def extract(self, filename, zip_path) -> int:
+        root = os.path.realpath(conf.runner_data_dir)
+        prefix = filename[:-len(".zip")]
+        target = os.path.join(root, prefix)
+        with zipfile.ZipFile(zip_path) as zf:
+            bad_file = zf.testzip()
+            if bad_file is not None:
+                raise Exception(f"crc check failed: {bad_file}")
+            members = zf.infolist()
+            for member in members:
+                self.validate_member(member, root, target)
+            for member in members:
+                zf.extract(member, root)
+        return len(members)
+
+    @staticmethod
+    def validate_member(member: zipfile.ZipInfo, root, target):
+        """
+        只允许解压到 runner-<uuid> 目录下的普通文件和目录。
+        """
+        mode = member.external_attr >> 16
+        if stat.S_ISLNK(mode):
+            raise Exception(f"symlink not allowed: {member.filename}")
+        path = os.path.realpath(os.path.join(root, member.filename))
+        if path != target and not path.startswith(target + os.sep):
+            raise Exception(f"bad member path: {member.filename}")
+
+
+_extract_jobs: ExtractJobs = None
+_extract_jobs_pid = None
+_extract_jobs_lock = threading.Lock()
+
+
+def get_extract_jobs() -> ExtractJobs:
+    global _extract_jobs, _extract_jobs_pid
+    with _extract_jobs_lock:
+        if _extract_jobs is None or _extract_jobs_pid != os.getpid():
+            _extract_jobs = ExtractJobs(conf.result_extract_worker_num)
+            _extract_jobs_pid = os.getpid()
+        return _extract_jobs
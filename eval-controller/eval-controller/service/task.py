@@ -0,0 +1,78 @@
+import time
+import uuid
+
+from common.const import TASK_WAIT_MAX_TIMEOUT
+from eval_lib.common import logger
+from eval_lib.common.exceptions import BadRequestException
+from eval_lib.databases.mysql.models.models import Task
+from eval_lib.databases.mysql import const as db_const
+from eval_lib.databases.redis.message_queue import RedisMessageQueue
+
+log = logger.get_logger()
+
+
+class TaskWorker(object):
+    """
+    异步任务。
+
+    修改 case 状态的请求只下发消息并返回任务 ID，不再在请求中等待 manager 处理；
+    manager 处理完每条消息后更新任务记录，增加任务的通知版本号并发布通知，
+    等待该任务的请求订阅通知，全部被唤醒。
+    """
+
+    def __init__(self, queue: RedisMessageQueue) -> None:
+        self.queue = queue
+
+    def create(self, messages: list) -> str:
+        """
+        为待下发的消息创建任务记录，并在消息中带上任务 ID。
+        需在消息下发前调用，保证 manager 处理消息时任务记录已存在。
+
+        参数:
+        - messages: CaseParams 列表。
+
+        返回值:
+        - str: 任务 ID。
+        """
+        task_id = uuid.uuid4().hex
+        Task.insert_many([
+            {"task_id": task_id, "uuid": msg.uuid, "type": msg.status}
+            for msg in messages
+        ]).execute()
+        for msg in messages:
+            msg.task_id = task_id
+        return task_id
+
+    def get(self, task_id, timeout=0) -> dict:
+        """
+        获取任务状态，任务未完成时最多等待 timeout 秒。
+
+        返回值:
+        - dict: 任务 ID、整体状态(有失败即为失败)和每个测试用例的执行结果。
+        """
+        timeout = min(max(timeout, 0), TASK_WAIT_MAX_TIMEOUT)
+        deadline = time.time() + timeout
+        while True:
+            # 先读版本号再查任务，查询后 manager 的更新不会漏掉
+            version = self.queue.notify_version(task_id)
+            task = self.load(task_id)
+            remaining = deadline - time.time()
+            if task["status"] != db_const.TASK_STATUS_PENDING or remaining <= 0:
+                return task
+            # 版本号变化后重新查询，超时后返回当前状态
+            self.queue.wait_notify(task_id, version, remaining)
+
+    def load(self, task_id) -> dict:
+        items = list(
+            Task.select().where(Task.task_id == task_id).order_by(Task.id)
+        )
+        if not items:
+            raise BadRequestException(f"task {task_id} not found")
+        statuses = {item.status for item in items}
+        if db_const.TASK_STATUS_PENDING in statuses:
+            status = db_const.TASK_STATUS_PENDING
+        elif db_const.TASK_STATUS_FAILED in statuses:
+            status = db_const.TASK_STATUS_FAILED
+        else:
+            status = db_const.TASK_STATUS_DONE
+        return {"TASK_ID": task_id, "STATUS": status, "ITEMS": items}
@@ -21,3 +21,7 @@ class BadRequestException(EvaluationException):
 
 class InternalServerErrorException(EvaluationException):
     pass
+
+
+class ServiceUnavailableException(EvaluationException):
+    pass
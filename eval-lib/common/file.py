@@ -0,0 +1,11 @@
+import hashlib
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path, chunk_size=DEFAULT_CHUNK_SIZE) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
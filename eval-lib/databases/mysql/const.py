@@ -13,5 +13,9 @@ CASE_RECORD_STATUS_STOPPING = 31
 CASE_RECORD_STATUS_ERROR = 4
 CASE_RECORD_STATUS_EXCEPTION = 5
 
+TASK_STATUS_PENDING = 0
+TASK_STATUS_DONE = 1
+TASK_STATUS_FAILED = 2
+
 CASE_RECORD_NOT_DELETED = 0
 CASE_RECORD_DELETED = 1
\ No newline at end of file
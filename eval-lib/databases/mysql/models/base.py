@@ -13,10 +13,26 @@ class BaseModel(Model):
         database = db
 
     def to_json(self):
-        return {
-            key.column_name.upper(): getattr(self, key.column_name, None)
-            for key in self._meta.sorted_fields
-        }
+        data = self.__data__
+        return {key: data.get(name) for key, name in self.json_fields()}
+
+    @classmethod
+    def json_fields(cls) -> tuple:
+        """
+        to_json 输出的字段，每个 model 只计算一次。
+
+        返回值:
+        - tuple: ((字段名(大写), 取值的字段名), ...)
+        """
+        # 只取当前类自己的缓存，子类字段不同
+        fields = cls.__dict__.get("_json_fields")
+        if fields is None:
+            fields = tuple(
+                (field.column_name.upper(), field.name)
+                for field in cls._meta.sorted_fields
+            )
+            cls._json_fields = fields
+        return fields
 
     @classmethod
     def visible_where_clause(cls, filter: Union[dict, BaseStruct], **kwargs):
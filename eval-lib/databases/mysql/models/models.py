@@ -3,9 +3,25 @@ from peewee import CharField, DateTimeField, IntegerField
 
 from .base import BaseModel
 from ..const import COMPONENT_TYPE_UNKNOWN, COMPONENT_TYPE_DF_AGENT, COMPONENT_TYPE_DF_SERVER
+from ..const import TASK_STATUS_PENDING, TASK_STATUS_DONE, TASK_STATUS_FAILED
 from ..db import db
 
 
+class PreciseDateTimeField(DateTimeField):
+    """
+    精确到微秒的日期时间字段，对应 MySQL 的 DATETIME(6)
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault(
+            'formats', ['%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S']
+        )
+        super().__init__(*args, **kwargs)
+
+    def get_modifiers(self):
+        return [6]
+
+
 class CaseRecord(BaseModel):
     """
     测试用例记录类
@@ -19,6 +35,10 @@ class CaseRecord(BaseModel):
         runner_image_tag: 执行器镜像标签，字符串类型，最大长度64，不能为空
         status: 执行状态，整数类型，不能为空
         deleted: 删除状态，整数类型，不能为空
+        priority: 排队优先级，整数类型，值越大越先执行，默认为0
+        queue_position: 排队位置，整数类型，从1开始，未排队时为空
+        expected_start_at: 预计开始执行时间，日期时间类型，未排队时为空
+        stalled_step: 长时间未推进的步骤名称，字符串类型，步骤正常推进时为空
         created_at: 创建时间，日期时间类型，默认为当前时间
     """
 
@@ -30,13 +50,22 @@ class CaseRecord(BaseModel):
     runner_image_tag = CharField(max_length=64, null=True)
     status = IntegerField(null=False)
     deleted = IntegerField(null=False, default=0)
+    priority = IntegerField(null=False, default=0)
+    queue_position = IntegerField(null=True)
+    expected_start_at = DateTimeField(formats='%Y-%m-%d %H:%M:%S', null=True)
+    stalled_step = CharField(max_length=256, null=True)
     created_at = DateTimeField(
-        formats='%Y-%m-%d %H:%M:%S', default=datetime.datetime.now()
+        formats='%Y-%m-%d %H:%M:%S', default=datetime.datetime.now
     )
 
     class Meta:
         table_name = 'case_record'
         database = db
+        # 列表查询按 deleted(、status) 过滤，按 (created_at, id) 游标分页
+        indexes = (
+            (('deleted', 'created_at', 'id'), False),
+            (('deleted', 'status', 'created_at', 'id'), False),
+        )
 
 
 class CaseReport(BaseModel):
@@ -52,7 +81,7 @@ class CaseReport(BaseModel):
     case_uuid = CharField(max_length=64, null=False)
     report_path = CharField(max_length=64, null=False)
     created_at = DateTimeField(
-        formats='%Y-%m-%d %H:%M:%S', default=datetime.datetime.now()
+        formats='%Y-%m-%d %H:%M:%S', default=datetime.datetime.now
     )
 
     class Meta:
@@ -86,5 +115,67 @@ class Component(BaseModel):
     commit_id = CharField(null=True)
     image_tag = CharField(null=True)
     created_at = DateTimeField(
-        formats='%Y-%m-%d %H:%M:%S', default=datetime.datetime.now()
+        formats='%Y-%m-%d %H:%M:%S', default=datetime.datetime.now
     )
+
+
+class CaseStatusEvent(BaseModel):
+    """
+    测试用例状态变化记录类，只追加不修改
+
+    属性:
+        uuid: 测试用例唯一标识符，字符串类型，最大长度64，不能为空
+        old_status: 变化前的状态，整数类型，未知时为空
+        new_status: 变化后的状态，整数类型，不能为空
+        cause: 状态变化的原因，字符串类型，最大长度256，可以为空
+        created_at: 状态变化时间，精确到微秒的日期时间类型，默认为当前时间
+    """
+
+    uuid = CharField(max_length=64, null=False)
+    old_status = IntegerField(null=True)
+    new_status = IntegerField(null=False)
+    cause = CharField(max_length=256, null=True)
+    # 相邻状态变化可能在一秒内发生，按秒存储时阶段耗时会被截断
+    created_at = PreciseDateTimeField(default=datetime.datetime.now)
+
+    class Meta:
+        table_name = 'case_status_event'
+        database = db
+        # 按时间范围统计各阶段耗时，按 case 查询状态变化历史
+        indexes = (
+            (('created_at', ), False),
+            (('uuid', 'created_at'), False),
+        )
+
+
+class Task(BaseModel):
+    """
+    异步任务类，任务下发给 manager 的每个测试用例对应一条记录
+
+    属性:
+        task_id: 任务唯一标识符，字符串类型，最大长度64，不能为空
+        uuid: 测试用例唯一标识符，字符串类型，最大长度64，不能为空
+        type: 下发的请求类型(创建、暂停、取消、恢复等)，整数类型，不能为空
+        status: 执行状态，整数类型，不能为空，默认为等待执行
+        error: 执行失败的原因，字符串类型，最大长度1024，可以为空
+        created_at: 创建时间，日期时间类型，默认为当前时间
+        finished_at: 完成时间，日期时间类型，未完成时为空
+    """
+
+    task_id = CharField(max_length=64, null=False, index=True)
+    uuid = CharField(max_length=64, null=False)
+    type = IntegerField(null=False)
+    status = IntegerField(
+        null=False, default=TASK_STATUS_PENDING, choices=[
+            TASK_STATUS_PENDING, TASK_STATUS_DONE, TASK_STATUS_FAILED
+        ]
+    )
+    error = CharField(max_length=1024, null=True)
+    created_at = DateTimeField(
+        formats='%Y-%m-%d %H:%M:%S', default=datetime.datetime.now
+    )
+    finished_at = DateTimeField(formats='%Y-%m-%d %H:%M:%S', null=True)
+
+    class Meta:
+        table_name = 'task'
+        database = db
@@ -0,0 +1,103 @@
+import threading
+import time
+from typing import Dict, Tuple
+
+import redis
+
+DEFAULT_MAX_CONNECTIONS = 50
+DEFAULT_HEALTH_CHECK_INTERVAL = 30
+DEFAULT_POOL_TIMEOUT = 20
+
+_clients: Dict[Tuple, redis.Redis] = {}
+_clients_lock = threading.Lock()
+
+
+class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    """
+    BlockingConnectionPool that records how many connections are handed
+    out and how long callers waited for one.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+        super().__init__(*args, **kwargs)
+
+    def _reset_stats(self):
+        self._in_use = 0
+        self._acquired = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def reset(self):
+        # called by redis-py on init and after fork
+        with self._stats_lock:
+            self._reset_stats()
+        super().reset()
+
+    def get_connection(self, command_name, *keys, **options):
+        start = time.monotonic()
+        connection = super().get_connection(command_name, *keys, **options)
+        waited = time.monotonic() - start
+        with self._stats_lock:
+            self._in_use += 1
+            self._acquired += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return connection
+
+    def release(self, connection):
+        super().release(connection)
+        with self._stats_lock:
+            self._in_use = max(self._in_use - 1, 0)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            created = len(self._connections)
+            return {
+                "max_connections": self.max_connections,
+                "created": created,
+                "in_use": self._in_use,
+                "idle": max(created - self._in_use, 0),
+                "acquired": self._acquired,
+                "wait_avg": self._wait_total / self._acquired
+                if self._acquired else 0.0,
+                "wait_max": self._wait_max,
+            }
+
+
+def get_redis_client(
+    host, port, password, db, max_connections=DEFAULT_MAX_CONNECTIONS,
+    health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL,
+    socket_keepalive=True, timeout=DEFAULT_POOL_TIMEOUT
+) -> redis.Redis:
+    """
+    Return the process-wide client for (host, port, db), creating it with
+    its connection pool on first use. Later calls share the same pool, the
+    pool options of the first call win.
+    """
+    key = (host, str(port), str(db))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            pool = InstrumentedConnectionPool(
+                host=host, port=port, password=password, db=db,
+                max_connections=max_connections, timeout=timeout,
+                health_check_interval=health_check_interval,
+                socket_keepalive=socket_keepalive
+            )
+            client = redis.Redis(connection_pool=pool)
+            _clients[key] = client
+        return client
+
+
+def pool_stats() -> dict:
+    """
+    :return: {"host:port/db": stats} for every pool created in this process
+    """
+    with _clients_lock:
+        clients = dict(_clients)
+    return {
+        f"{host}:{port}/{db}": client.connection_pool.stats()
+        for (host, port, db), client in clients.items()
+    }
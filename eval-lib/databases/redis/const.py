@@ -1,9 +1,26 @@
 RUNNER_TIMEOUT = 3600 * 24
 RUNNER_KEY = "runner"
 GLOBAL_LOCK = "get_runner_info"
+CONTROL_CHANNEL = "control"
+EVENT_CHANNEL = "event"
+RESULTS_ACK_KEY = "results-ack"
+RESULTS_ACK_TTL = 600
+HEARTBEAT_KEY = "heartbeat"
 
 CASE_STATUS_INIT = 'init'
 CASE_STATUS_RUNNING = 'running'
 CASE_STATUS_COMPLETED = 'completed'
 CASE_STATUS_CANCELLED = 'cancelled'
-CASE_STATUS_PAUSED = 'paused'
\ No newline at end of file
+CASE_STATUS_PAUSED = 'paused'
+
+MESSAGE_STREAM = "control-messages"
+MESSAGE_GROUP = "manager"
+MESSAGE_CONSUMER = "manager"
+MESSAGE_REPLY_KEY = "control-reply"
+MESSAGE_REPLY_TTL = 60
+MESSAGE_NOTIFY_KEY = "control-notify"
+MESSAGE_NOTIFY_TTL = 600
+
+RUNNER_POOL_KEY = "runner-pool"
+RUNNER_ASSIGN_KEY = "runner-assign"
+RUNNER_ASSIGN_TTL = 60
@@ -0,0 +1,167 @@
+import json
+import time
+
+import redis
+
+from .redis_db import RedisDB
+from .client import DEFAULT_MAX_CONNECTIONS, DEFAULT_HEALTH_CHECK_INTERVAL
+from . import const
+
+
+class RedisMessageQueue(RedisDB):
+    """
+    Durable message queue backed by a Redis Stream consumer group.
+
+    A delivered message stays in the consumer's pending list until it is
+    acked, so a consumer restarted with the same name replays everything it
+    had not acknowledged before handling new messages. Replies go to a
+    per-message list that the producer can block on. Notifications bump a
+    per-message version and are published on a per-message channel, so any
+    number of waiters wake up.
+    """
+
+    def __init__(
+        self, host, port,
+        password, db,
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL,
+        socket_keepalive=True,
+        stream=const.MESSAGE_STREAM,
+        group=const.MESSAGE_GROUP,
+        consumer=const.MESSAGE_CONSUMER,
+    ) -> None:
+        super().__init__(
+            host, port,
+            password, db,
+            max_connections,
+            health_check_interval,
+            socket_keepalive,
+        )
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer
+        # read our own pending entries first after (re)start
+        self.replay = True
+
+    def reply_key(self, message_id):
+        return f"{const.MESSAGE_REPLY_KEY}-{message_id}"
+
+    def notify_key(self, message_id):
+        return f"{const.MESSAGE_NOTIFY_KEY}-{message_id}"
+
+    def ensure_group(self):
+        try:
+            self.conn.xgroup_create(
+                self.stream, self.group, id="0", mkstream=True
+            )
+        except redis.exceptions.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def put(self, message: dict) -> str:
+        """
+        :return: id of the message, used to wait for its reply
+        """
+        message_id = self.conn.xadd(
+            self.stream, {"data": json.dumps(message)}
+        )
+        return message_id.decode()
+
+    def get(self, block=None, count=1) -> list:
+        """
+        :param block: milliseconds to block for new messages, None blocks forever
+        :return: [(message_id, message)], pending messages are returned
+                 first after a restart
+        """
+        if self.replay:
+            messages = self._read("0", None, count)
+            if messages:
+                return messages
+            self.replay = False
+        return self._read(">", 0 if block is None else block, count)
+
+    def _read(self, last_id, block, count) -> list:
+        response = self.conn.xreadgroup(
+            self.group, self.consumer, {self.stream: last_id}, count=count,
+            block=block
+        )
+        messages = []
+        for _, entries in response:
+            for message_id, fields in entries:
+                # entries trimmed from the stream come back without fields
+                if not fields:
+                    self.conn.xack(self.stream, self.group, message_id)
+                    continue
+                messages.append(
+                    (message_id.decode(), json.loads(fields[b"data"]))
+                )
+        return messages
+
+    def ack(self, message_id):
+        """
+        Acknowledge a handled message, it will not be replayed any more.
+        """
+        with self.conn.pipeline() as pipe:
+            pipe.xack(self.stream, self.group, message_id)
+            pipe.xdel(self.stream, message_id)
+            pipe.execute()
+
+    def reply(self, message_id, reply: dict = None):
+        """
+        Hand the result of a message to the producer waiting in wait_reply.
+        """
+        reply_key = self.reply_key(message_id)
+        with self.conn.pipeline() as pipe:
+            pipe.rpush(reply_key, json.dumps(reply or {}))
+            pipe.expire(reply_key, const.MESSAGE_REPLY_TTL)
+            pipe.execute()
+
+    def wait_reply(self, message_id, timeout) -> dict:
+        """
+        :return: the reply sent by the consumer, None on timeout
+        """
+        response = self.conn.blpop(self.reply_key(message_id), timeout)
+        if response is None:
+            return None
+        return json.loads(response[1])
+
+    def notify(self, message_id):
+        """
+        Bump the notify version of a message and publish it. Unlike reply,
+        the wake-up is not consumed, every waiter in wait_notify sees it.
+        """
+        notify_key = self.notify_key(message_id)
+        with self.conn.pipeline() as pipe:
+            pipe.incr(notify_key)
+            pipe.expire(notify_key, const.MESSAGE_NOTIFY_TTL)
+            pipe.publish(notify_key, "")
+            pipe.execute()
+
+    def notify_version(self, message_id):
+        """
+        :return: current notify version, read it before checking the state
+                 the notification is about and pass it to wait_notify
+        """
+        return self.conn.get(self.notify_key(message_id))
+
+    def wait_notify(self, message_id, version, timeout) -> bool:
+        """
+        Block on the message's channel until it is notified. The version is
+        checked after subscribing, a notify sent before that is not missed.
+
+        :return: True if the version changed, False on timeout
+        """
+        pubsub = self.conn.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(self.notify_key(message_id))
+            if self.notify_version(message_id) != version:
+                return True
+            deadline = time.time() + timeout
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                if pubsub.get_message(timeout=remaining) is not None:
+                    return True
+        finally:
+            pubsub.close()
@@ -1,8 +1,9 @@
-import redis
 import time
 import uuid
 from redis.exceptions import WatchError
 
+from .client import get_redis_client, DEFAULT_MAX_CONNECTIONS, DEFAULT_HEALTH_CHECK_INTERVAL
+
 
 class RedisDB():
 
@@ -10,16 +11,22 @@ class RedisDB():
     def __init__(
         self, host, port,
         password, db,
-        max_connections,
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL,
+        socket_keepalive=True,
     ) -> None:
         self.host = host
         self.port = port
         self.password = password
         self.db = db
-        self.conn_pool = redis.ConnectionPool(
-            host=self.host, port=self.port, max_connections=max_connections,
-            password=self.password, db=self.db
+        # clients are shared per (host, port, db) across the process
+        self.conn = get_redis_client(
+            host=self.host, port=self.port, password=self.password,
+            db=self.db, max_connections=max_connections,
+            health_check_interval=health_check_interval,
+            socket_keepalive=socket_keepalive
         )
+        self.conn_pool = self.conn.connection_pool
 
     def acquire_lock(self, lockname, acquite_timeout=30, time_out=20):
         """
@@ -30,7 +37,7 @@ class RedisDB():
         """
         identifier = str(uuid.uuid4())
         end = time.time() + acquite_timeout
-        conn = redis.Redis(connection_pool=self.conn_pool)
+        conn = self.conn
         while time.time() < end:
             if conn.setnx(lockname, identifier):
                 # Set the expiration time of the key and automatically release the lock when it expires
@@ -47,7 +54,7 @@ class RedisDB():
         :param lockname: Name of the lock
         :param identifier: Lock Identification
         """
-        conn = redis.Redis(connection_pool=self.conn_pool)
+        conn = self.conn
         with conn.pipeline() as pipe:
             while True:
                 try:
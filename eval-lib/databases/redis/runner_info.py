@@ -1,8 +1,38 @@
+import time
+
 from .redis_db import RedisDB
+from .client import DEFAULT_MAX_CONNECTIONS, DEFAULT_HEALTH_CHECK_INTERVAL
 import redis
 from . import const
 
+# Set case-control-status and notify subscribers in one step, only if the
+# runner info still exists (a deleted runner must not be recreated).
+SET_CONTROL_STATUS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'case-control-status', ARGV[1])
+redis.call('PUBLISH', ARGV[2], ARGV[1])
+return 1
+"""
 
+# Compare-and-set case-status, returns the value stored after the call.
+# Like SET_CONTROL_STATUS_SCRIPT, a deleted runner info is not recreated
+# (it would have no TTL), nil is returned instead.
+CAS_CASE_STATUS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local current = redis.call('HGET', KEYS[1], 'case-status')
+if current == ARGV[2] then
+    return current
+end
+if current == ARGV[1] or (not current and ARGV[1] == '') then
+    redis.call('HSET', KEYS[1], 'case-status', ARGV[2])
+    return ARGV[2]
+end
+return current
+"""
 
 
 class RedisRunnerInfo(RedisDB):
@@ -11,77 +41,201 @@ class RedisRunnerInfo(RedisDB):
     def __init__(
         self, host, port,
         password, db,
-        max_connections,
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL,
+        socket_keepalive=True,
     ) -> None:
         super().__init__(
             host, port,
             password, db,
             max_connections,
+            health_check_interval,
+            socket_keepalive,
+        )
+        conn = self.conn
+        self.set_control_status_script = conn.register_script(
+            SET_CONTROL_STATUS_SCRIPT
         )
+        self.cas_case_status_script = conn.register_script(
+            CAS_CASE_STATUS_SCRIPT
+        )
+
+    def runner_key(self, uuid):
+        return f"{const.RUNNER_KEY}-{uuid}"
 
-    def init_runner_info(self, uuid):
+    def init_runner_info(self, uuid, release_name=None):
         runner_info = {
             "uuid": uuid,
             "case-control-status": const.CASE_STATUS_RUNNING,
             "runner-status": const.CASE_STATUS_INIT,
             "case-status": const.CASE_STATUS_INIT,
         }
-        conn = redis.Redis(connection_pool=self.conn_pool)
-        runner_key_name = f"{const.RUNNER_KEY}-{uuid}"
-        conn.hmset(runner_key_name, runner_info)
-        # runner timeout
-        conn.expire(runner_key_name, const.RUNNER_TIMEOUT)
-        
+        if release_name:
+            # helm release running the case, used to reattach after restart
+            runner_info["release-name"] = release_name
+        conn = self.conn
+        runner_key_name = self.runner_key(uuid)
+        with conn.pipeline(transaction=True) as pipe:
+            pipe.hset(runner_key_name, mapping=runner_info)
+            # runner timeout
+            pipe.expire(runner_key_name, const.RUNNER_TIMEOUT)
+            pipe.execute()
+
     def update_runner_info(self, uuid, info: dict):
-        key_name = f"{const.RUNNER_KEY}-{uuid}"
-        lock = self.acquire_lock(const.GLOBAL_LOCK)
-        conn = redis.Redis(connection_pool=self.conn_pool)
-        # update = False
-        for k, v in info.items():
-            if conn.hget(key_name, k) != v:
-                conn.hset(key_name, k, v)
-                # update = True
-        # if update:
-        #     updated = int(time.time())
-        #     conn.hset(key_name, "updated_time", updated)
-        self.release_lock(const.GLOBAL_LOCK, lock)
+        if not info:
+            return
+        conn = self.conn
+        conn.hset(self.runner_key(uuid), mapping=info)
+
+    def set_runner_status(self, uuid, status):
+        """
+        Set runner-status and publish it on the event channel of the runner,
+        so the controller notices the change without polling.
+        """
+        with self.conn.pipeline(transaction=True) as pipe:
+            pipe.hset(self.runner_key(uuid), "runner-status", status)
+            pipe.publish(self.event_channel(uuid), status)
+            pipe.execute()
 
     def get_runner_info(self, uuid) -> dict:
-        key_name = f"{const.RUNNER_KEY}-{uuid}"
-        lock = self.acquire_lock(const.GLOBAL_LOCK)
-        runner_info = {}
-        conn = redis.Redis(connection_pool=self.conn_pool)
-        hash_all = conn.hgetall(key_name)
-        if hash_all:
-            for k, v in hash_all.items():
-                runner_info[k.decode()] = v.decode()
-        self.release_lock(const.GLOBAL_LOCK, lock)
-        return runner_info
+        conn = self.conn
+        hash_all = conn.hgetall(self.runner_key(uuid))
+        return {k.decode(): v.decode() for k, v in hash_all.items()}
 
     def delete_runner_info(self, uuid):
-        key_name = f"{const.RUNNER_KEY}-{uuid}"
-        lock = self.acquire_lock(const.GLOBAL_LOCK)
-        conn = redis.Redis(connection_pool=self.conn_pool)
-        conn.delete(key_name)
-        self.release_lock(const.GLOBAL_LOCK, lock)
+        conn = self.conn
+        conn.delete(self.runner_key(uuid), self.heartbeat_key(uuid))
+
+    def compare_and_set_case_status(self, uuid, expected, status) -> str:
+        """
+        Atomically set case-status to `status` if it currently equals
+        `expected` (None matches a missing field).
+        :return: the case-status stored after the call, None when the
+            runner info no longer exists
+        """
+        conn = self.conn
+        current = self.cas_case_status_script(
+            keys=[self.runner_key(uuid)],
+            args=[expected or "", status],
+            client=conn,
+        )
+        return current.decode() if current else None
+
+    def set_case_control_status(self, uuid, status) -> bool:
+        conn = self.conn
+        return bool(
+            self.set_control_status_script(
+                keys=[self.runner_key(uuid)],
+                args=[status, self.control_channel(uuid)],
+                client=conn,
+            )
+        )
 
     def pause_case(self, uuid):
-        key_name = f"{const.RUNNER_KEY}-{uuid}"
-        lock = self.acquire_lock(const.GLOBAL_LOCK)
-        conn = redis.Redis(connection_pool=self.conn_pool)
-        conn.hset(key_name, "case-control-status", const.CASE_STATUS_PAUSED)
-        self.release_lock(const.GLOBAL_LOCK, lock)
-    
+        return self.set_case_control_status(uuid, const.CASE_STATUS_PAUSED)
+
     def cancel_case(self, uuid):
-        key_name = f"{const.RUNNER_KEY}-{uuid}"
-        lock = self.acquire_lock(const.GLOBAL_LOCK)
-        conn = redis.Redis(connection_pool=self.conn_pool)
-        conn.hset(key_name, "case-control-status", const.CASE_STATUS_CANCELLED)
-        self.release_lock(const.GLOBAL_LOCK, lock)
-    
+        return self.set_case_control_status(
+            uuid, const.CASE_STATUS_CANCELLED
+        )
+
     def resume_case(self, uuid):
-        key_name = f"{const.RUNNER_KEY}-{uuid}"
-        lock = self.acquire_lock(const.GLOBAL_LOCK)
-        conn = redis.Redis(connection_pool=self.conn_pool)
-        conn.hset(key_name, "case-control-status", const.CASE_STATUS_RUNNING)
-        self.release_lock(const.GLOBAL_LOCK, lock)
\ No newline at end of file
+        return self.set_case_control_status(uuid, const.CASE_STATUS_RUNNING)
+
+    def control_channel(self, uuid):
+        return f"{const.RUNNER_KEY}-{uuid}-{const.CONTROL_CHANNEL}"
+
+    def publish_case_control(self, uuid, status):
+        """
+        Notify subscribers of the case that case-control-status changed.
+        The hash field stays the source of truth, the message only wakes
+        up runners early.
+        """
+        conn = self.conn
+        conn.publish(self.control_channel(uuid), status)
+
+    def subscribe_case_control(self, uuid) -> redis.client.PubSub:
+        conn = self.conn
+        pubsub = conn.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.control_channel(uuid))
+        return pubsub
+
+    def event_channel(self, uuid):
+        return f"{const.RUNNER_KEY}-{uuid}-{const.EVENT_CHANNEL}"
+
+    def subscribe_runner_events(self) -> redis.client.PubSub:
+        """
+        Subscribe to the event channels of all runners, the uuid is taken
+        from the channel name with runner_uuid_from_channel().
+        """
+        conn = self.conn
+        pubsub = conn.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(self.event_channel("*"))
+        return pubsub
+
+    def runner_uuid_from_channel(self, channel: str) -> str:
+        prefix = f"{const.RUNNER_KEY}-"
+        suffix = f"-{const.EVENT_CHANNEL}"
+        return channel[len(prefix):-len(suffix)]
+
+    def results_ack_key(self, uuid):
+        return f"{const.RUNNER_KEY}-{uuid}-{const.RESULTS_ACK_KEY}"
+
+    def ack_results(self, uuid):
+        """
+        Tell the runner that its results were received and it may exit.
+        Kept in a list rather than published, so a runner that starts
+        waiting after the ack still sees it.
+        """
+        ack_key = self.results_ack_key(uuid)
+        with self.conn.pipeline() as pipe:
+            pipe.rpush(ack_key, "1")
+            pipe.expire(ack_key, const.RESULTS_ACK_TTL)
+            pipe.execute()
+
+    def wait_results_ack(self, uuid, timeout) -> bool:
+        """
+        :return: True if the controller acked the results within timeout
+        """
+        ack_key = self.results_ack_key(uuid)
+        result = self.conn.blpop(ack_key, timeout)
+        if result is None:
+            return False
+        self.conn.delete(ack_key)
+        return True
+
+    def heartbeat_key(self, uuid):
+        return f"{const.RUNNER_KEY}-{uuid}-{const.HEARTBEAT_KEY}"
+
+    def heartbeat(self, uuid, ttl):
+        """
+        Refresh the heartbeat of a runner, the key expires after ttl
+        seconds without a heartbeat.
+        """
+        heartbeat_key = self.heartbeat_key(uuid)
+        with self.conn.pipeline() as pipe:
+            pipe.hset(heartbeat_key, "beat-at", time.time())
+            pipe.expire(heartbeat_key, ttl)
+            pipe.execute()
+
+    def heartbeat_step(self, uuid, step, ttl):
+        """
+        Record the step the runner started and count it as progress.
+        """
+        heartbeat_key = self.heartbeat_key(uuid)
+        now = time.time()
+        with self.conn.pipeline() as pipe:
+            pipe.hset(
+                heartbeat_key,
+                mapping={"beat-at": now, "step": step, "step-at": now}
+            )
+            pipe.hincrby(heartbeat_key, "progress", 1)
+            pipe.expire(heartbeat_key, ttl)
+            pipe.execute()
+
+    def get_heartbeat(self, uuid) -> dict:
+        """
+        :return: {} if the runner never sent a heartbeat or it expired
+        """
+        hash_all = self.conn.hgetall(self.heartbeat_key(uuid))
+        return {k.decode(): v.decode() for k, v in hash_all.items()}
@@ -0,0 +1,51 @@
+import json
+
+from .redis_db import RedisDB
+from . import const
+
+
+class RedisRunnerPool(RedisDB):
+    """
+    Idle runner pods waiting for a case.
+
+    An idle runner pushes its release name to the pool list of its image
+    tag and blocks on its own assignment list. The controller pops a
+    release from the pool and pushes the case params to that release's
+    assignment list.
+    """
+
+    def pool_key(self, image_tag):
+        return f"{const.RUNNER_POOL_KEY}-{image_tag}"
+
+    def assign_key(self, release_name):
+        return f"{const.RUNNER_ASSIGN_KEY}-{release_name}"
+
+    def register_idle(self, image_tag, release_name):
+        self.conn.rpush(self.pool_key(image_tag), release_name)
+
+    def pop_idle(self, image_tag) -> str:
+        """
+        :return: release name of an idle runner, None if the pool is empty
+        """
+        release_name = self.conn.lpop(self.pool_key(image_tag))
+        return release_name.decode() if release_name else None
+
+    def clear(self, image_tag):
+        self.conn.delete(self.pool_key(image_tag))
+
+    def assign(self, release_name, case_params: dict):
+        # the assignment expires if the runner is gone before taking it
+        assign_key = self.assign_key(release_name)
+        with self.conn.pipeline() as pipe:
+            pipe.rpush(assign_key, json.dumps(case_params))
+            pipe.expire(assign_key, const.RUNNER_ASSIGN_TTL)
+            pipe.execute()
+
+    def wait_assignment(self, release_name, timeout) -> dict:
+        """
+        :return: case params assigned to the runner, None on timeout
+        """
+        response = self.conn.blpop(self.assign_key(release_name), timeout)
+        if response is None:
+            return None
+        return json.loads(response[1])
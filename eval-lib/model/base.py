@@ -36,7 +36,10 @@ class BaseStruct:
 
 class CaseParams(BaseStruct):
 
-    KEYS = ["uuid", "case_name", "process_num", "status", "runner_image_tag"]
+    KEYS = [
+        "uuid", "case_name", "process_num", "status", "runner_image_tag",
+        "user", "priority", "task_id"
+    ]
 
     def init(self, **kwargs):
         self.uuid = kwargs.get("uuid", None)
@@ -46,6 +49,10 @@ class CaseParams(BaseStruct):
             kwargs.get("status", const.CASE_PARAMS_STATUS_UNKNOWN)
         )
         self.runner_image_tag = kwargs.get("runner_image_tag", "latest")
+        self.user = kwargs.get("user", None)
+        self.priority = int(kwargs.get("priority") or 0)
+        # 下发该消息的异步任务，manager 处理后更新任务状态
+        self.task_id = kwargs.get("task_id", None)
 
     def is_valid(self):
         # TODO
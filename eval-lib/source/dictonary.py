@@ -39,6 +39,7 @@ class Dictionary(metaclass=DictionaryMeta):
         model_const.CASE_PARAMS_STATUS_CANCEL: [
             "cancel",
             [
+                db_const.CASE_RECORD_STATUS_INIT,
                 db_const.CASE_RECORD_STATUS_STARTED,
                 db_const.CASE_RECORD_STATUS_PAUSED
             ]
@@ -1,5 +1,6 @@
 import yaml
 from common.const import RUNNER_CONFIG_PATH
+from common.config import conf
 from eval_lib.common.ssh import SSHPool
 
 
@@ -14,7 +15,7 @@ class AgentBase(object):
     def init_custom_param(self):
         with open(RUNNER_CONFIG_PATH, 'r') as file:
             data = yaml.safe_load(file)
-            self.uuid = data['case_params']['uuid']
+            self.uuid = conf.case_params.uuid
             agent_type = data['agent-tools']['type']
             self.custom_param = data['agent-tools'][agent_type]
     
@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+
+import requests
+
+from common import const
+from eval_lib.common.file import file_sha256
+from eval_lib.common.logger import get_logger
+
+log = get_logger()
+
+
+class ArtifactSyncer(threading.Thread):
+    """
+    在 case 执行过程中增量上传结果文件。
+
+    后台线程定期扫描 runner 数据目录下的 report、allure-result、log 目录，
+    按内容 sha256 上传新增或变化的文件，已上传的文件记录在本地清单中。
+    启动时先从 controller 获取已上传的清单，runner 重启后不会重复上传。
+    结束时 stop() 做最后一次同步，上传失败的文件由 pending() 返回，随结果压缩包发送。
+    """
+
+    def __init__(
+        self, uuid, data_path, server_url, exclude=None,
+        interval=const.ARTIFACT_SYNC_INTERVAL
+    ):
+        super().__init__(name="artifact-syncer", daemon=True)
+        self.uuid = uuid
+        self.data_path = data_path
+        self.server_url = f"{server_url}/{uuid}"
+        # 执行中持续追加的文件(如已由 LogClient 转发的 pytest 日志)只在最后同步
+        self.exclude = set(exclude or [])
+        self.interval = interval
+        self.session = requests.Session()
+        # 已上传的文件: {相对路径: sha256}
+        self.uploaded = {}
+        # 文件状态缓存: {相对路径: (mtime, size, sha256)}，未变化的文件不重新计算 sha256
+        self.stat_cache = {}
+        # 读取失败的文件，下一轮重试，最终仍失败时随结果压缩包发送
+        self.failed = set()
+        # 最后一次同步是否完成，未完成时所有文件都随结果压缩包发送
+        self.final_synced = False
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    def run(self):
+        self.load_uploaded()
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.sync(final=False)
+            except Exception as e:
+                log.error(f"sync artifacts error: {e}")
+
+    def stop(self):
+        """
+        停止后台同步，做最后一次全量同步。
+        """
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+        try:
+            self.sync(final=True)
+            self.final_synced = True
+        except Exception as e:
+            log.error(f"final sync artifacts error: {e}")
+
+    def load_uploaded(self):
+        try:
+            response = self.session.get(self.server_url, timeout=30)
+            response.raise_for_status()
+            self.uploaded = response.json()["DATA"]
+        except Exception as e:
+            log.error(f"get uploaded artifacts error: {e}")
+
+    def scan(self, final) -> dict:
+        """
+        :return: 内容变化的文件 {相对路径: sha256}
+        """
+        changed = {}
+        now = time.time()
+        for file_path in self.walk():
+            path = os.path.relpath(file_path, self.data_path)
+            if not final and file_path in self.exclude:
+                continue
+            try:
+                st = os.stat(file_path)
+                # 最近仍在写入的文件等写完后再上传
+                if not final and now - st.st_mtime < const.ARTIFACT_SYNC_SETTLE_TIME:
+                    continue
+                cached = self.stat_cache.get(path)
+                if cached and cached[:2] == (st.st_mtime, st.st_size):
+                    sha256 = cached[2]
+                else:
+                    sha256 = file_sha256(file_path)
+                    self.stat_cache[path] = (st.st_mtime, st.st_size, sha256)
+            except FileNotFoundError:
+                self.failed.discard(path)
+                continue
+            except OSError as e:
+                log.error(f"read artifact {path} error: {e}")
+                self.failed.add(path)
+                continue
+            self.failed.discard(path)
+            if self.uploaded.get(path) != sha256:
+                changed[path] = sha256
+        return changed
+
+    def walk(self):
+        """
+        :return: 同步目录下所有文件的绝对路径，无法读取的目录跳过
+        """
+        for artifact_dir in const.ARTIFACT_SYNC_DIRS:
+            for root, _, files in os.walk(
+                f"{self.data_path}/{artifact_dir}",
+                onerror=lambda e: log.error(f"walk artifact dir error: {e}")
+            ):
+                for file in files:
+                    yield os.path.join(root, file)
+
+    def sync(self, final):
+        with self.lock:
+            changed = self.scan(final)
+            for path, sha256 in changed.items():
+                try:
+                    self.upload(path, sha256)
+                    self.uploaded[path] = sha256
+                except Exception as e:
+                    log.error(f"upload artifact {path} error: {e}")
+            if changed:
+                log.info(f"artifacts synced: {len(changed)} files")
+
+    def upload(self, path, sha256):
+        with open(f"{self.data_path}/{path}", "rb") as f:
+            response = self.session.put(
+                f"{self.server_url}/{path}", params={"sha256": sha256}, data=f,
+                headers={"Content-Type": "application/octet-stream"},
+                timeout=300
+            )
+        response.raise_for_status()
+
+    def pending(self) -> list:
+        """
+        :return: 尚未成功上传的文件的绝对路径
+        """
+        with self.lock:
+            if not self.final_synced:
+                return list(self.walk())
+            paths = {
+                path for path, (_, _, sha256) in self.stat_cache.items()
+                if self.uploaded.get(path) != sha256
+            } | self.failed
+            return [
+                f"{self.data_path}/{path}" for path in sorted(paths)
+                if os.path.exists(f"{self.data_path}/{path}")
+            ]
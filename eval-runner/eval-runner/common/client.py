@@ -1,68 +1,278 @@
+import collections
+import gzip
+import os
 import requests
 import threading
 import time
 import json
+from common import const
 from eval_lib.model.const import RESULT_TYPE_LOG_RAW
+from eval_lib.common.file import file_sha256
 from eval_lib.common.logger import get_logger
 log = get_logger()
 
 
 class ResultClient():
     # 将测试结果文件 传输到controller
+    # 分块上传，断线后从 controller 已收到的位置继续；上传完成后等待 controller 解压完成
     def __init__(self, server_url) :
         self.server_url = server_url
+        self.session = requests.Session()
 
-    def send_result_zip(self, zip_file_path):
-        try:
-            with open(zip_file_path, 'rb') as file:
-                files = {'file': file}
-                response = requests.post(f'{self.server_url}', files=files)
-                if response.status_code == 200:
-                    log.info("Result files uploaded successfully!")
-                else:
-                    log.error(f"Upload failed: {response.text}")
-        except Exception as e:
-            log.error(f"Upload failed: {e}")
+    def send_result_zip(self, zip_file_path) -> bool:
+        filename = os.path.basename(zip_file_path)
+        upload_url = f"{self.server_url}/upload/{filename}"
+        sha256 = file_sha256(zip_file_path)
+        retry_interval = const.RESULT_UPLOAD_RETRY_INTERVAL
+        for _ in range(const.RESULT_UPLOAD_MAX_RETRY):
+            try:
+                job = self.upload(zip_file_path, upload_url, sha256)
+                break
+            except Exception as e:
+                log.error(f"Upload failed: {e}, retry in {retry_interval}s")
+                time.sleep(retry_interval)
+                retry_interval = min(retry_interval * 2, const.LOG_SEND_MAX_RETRY_INTERVAL)
+        else:
+            log.error(f"Upload {filename} failed")
+            return False
+        log.info(f"Result files uploaded successfully! job: {job['job_id']}")
+        return self.wait_job(job["job_id"])
+
+    def upload(self, zip_file_path, upload_url, sha256) -> dict:
+        total_size = os.path.getsize(zip_file_path)
+        # 查询已上传的大小，从该位置继续上传
+        response = self.session.get(upload_url, timeout=30)
+        response.raise_for_status()
+        offset = response.json()["DATA"]["size"]
+        if offset > total_size:
+            offset = 0
+        with open(zip_file_path, 'rb') as file:
+            while offset < total_size or total_size == 0:
+                file.seek(offset)
+                chunk = file.read(const.RESULT_UPLOAD_CHUNK_SIZE)
+                response = self.session.put(
+                    upload_url, params={"offset": offset}, data=chunk,
+                    headers={"Content-Type": "application/octet-stream"},
+                    timeout=300
+                )
+                response.raise_for_status()
+                offset = response.json()["DATA"]["size"]
+                if total_size == 0:
+                    break
+        response = self.session.post(
+            f"{upload_url}/complete", json={"sha256": sha256}, timeout=30
+        )
+        response.raise_for_status()
+        return response.json()["DATA"]
+
+    def wait_job(self, job_id) -> bool:
+        deadline = time.time() + const.RESULT_EXTRACT_TIMEOUT
+        while time.time() < deadline:
+            try:
+                response = self.session.get(
+                    f"{self.server_url}/job/{job_id}", timeout=30
+                )
+                response.raise_for_status()
+                job = response.json()["DATA"]
+                if job["status"] == "done":
+                    log.info(f"Result files extracted, files: {job['files']}")
+                    return True
+                if job["status"] == "failed":
+                    log.error(f"Result files extract failed: {job['error']}")
+                    return False
+            except Exception as e:
+                log.error(f"get extract job {job_id} error: {e}")
+            time.sleep(const.RESULT_EXTRACT_POLL_INTERVAL)
+        log.error(f"wait extract job {job_id} timeout")
+        return False
 
 
 class LogClient(threading.Thread):
     # 将测试过程log 传输到controller
-    def __init__(self, uuid, log_file, server_url):
+    # 每次最多发送 max_batch_size 字节，请求体使用 gzip 压缩；
+    # seq 为本批日志在已发送日志(UTF-8 编码后)中的起始位置，controller 据此去重，失败重试时不会重复写入；
+    # 日志中的非法 UTF-8 字节会被替换为 U+FFFD，编码后的长度与文件中的长度不同，因此 seq 与文件位置分开记录
+    def __init__(
+        self, uuid, log_file, server_url,
+        max_batch_size=const.LOG_BATCH_MAX_SIZE,
+        interval=const.LOG_SEND_INTERVAL
+    ):
         super().__init__()
         self.uuid = uuid
         self.log_file = log_file
         self.server_url = server_url
+        self.max_batch_size = max_batch_size
+        self.interval = interval
         self.last_position = 0 
+        # 已发送日志编码后的总长度，与 controller 计算的写入位置一致
+        self.seq = 0
+        # 最近发送的批次 {seq: 文件位置}，controller 要求重发时回退到对应位置
+        self.sent = collections.OrderedDict()
+        # 最近一次回退的 (seq, 时间)，重发写入前 controller 仍会返回相同的 seq
+        self.rewound = (None, 0)
+        self.retry_interval = 0
+        self.session = requests.Session()
         self._stop_event = threading.Event()
     
     def stop(self):
         self._stop_event.set()
 
-    def send_log(self):
+    def read_batch(self, final=False) -> bytes:
+        """
+        读取 last_position 之后的一批日志，批次不完整时在最后一个换行符处截断。
+        """
+        try:
+            with open(self.log_file, 'rb') as file:
+                file.seek(self.last_position)  # 定位到上一次发送的位置
+                data = file.read(self.max_batch_size)
+        except FileNotFoundError:
+            return b""
+        if final and len(data) < self.max_batch_size:
+            return data
+        end = data.rfind(b"\n") + 1
+        if end == 0 and len(data) == self.max_batch_size:
+            # 整批没有换行符时，在 UTF-8 字符边界处截断
+            end = len(data)
+            while end > 0 and data[end - 1] & 0xC0 == 0x80:
+                end -= 1
+            if end > 0 and data[end - 1] & 0x80:
+                end -= 1
+        return data[:end]
+
+    def send_log(self, final=False) -> bool:
+        """
+        :return: 是否还有未发送的日志
+        """
+        data = self.read_batch(final)
+        if not data:
+            log.info("No new log to send.")
+            return False
+        text = data.decode('utf-8', errors='replace')
+        if final and len(data) < self.max_batch_size and not text.endswith("\n"):
+            # 日志的最后一行补上换行符，controller 按行续读时只返回完整的行
+            text += "\n"
+        response = self.post({
+            "uuid": self.uuid,
+            "type": RESULT_TYPE_LOG_RAW,
+            "seq": self.seq,
+            "data": text
+        })
+        if response is None:
+            return False
+        log.info(f"New log sent successfully, size: {len(data)}")
+        self.sent[self.seq] = self.last_position
+        while len(self.sent) > const.LOG_RESEND_HISTORY:
+            self.sent.popitem(last=False)
+        # 更新上一次发送的位置
+        self.last_position += len(data)
+        self.seq += len(text.encode())
+        self.retry_interval = 0
+        resend_seq = self.resend_seq(response)
+        if resend_seq is not None and self.rewind(resend_seq):
+            return True
+        return len(data) >= self.max_batch_size
+
+    def flush(self) -> bool:
+        """
+        等待 controller 写完已发送的日志。
+
+        :return: 是否已全部写入，需要重发时回退到重发的位置
+        """
+        response = self.post({
+            "uuid": self.uuid,
+            "type": RESULT_TYPE_LOG_RAW,
+            "seq": self.seq,
+            "data": "",
+            "flush": True
+        })
+        if response is None:
+            return False
+        self.retry_interval = 0
+        resend_seq = self.resend_seq(response)
+        if resend_seq is None:
+            return True
+        # 已写完队列中的日志，不需要等待之前的重发
+        self.rewind(resend_seq, force=True)
+        return False
+
+    def post(self, payload: dict):
+        """
+        :return: 发送失败时返回 None
+        """
         headers = {
-        'Content-Type': 'application/json'
+            'Content-Type': 'application/json',
+            'Content-Encoding': 'gzip'
         }
-        with open(self.log_file, 'r') as file:
-            file.seek(self.last_position)  # 定位到上一次发送的位置
-            new_log_data = file.read()
-            payload = json.dumps({
-                "uuid": self.uuid,
-                "type": RESULT_TYPE_LOG_RAW,
-                "data": new_log_data
-            })
-            if new_log_data:
-                response = requests.request("POST", self.server_url, headers=headers, data=payload)
-                if response.status_code == 200:
-                    log.info("New log sent successfully.")
-                    # 更新上一次发送的位置
-                    self.last_position = file.tell()
-                else:
-                    log.error(f"Failed to send new log error:{response.text}")
-            else:
-                log.info("No new log to send.")
-    
+        try:
+            response = self.session.post(
+                self.server_url, headers=headers,
+                data=gzip.compress(json.dumps(payload).encode()), timeout=30
+            )
+        except requests.RequestException as e:
+            log.error(f"Failed to send new log error:{e}")
+            self.backoff()
+            return None
+        if response.status_code != 200:
+            log.error(f"Failed to send new log error:{response.text}")
+            self.backoff()
+            return None
+        return response
+
+    def resend_seq(self, response):
+        try:
+            return (response.json().get("DATA") or {}).get("resend_seq")
+        except ValueError:
+            return None
+
+    def rewind(self, seq, force=False) -> bool:
+        """
+        controller 写入失败时从 seq 处重发日志。
+
+        :param force: 为 False 时，刚回退过的相同位置不再回退
+        :return: 是否已回退
+        """
+        last_seq, last_time = self.rewound
+        if (
+            not force and seq == last_seq
+            and time.time() - last_time < const.LOG_SEND_MAX_RETRY_INTERVAL
+        ):
+            return False
+        position = self.sent.get(seq)
+        if position is None:
+            log.error(f"can not resend log from seq {seq}, not in history")
+            return False
+        self.rewound = (seq, time.time())
+        log.warning(f"controller requests log resend from seq {seq}")
+        for sent_seq in [s for s in self.sent if s >= seq]:
+            self.sent.pop(sent_seq)
+        self.seq = seq
+        self.last_position = position
+        return True
+
+    def backoff(self):
+        self.retry_interval = min(
+            max(self.retry_interval * 2, self.interval),
+            const.LOG_SEND_MAX_RETRY_INTERVAL
+        )
+
     def run(self):
         while not self._stop_event.is_set():
-            self.send_log()
-            time.sleep(5)
-        self.send_log()
\ No newline at end of file
+            # 有积压的日志时连续发送
+            if self.send_log():
+                continue
+            self._stop_event.wait(self.retry_interval or self.interval)
+        # 结束时发送剩余的全部日志，并等待 controller 写入完成，写入失败时重发；
+        # 失败时最多重试 LOG_SEND_FINAL_RETRY 次
+        failures = 0
+        while failures < const.LOG_SEND_FINAL_RETRY:
+            more = self.send_log(final=True)
+            if not self.retry_interval:
+                if more:
+                    continue
+                if self.flush():
+                    break
+            failures += 1
+            if self.retry_interval:
+                time.sleep(self.retry_interval)
+        else:
+            log.error(f"log of {self.uuid} may be incomplete")
@@ -1,5 +1,7 @@
+import json
+import os
 import yaml
-from common.const import RUNNER_CONFIG_PATH
+from common.const import RUNNER_CONFIG_PATH, CASE_PARAMS_ENV
 from eval_lib.common.logger import get_logger
 from eval_lib.model.base import CaseParams
 
@@ -13,6 +15,7 @@ class CaseConf():
         self.platform_tools = {}
         self.runner_data_dir = None
         self.listen_port = None
+        self.runner_pool = {}
         self.case_params: CaseParams = None
         self.parse()
 
@@ -24,6 +27,8 @@ class CaseConf():
                 self.agent_tools = yml.get("agent-tools")
                 self.platform_tools = yml.get("platform-tools")
                 self.runner_data_dir = yml.get("runner_data_dir")
+                # 预热池中的空闲 runner: {"image_tag": ..., "release_name": ...}
+                self.runner_pool = yml.get("runner_pool") or {}
                 self.case_params = self.parse_case_params(yml)
                 self.parse_mysql(yml)
                 self.parse_redis(yml)
@@ -31,9 +36,17 @@ class CaseConf():
             log.error(f"file:eval-runner.yaml, yaml parser Error: {e}")
 
     def parse_case_params(self, yml: dict) -> CaseParams:
+        # 空闲 runner 领取的 case 通过环境变量传给 pytest 等子进程
+        case_params_env = os.environ.get(CASE_PARAMS_ENV)
+        if case_params_env:
+            return CaseParams(json.loads(case_params_env))
         case_params: dict = yml.get("case_params")
         return CaseParams(case_params)
 
+    def set_case_params(self, case_params: dict):
+        os.environ[CASE_PARAMS_ENV] = json.dumps(case_params)
+        self.case_params = CaseParams(case_params)
+
     def parse_mysql(self, yml):
         self.mysql = yml.get("mysql")
         self.mysql_host = self.mysql.get("host", "127.0.0.1")
@@ -48,6 +61,11 @@ class CaseConf():
         self.redis_port = self.redis.get("port", 6379)
         self.redis_password = self.redis.get("password", "root")
         self.redis_db = self.redis.get("db", "0")
+        self.redis_max_connections = self.redis.get("max_connections", 10)
+        self.redis_health_check_interval = self.redis.get(
+            "health_check_interval", 30
+        )
+        self.redis_socket_keepalive = self.redis.get("socket_keepalive", True)
 
 
     def is_valid(self):
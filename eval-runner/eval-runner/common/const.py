@@ -9,8 +9,42 @@ TELEGRAF_TABLE_NAME_IN_INFLUX = "telegraf"
 
 API_PREFIX_RESULT_LOG = "/v1/evaluation/result/log"
 API_PREFIX_RESULT_ZIP = "/v1/evaluation/result/zip"
+API_PREFIX_RESULT_ARTIFACT = "/v1/evaluation/result/artifact"
 CONTROLLER_HOST = "evaluation-controller"
 
+# case 控制状态全量同步间隔，作为订阅消息丢失时的兜底
+CASE_CONTROL_RESYNC_INTERVAL = 20
+CASE_CONTROL_RETRY_INTERVAL = 5
 
+# 空闲 runner 领取 case 后，通过该环境变量把 case 参数传给子进程
+CASE_PARAMS_ENV = "EVAL_RUNNER_CASE_PARAMS"
+# 空闲 runner 等待分配 case 的单次阻塞时长
+RUNNER_POOL_WAIT_TIMEOUT = 60
 
+# 日志上传的单批最大字节数、发送间隔和失败重试的最大间隔
+LOG_BATCH_MAX_SIZE = 256 * 1024
+LOG_SEND_INTERVAL = 5
+LOG_SEND_MAX_RETRY_INTERVAL = 60
+# 结束时发送剩余日志的最大次数
+LOG_SEND_FINAL_RETRY = 5
+# 记录最近发送的日志批次数，controller 写入失败要求重发时据此回退读取位置
+LOG_RESEND_HISTORY = 1024
+# 上报完成前等待剩余日志发送完成的最长时间(秒)，覆盖结束时的重试
+LOG_CLIENT_JOIN_TIMEOUT = LOG_SEND_FINAL_RETRY * LOG_SEND_MAX_RETRY_INTERVAL
 
+# 结果压缩包分块上传的块大小、失败重试次数和初始重试间隔
+RESULT_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+RESULT_UPLOAD_MAX_RETRY = 10
+RESULT_UPLOAD_RETRY_INTERVAL = 2
+# 等待 controller 解压结果压缩包的超时时间和查询间隔
+RESULT_EXTRACT_TIMEOUT = 600
+RESULT_EXTRACT_POLL_INTERVAL = 2
+# 执行过程中增量上传的结果目录、扫描间隔，以及文件最后修改后多久才上传(避免上传写了一半的文件)
+ARTIFACT_SYNC_DIRS = ("report", "allure-result", "log")
+ARTIFACT_SYNC_INTERVAL = 10
+ARTIFACT_SYNC_SETTLE_TIME = 2
+# 上报执行完成后等待 controller 确认收到结果的最长时间
+RESULTS_ACK_TIMEOUT = 300
+# runner 心跳的刷新间隔和过期时间
+HEARTBEAT_INTERVAL = 5
+HEARTBEAT_TTL = 20
@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+
+from common import const
+from eval_lib.common.logger import get_logger
+from eval_lib.databases.redis.runner_info import RedisRunnerInfo
+
+log = get_logger()
+
+
+class CaseControl(threading.Thread):
+    """
+    在本地缓存 case 的控制状态(case-control-status)。
+
+    后台线程订阅 controller 发布的控制通道，收到暂停/取消/恢复消息后立即更新本地状态，
+    step() 等调用方直接读取内存中的状态，无需每次访问 Redis。
+    为防止消息丢失(如连接断开期间)，每隔 resync_interval 秒从 Redis 全量同步一次。
+    """
+
+    def __init__(
+        self, uuid, redis_db: RedisRunnerInfo,
+        resync_interval=const.CASE_CONTROL_RESYNC_INTERVAL
+    ):
+        super().__init__(name="case-control", daemon=True)
+        self.uuid = uuid
+        self.redis_db = redis_db
+        self.resync_interval = resync_interval
+        self.control_status = None
+        self.case_status = None
+        self.condition = threading.Condition()
+        self.synced = threading.Event()
+
+    def run(self):
+        while True:
+            pubsub = None
+            try:
+                # 先订阅再同步，保证同步之后的变更都能收到
+                pubsub = self.redis_db.subscribe_case_control(self.uuid)
+                self.sync()
+                last_sync_time = time.time()
+                while True:
+                    message = pubsub.get_message(timeout=self.resync_interval)
+                    if message and message["type"] == "message":
+                        self.set_control_status(message["data"].decode())
+                    if time.time() - last_sync_time >= self.resync_interval:
+                        self.sync()
+                        last_sync_time = time.time()
+            except Exception as e:
+                log.error(f"case control subscriber error: {e}")
+                time.sleep(const.CASE_CONTROL_RETRY_INTERVAL)
+            finally:
+                if pubsub is not None:
+                    pubsub.close()
+
+    def sync(self):
+        runner_info = self.redis_db.get_runner_info(uuid=self.uuid)
+        with self.condition:
+            self.case_status = runner_info.get("case-status", None)
+        self.set_control_status(runner_info.get("case-control-status", None))
+        self.synced.set()
+
+    def set_control_status(self, status):
+        with self.condition:
+            if status == self.control_status:
+                return
+            log.info(f"case control status: {self.control_status} -> {status}")
+            self.control_status = status
+            self.condition.notify_all()
+
+    def set_case_status(self, status):
+        """
+        更新 Redis 中的 case-status，状态未变化时不访问 Redis。
+        以本地缓存的状态做比较交换，避免覆盖其他进程写入的状态(如 completed)。
+        """
+        with self.condition:
+            expected = self.case_status
+        if status == expected:
+            return
+        current = self.redis_db.compare_and_set_case_status(
+            uuid=self.uuid, expected=expected, status=status
+        )
+        if current != status:
+            log.info(f"case status changed by others: {current}")
+        with self.condition:
+            self.case_status = current
+
+    def wait_change(self, status, timeout=None) -> str:
+        """
+        等待控制状态不再为 status，返回当前的控制状态。
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.control_status != status, timeout=timeout
+            )
+            return self.control_status
+
+
+_case_control: CaseControl = None
+_case_control_pid = None
+_case_control_lock = threading.Lock()
+
+
+def get_case_control(uuid, redis_db: RedisRunnerInfo) -> CaseControl:
+    """
+    获取当前进程的 CaseControl 单例。
+    pytest 多 worker 时各子进程独立订阅，因此按进程号区分。
+    """
+    global _case_control, _case_control_pid
+    with _case_control_lock:
+        if _case_control is None or _case_control_pid != os.getpid():
+            _case_control = CaseControl(uuid=uuid, redis_db=redis_db)
+            _case_control_pid = os.getpid()
+            _case_control.start()
+    # 首次同步完成前，本地状态不可信
+    _case_control.synced.wait(timeout=const.CASE_CONTROL_RESYNC_INTERVAL)
+    return _case_control
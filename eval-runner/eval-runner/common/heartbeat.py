@@ -0,0 +1,43 @@
+import threading
+
+from common import const
+from eval_lib.common.logger import get_logger
+from eval_lib.databases.redis.runner_info import RedisRunnerInfo
+
+log = get_logger()
+
+
+class RunnerHeartbeat(threading.Thread):
+    """
+    定期刷新 runner 的心跳，心跳在 Redis 中的 TTL 很短。
+
+    runner 进程退出或 pod 异常时心跳很快过期，controller 据此在几秒内判定 runner 失败，
+    无需等待 pod 状态检查多次失败或 runner 超时。
+    当前执行的步骤和进度由 step() 在 pytest 进程中更新，用于发现卡住的步骤。
+    """
+
+    def __init__(
+        self, uuid, redis_db: RedisRunnerInfo,
+        interval=const.HEARTBEAT_INTERVAL, ttl=const.HEARTBEAT_TTL
+    ):
+        super().__init__(name="runner-heartbeat", daemon=True)
+        self.uuid = uuid
+        self.redis_db = redis_db
+        self.interval = interval
+        self.ttl = ttl
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while True:
+            self.beat()
+            if self.stop_event.wait(self.interval):
+                break
+
+    def beat(self):
+        try:
+            self.redis_db.heartbeat(uuid=self.uuid, ttl=self.ttl)
+        except Exception as e:
+            log.error(f"runner heartbeat error: {e}")
+
+    def stop(self):
+        self.stop_event.set()
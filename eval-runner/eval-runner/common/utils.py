@@ -11,6 +11,7 @@ from eval_lib.common.ssh import SSHPool
 from eval_lib.databases.redis import runner_info
 from eval_lib.databases.redis import const as redis_const
 from common.module import AgentMeta
+from common.control import get_case_control
 from common import const
 from common.config import conf
 from platform_tools.aliyun.aliyun_sdk import Aliyun
@@ -25,7 +26,9 @@ ssh_pool_default = SSHPool(
 )
 redis_db = runner_info.RedisRunnerInfo(
     host=conf.redis_host, port=conf.redis_port, password=conf.redis_password,
-    db=conf.redis_db, max_connections=10
+    db=conf.redis_db, max_connections=conf.redis_max_connections,
+    health_check_interval=conf.redis_health_check_interval,
+    socket_keepalive=conf.redis_socket_keepalive
 )
 log = get_logger()
 
@@ -34,54 +37,44 @@ def get_case_uuid():
 
 def step(title):
     """
-    执行一个步骤，并根据Redis中存储的运行状态来决定步骤的执行流程。
+    执行一个步骤，并根据本地缓存的 case 控制状态来决定步骤的执行流程。
+    控制状态由后台订阅线程实时更新，正常运行时不访问 Redis。
 
     :param title: 步骤的标题，用于日志记录和报告。
     :return: 执行allure步骤后的结果。
     """
     log.info(title)  # 记录步骤开始的日志
+    # 上报当前步骤和进度，controller 据此发现长时间未推进的步骤
+    try:
+        redis_db.heartbeat_step(
+            uuid=conf.case_params.uuid, step=title, ttl=const.HEARTBEAT_TTL
+        )
+    except Exception as e:
+        log.error(f"update heartbeat step error: {e}")
+    case_control = get_case_control(conf.case_params.uuid, redis_db)
     while True:
-        # 从Redis获取运行者信息
-        runner_info_dict = redis_db.get_runner_info(uuid=conf.case_params.uuid)
-        log.info(runner_info_dict)
-        case_status = runner_info_dict.get("case-status", None)
-        case_control_status = runner_info_dict.get("case-control-status", None)
+        case_control_status = case_control.control_status
         # 检查是否需要主动暂停用例
         if case_control_status == redis_const.CASE_STATUS_PAUSED:
             log.info(f"case pause proactively")
             # 如果当前状态不是暂停状态，则更新状态为暂停
-            if case_status != redis_const.CASE_STATUS_PAUSED:
-                redis_db.update_runner_info(
-                    uuid=conf.case_params.uuid,
-                    info={"case-status": redis_const.CASE_STATUS_PAUSED}
-                )
-                case_status = redis_const.CASE_STATUS_PAUSED
+            case_control.set_case_status(redis_const.CASE_STATUS_PAUSED)
 
         # 检查是否需要主动取消用例
         elif case_control_status == redis_const.CASE_STATUS_CANCELLED:
             log.info(f"case cancel proactively")
             # 如果当前状态不是取消状态，则更新状态为取消
-            if case_status != redis_const.CASE_STATUS_CANCELLED:
-                redis_db.update_runner_info(
-                    uuid=conf.case_params.uuid,
-                    info={"case-status": redis_const.CASE_STATUS_CANCELLED}
-                )
-                case_status = redis_const.CASE_STATUS_CANCELLED
-        
+            case_control.set_case_status(redis_const.CASE_STATUS_CANCELLED)
+
         elif case_control_status == redis_const.CASE_STATUS_RUNNING:
             # 如果当前状态不是运行状态，则更新状态为运行
-            if case_status != redis_const.CASE_STATUS_RUNNING:
-                redis_db.update_runner_info(
-                    uuid=conf.case_params.uuid,
-                    info={"case-status": redis_const.CASE_STATUS_RUNNING}
-                )
-                case_status = redis_const.CASE_STATUS_RUNNING
-
-        # 如果用例状态不是运行中，则每隔20秒检查一次；如果是，则结束循环
-        if case_status != redis_const.CASE_STATUS_RUNNING:
-            time.sleep(20)
-        else:
+            case_control.set_case_status(redis_const.CASE_STATUS_RUNNING)
             break
+
+        # 用例未处于运行状态时，阻塞等待控制状态变化
+        case_control.wait_change(
+            case_control_status, timeout=const.CASE_CONTROL_RESYNC_INTERVAL
+        )
     # 执行allure步骤，并返回结果
     return allure.step(title)
 
@@ -382,3 +375,19 @@ def zip_dir(folder_path, output_path):
                     file_path,
                     os.path.relpath(file_path, os.path.dirname(folder_path))
                 )
+
+
+def zip_files(folder_path, file_paths, output_path):
+    """
+    将文件夹下的指定文件压缩成ZIP文件，文件在压缩包中的路径与 zip_dir 一致。
+
+    :param folder_path: 文件所在的文件夹路径。
+    :param file_paths: 需要压缩的文件路径列表。
+    :param output_path: 压缩文件输出的路径。
+    """
+    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for file_path in file_paths:
+            zipf.write(
+                file_path,
+                os.path.relpath(file_path, os.path.dirname(folder_path))
+            )
@@ -9,9 +9,13 @@ from common.config import conf
 from eval_lib.common.logger import get_logger
 from eval_lib.common.logger import LoggerManager
 from common.utils import redis_db
-from common.utils import zip_dir
+from common.utils import zip_dir, zip_files
 from eval_lib.databases.redis import const as redis_const
+from eval_lib.databases.redis.runner_pool import RedisRunnerPool
 from common.client import ResultClient, LogClient
+from common.control import get_case_control
+from common.artifact import ArtifactSyncer
+from common.heartbeat import RunnerHeartbeat
 
 log = get_logger()
 
@@ -23,6 +27,9 @@ class Runner():
         self.case_params = conf.case_params
         self.start_time = int(time.time())
         self.pytest_process: subprocess.Popen = None
+        self.artifact_syncer: ArtifactSyncer = None
+        self.log_client: LogClient = None
+        self.heartbeat = RunnerHeartbeat(uuid=self.uuid, redis_db=redis_db)
 
         self.runner_dir = const.LOCAL_PATH
         self.runner_data_path = f"{conf.runner_data_dir}/runner-{self.uuid}"
@@ -31,16 +38,26 @@ class Runner():
         self.runner_allure_path = f"{self.runner_data_path}/allure-result"
 
     def run(self):
+        # 心跳覆盖执行和上传结果的整个过程，上报完成后停止
+        self.heartbeat.start()
         self.init_env()
+        self.start_sync_artifacts()
         self.exec_pytest()
         self.wait()
         # self.get_results()
         self.push_results()
-        redis_db.update_runner_info(
-            uuid=self.uuid,
-            info={"runner-status": redis_const.CASE_STATUS_COMPLETED}
+        self.wait_forward_log()
+        redis_db.set_runner_status(
+            uuid=self.uuid, status=redis_const.CASE_STATUS_COMPLETED
         )
-        time.sleep(300)
+        self.heartbeat.stop()
+        # 等待 controller 确认收到结果后立即退出，controller 异常时最多等待 RESULTS_ACK_TIMEOUT
+        if redis_db.wait_results_ack(
+            uuid=self.uuid, timeout=const.RESULTS_ACK_TIMEOUT
+        ):
+            log.info(f"Runner {self.uuid} results acked, exit.")
+        else:
+            log.error(f"Runner {self.uuid} wait results ack timeout, exit.")
 
     def init_env(self):
         """初始化环境目录
@@ -93,10 +110,11 @@ class Runner():
 
     def wait(self):
         log_path = f"{self.runner_log_path}/pytest-{self.uuid}.log"
-        lc = self.start_forward_log(log_path=log_path)
+        lc = self.log_client = self.start_forward_log(log_path=log_path)
+        case_control = get_case_control(self.uuid, redis_db)
         while True:
-            # 检查进程状态
-            time.sleep(5)
+            # 检查进程状态，控制状态变化(如取消)时立即唤醒
+            case_control.wait_change(case_control.control_status, timeout=5)
             # pytest 进程结束了
             if self.pytest_process.poll() is not None:
                 if self.pytest_process.returncode == 0:
@@ -112,8 +130,7 @@ class Runner():
                     info={"case-status": redis_const.CASE_STATUS_COMPLETED}
                 )
                 break
-            runner_info_dict = redis_db.get_runner_info(uuid=self.uuid)
-            if runner_info_dict["case-control-status"] == redis_const.CASE_STATUS_CANCELLED:
+            if case_control.control_status == redis_const.CASE_STATUS_CANCELLED:
                 # 主动取消case执行
                 redis_db.update_runner_info(
                     uuid=self.uuid,
@@ -126,6 +143,14 @@ class Runner():
                 lc.stop()
                 break
 
+    def wait_forward_log(self):
+        # 上报完成后 controller 确认收到结果时进程即退出，退出前等待剩余日志发送完成
+        if self.log_client is None:
+            return
+        self.log_client.join(const.LOG_CLIENT_JOIN_TIMEOUT)
+        if self.log_client.is_alive():
+            log.error(f"Runner {self.uuid} wait log forwarding timeout.")
+
     def interrupt(self):
         # TODO: leyi 中断当前执行,立即生成结果
         self.pytest_process.kill()
@@ -143,16 +168,34 @@ class Runner():
         lc.start()
         return lc
 
+    def start_sync_artifacts(self):
+        # 执行过程中增量上传结果文件，pytest 日志已由 LogClient 实时转发，结束时再上传
+        log.info("start artifact sync")
+        server_url = f"http://{const.CONTROLLER_HOST}:{conf.listen_port}{const.API_PREFIX_RESULT_ARTIFACT}"
+        self.artifact_syncer = ArtifactSyncer(
+            uuid=self.uuid,
+            data_path=self.runner_data_path,
+            server_url=server_url,
+            exclude=[f"{self.runner_log_path}/pytest-{self.uuid}.log"]
+        )
+        self.artifact_syncer.start()
+
     def push_results(self):
-        #TODO: luyao 压缩self.runner_data_path，发送到controller
         log.info("start push result to controller")
         runner_data_zip = f"runner-{self.uuid}.zip"
         shutil.move(
             src=f"{conf.runner_data_dir}/runner.log",
             dst=f"{self.runner_log_path}/runner.log"
         )
-        zip_dir(
+        # 最后一次同步后，只压缩发送增量上传失败的文件
+        self.artifact_syncer.stop()
+        pending = self.artifact_syncer.pending()
+        if not pending:
+            log.info(f"Runner {self.uuid} all results synced.")
+            return
+        zip_files(
             folder_path=self.runner_data_path,
+            file_paths=pending,
             output_path=runner_data_zip
         )
         server_url = f"http://{const.CONTROLLER_HOST}:{conf.listen_port}{const.API_PREFIX_RESULT_ZIP}"
@@ -189,10 +232,37 @@ class Runner():
         )
 
 
+def wait_case_assignment():
+    """
+    预热池中的空闲 runner 在 Redis 中登记，阻塞等待 controller 分配 case。
+    """
+    image_tag = conf.runner_pool["image_tag"]
+    release_name = conf.runner_pool["release_name"]
+    runner_pool = RedisRunnerPool(
+        host=conf.redis_host, port=conf.redis_port,
+        password=conf.redis_password, db=conf.redis_db,
+        max_connections=conf.redis_max_connections,
+        health_check_interval=conf.redis_health_check_interval,
+        socket_keepalive=conf.redis_socket_keepalive
+    )
+    runner_pool.register_idle(image_tag, release_name)
+    log.info(f"idle runner {release_name} wait for case")
+    while True:
+        case_params = runner_pool.wait_assignment(
+            release_name, const.RUNNER_POOL_WAIT_TIMEOUT
+        )
+        if case_params is not None:
+            break
+    log.info(f"idle runner {release_name} get case: {case_params}")
+    conf.set_case_params(case_params)
+
+
 if __name__ == '__main__':
+    # TODO: 初始化log文件
+    LoggerManager(log_file=f"{conf.runner_data_dir}/runner.log")
+    if conf.runner_pool:
+        wait_case_assignment()
     if not conf.is_valid():
         print('Invalid conf value, error exit.')
         sys.exit(1)
-    # TODO: 初始化log文件
-    LoggerManager(log_file=f"{conf.runner_data_dir}/runner.log")
     Runner().run()